@@ -4,4 +4,8 @@ __version__ = '1.0.0'
 
 default_app_config = 'allauth_cas.apps.CASAccountConfig'
 
+# Session entry of the last CAS login: ``[provider id, uid]``.
+CAS_SESSION_KEY = 'allauth_cas'
+
+# Session entry of the last CAS provider, set by older versions. Still read.
 CAS_PROVIDER_SESSION_KEY = 'allauth_cas__provider_id'
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+import sys
+
+
+class AppSettings(object):
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+
+    def _setting(self, name, dflt):
+        from django.conf import settings
+        return getattr(settings, self.prefix + name, dflt)
+
+    @property
+    def AUDIT_SINKS(self):
+        """
+        Sinks of the audit log, as a list of dicts with keys ``'BACKEND'``
+        (dotted path of the sink class) and ``'OPTIONS'`` (keyword arguments
+        of the sink). Auditing is disabled if empty.
+        """
+        return self._setting('AUDIT_SINKS', [])
+
+    @property
+    def AUDIT_BATCH_SIZE(self):
+        """
+        Number of buffered audit events triggering a flush.
+        """
+        return self._setting('AUDIT_BATCH_SIZE', 100)
+
+    @property
+    def AUDIT_FLUSH_INTERVAL(self):
+        """
+        Maximum time, in seconds, between two flushes of the audit events.
+        """
+        return self._setting('AUDIT_FLUSH_INTERVAL', 5)
+
+    @property
+    def AUDIT_MAX_EVENTS(self):
+        """
+        Maximum number of buffered audit events. Oldest events are dropped
+        when the buffer is full.
+        """
+        return self._setting('AUDIT_MAX_EVENTS', 10000)
+
+    @property
+    def PROFILING_DIR(self):
+        """
+        Directory where profiles of the CAS views are stored. Profiling is
+        disabled if empty.
+        """
+        return self._setting('PROFILING_DIR', None)
+
+    @property
+    def PROFILING_SAMPLE_RATE(self):
+        """
+        One request out of this number is profiled.
+        """
+        return self._setting('PROFILING_SAMPLE_RATE', 100)
+
+    @property
+    def PROFILING_LATENCY_THRESHOLD(self):
+        """
+        Minimum duration, in seconds, of a profiled request for its profile to
+        be stored.
+        """
+        return self._setting('PROFILING_LATENCY_THRESHOLD', 0)
+
+    @property
+    def PROFILING_MAX_FILES(self):
+        """
+        Maximum number of profiles stored per view. Oldest profiles are
+        removed beyond.
+        """
+        return self._setting('PROFILING_MAX_FILES', 100)
+
+    @property
+    def RECORDING_PATH(self):
+        """
+        File where validation responses received by the callback view are
+        recorded. Recording is disabled if empty.
+        """
+        return self._setting('RECORDING_PATH', None)
+
+    @property
+    def RECORDING_SAMPLE_RATE(self):
+        """
+        One validation response out of this number is recorded.
+        """
+        return self._setting('RECORDING_SAMPLE_RATE', 100)
+
+    @property
+    def RECORDING_ANONYMIZE(self):
+        """
+        Whether user data is replaced by pseudonyms in recorded responses.
+        """
+        return self._setting('RECORDING_ANONYMIZE', True)
+
+    @property
+    def GATEWAY_PROVIDER(self):
+        """
+        Id of the provider used by
+        :class:`~allauth_cas.middleware.CASGatewayMiddleware`.
+        """
+        return self._setting('GATEWAY_PROVIDER', None)
+
+    @property
+    def GATEWAY_PATHS(self):
+        """
+        Regular expressions of the paths where gateway logins are tried. By
+        default, all paths.
+        """
+        return self._setting('GATEWAY_PATHS', [r'^/'])
+
+    @property
+    def GATEWAY_EXEMPT_PATHS(self):
+        """
+        Regular expressions of the paths where gateway logins are never tried.
+        """
+        return self._setting('GATEWAY_EXEMPT_PATHS', [])
+
+    @property
+    def GATEWAY_NEGATIVE_TTL(self):
+        """
+        Time, in seconds, during which a gateway login is not tried again for
+        a client.
+        """
+        return self._setting('GATEWAY_NEGATIVE_TTL', 300)
+
+    @property
+    def GATEWAY_CACHE(self):
+        """
+        Alias of the cache remembering the gateway logins tried by clients
+        which don't keep cookies.
+        """
+        return self._setting('GATEWAY_CACHE', 'default')
+
+    @property
+    def GATEWAY_COOKIE_NAME(self):
+        """
+        Name of the cookie remembering that a gateway login has been tried.
+        """
+        return self._setting('GATEWAY_COOKIE_NAME', 'allauth_cas_gateway')
+
+    @property
+    def SESSION_INDEX_CACHE(self):
+        """
+        Alias of the cache storing the sessions of each user. ``None``
+        disables the session index.
+        """
+        return self._setting('SESSION_INDEX_CACHE', None)
+
+    @property
+    def SESSION_INDEX_TIMEOUT(self):
+        """
+        Lifetime of the entries of the session index, in seconds. Defaults to
+        ``SESSION_COOKIE_AGE``.
+        """
+        return self._setting('SESSION_INDEX_TIMEOUT', None)
+
+    @property
+    def HTTP_POOLING(self):
+        """
+        Whether tickets are validated through an HTTP session shared by the
+        process for each CAS server, which keeps connections alive. Defaults
+        to ``WARMUP_ON_READY``.
+        """
+        return self._setting('HTTP_POOLING', self.WARMUP_ON_READY)
+
+    @property
+    def WARMUP_ON_READY(self):
+        """
+        Whether connections to the CAS servers are warmed up when the app is
+        loaded.
+        """
+        return self._setting('WARMUP_ON_READY', False)
+
+    @property
+    def WARMUP_CONNECTIONS(self):
+        """
+        Number of connections opened to each CAS server by the warm-up.
+        """
+        return self._setting('WARMUP_CONNECTIONS', 1)
+
+    @property
+    def WARMUP_TIMEOUT(self):
+        """
+        Timeout of the warm-up requests, in seconds.
+        """
+        return self._setting('WARMUP_TIMEOUT', 5)
+
+    @property
+    def QUERY_BUDGET_RAISE(self):
+        """
+        Whether exceeding a query budget raises an exception, instead of
+        logging a warning. Meant for tests.
+        """
+        return self._setting('QUERY_BUDGET_RAISE', False)
+
+    @property
+    def SOCIAL_APP_CACHE_TIMEOUT(self):
+        """
+        Time, in seconds, during which a process reuses the social app of a
+        provider, as changes made by other processes are not signaled.
+        """
+        return self._setting('SOCIAL_APP_CACHE_TIMEOUT', 60)
+
+
+# Ugly? Guido recommends this himself ...
+# http://mail.python.org/pipermail/python-ideas/2012-May/014969.html
+app_settings = AppSettings('ALLAUTH_CAS_')
+app_settings.__name__ = __name__
+sys.modules[__name__] = app_settings
@@ -8,4 +8,8 @@ class CASAccountConfig(AppConfig):
     verbose_name = _("CAS Accounts")
 
     def ready(self):
-        from . import signals  # noqa
+        from . import app_settings, checks, signals  # noqa
+
+        if app_settings.WARMUP_ON_READY:
+            from .warmup import warm_up_on_ready
+            warm_up_on_ready()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import time
+
+from django.core.cache import caches
+
+from .lru import LRUCache
+
+REQUEST_ATTRIBUTE = '_allauth_cas_attributes'
+
+
+class AttributeCache(object):
+    """Attributes of the users of a provider, by uid.
+
+    Lookups go through three layers, from the cheapest to the widest:
+
+    * the request, for the lookups of the same request;
+    * a LRU cache of the process, whose entries expire after
+      ``local_timeout`` seconds;
+    * a Django cache, shared by the processes, whose entries expire after
+      ``timeout`` seconds.
+
+    A miss of all the layers calls ``loader``, and fills them with its result.
+
+    Updates reach the request, the process and the shared cache. Other
+    processes keep their entry until it expires, so ``local_timeout`` bounds
+    how long they may return outdated attributes.
+
+    Args:
+        provider_id (str): Id of the provider, part of the cache keys.
+        cache_alias (str): Alias of the shared cache in ``settings.CACHES``.
+            ``None`` disables this layer.
+        timeout (int): Lifetime of the entries of the shared cache, in
+            seconds.
+        local_size (int): Maximum number of entries of the process cache.
+            ``0`` disables this layer.
+        local_timeout (int): Lifetime of the entries of the process cache,
+            in seconds.
+
+    """
+    key_prefix = 'allauth_cas:attributes:'
+
+    def __init__(self, provider_id, cache_alias=None, timeout=300,
+                 local_size=1024, local_timeout=30):
+        self.provider_id = provider_id
+        self.cache = caches[cache_alias] if cache_alias else None
+        self.timeout = timeout
+        self.local = LRUCache(local_size) if local_size else None
+        self.local_timeout = local_timeout
+
+    def get_key(self, uid):
+        return '{}{}:{}'.format(
+            self.key_prefix, self.provider_id,
+            hashlib.sha1(uid.encode('utf-8')).hexdigest(),
+        )
+
+    def get_request_cache(self, request):
+        try:
+            return getattr(request, REQUEST_ATTRIBUTE)
+        except AttributeError:
+            request_cache = {}
+            setattr(request, REQUEST_ATTRIBUTE, request_cache)
+            return request_cache
+
+    def get(self, uid, request=None, loader=None):
+        """Returns the attributes of ``uid``.
+
+        The returned dict is shared by the layers, and must not be modified.
+
+        Args:
+            uid (str)
+            request (`HttpRequest`): Current request, if any.
+            loader (callable): Called with ``uid`` on a miss of all the
+                layers. Its result is cached, unless it is ``None``.
+
+        Returns:
+            dict: ``None`` if they are unknown.
+
+        """
+        key = self.get_key(uid)
+        request_cache = None
+        if request is not None:
+            request_cache = self.get_request_cache(request)
+            if key in request_cache:
+                return request_cache[key]
+
+        attributes = self.get_cached(key)
+        if attributes is None and loader is not None:
+            attributes = loader(uid)
+            if attributes is not None:
+                self.store(key, attributes)
+
+        if request_cache is not None and attributes is not None:
+            request_cache[key] = attributes
+        return attributes
+
+    def get_cached(self, key):
+        if self.local is not None:
+            entry = self.local.get(key)
+            if entry is not None and entry[0] > time.time():
+                return entry[1]
+
+        if self.cache is not None:
+            attributes = self.cache.get(key)
+            if attributes is not None:
+                if self.local is not None:
+                    self.local.set(
+                        key, (time.time() + self.local_timeout, attributes))
+                return attributes
+        return None
+
+    def store(self, key, attributes):
+        if self.local is not None:
+            self.local.set(key, (time.time() + self.local_timeout, attributes))
+        if self.cache is not None:
+            self.cache.set(key, attributes, self.timeout)
+
+    def set(self, uid, attributes, request=None):
+        """Replaces the attributes of ``uid`` in all the layers."""
+        key = self.get_key(uid)
+        self.store(key, attributes)
+        if request is not None:
+            self.get_request_cache(request)[key] = attributes
+
+    def delete(self, uid, request=None):
+        """Removes the attributes of ``uid`` from all the layers."""
+        key = self.get_key(uid)
+        if self.local is not None:
+            self.local.delete(key)
+        if self.cache is not None:
+            self.cache.delete(key)
+        if request is not None:
+            self.get_request_cache(request).pop(key, None)
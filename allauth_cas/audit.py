@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+import atexit
+import collections
+import io
+import json
+import logging
+import threading
+
+from django.apps import apps
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import app_settings
+
+logger = logging.getLogger(__name__)
+
+
+class AuditEvent(object):
+    """
+    An authentication event, as stored by the audit log.
+    """
+    LOGIN = 'login'
+    FAILURE = 'failure'
+    LOGOUT = 'logout'
+
+    def __init__(self, kind, provider, uid='', ip=None, latency=None,
+                 detail='', created_at=None):
+        self.kind = kind
+        self.provider = provider
+        self.uid = uid or ''
+        self.ip = ip
+        self.latency = latency
+        self.detail = detail
+        self.created_at = created_at or timezone.now()
+
+    def as_dict(self):
+        return {
+            'kind': self.kind,
+            'provider': self.provider,
+            'uid': self.uid,
+            'ip': self.ip,
+            'latency': self.latency,
+            'detail': self.detail,
+            'created_at': self.created_at,
+        }
+
+
+class AuditSink(object):
+    """
+    Base class of the destinations of audit events.
+    """
+
+    def write(self, events):
+        """Stores a batch of :class:`AuditEvent`."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ModelSink(AuditSink):
+    """Stores audit events in a model, with a single ``bulk_create`` per batch.
+
+    Args:
+        model (str): The model, as ``'app_label.ModelName'``, usually a
+            subclass of :class:`~allauth_cas.models.AbstractCASAuditEvent`.
+
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def write(self, events):
+        model = apps.get_model(self.model)
+        model.objects.bulk_create([
+            model(**event.as_dict()) for event in events
+        ])
+
+
+class JSONLinesSink(AuditSink):
+    """Appends audit events to a file, one JSON object per line.
+
+    Args:
+        path (str): Path of the file.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def write(self, events):
+        lines = []
+        for event in events:
+            data = event.as_dict()
+            data['created_at'] = data['created_at'].isoformat()
+            lines.append(json.dumps(data, sort_keys=True) + '\n')
+        with self.lock:
+            with io.open(self.path, 'a', encoding='utf-8') as f:
+                f.write(u''.join(lines))
+
+
+class AuditLog(object):
+    """Buffers audit events in memory and flushes them to sinks.
+
+    Events are flushed by a background thread, when ``batch_size`` events are
+    buffered or after ``flush_interval`` seconds. The buffer holds at most
+    ``max_events``, oldest events being dropped beyond. Remaining events are
+    flushed when the process exits.
+
+    """
+
+    def __init__(self, sinks, batch_size=100, flush_interval=5,
+                 max_events=10000):
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+
+        self._events = collections.deque(maxlen=max_events)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def emit(self, event):
+        """Buffers an event. It never blocks on the sinks."""
+        with self._lock:
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append(event)
+            size = len(self._events)
+            if self._thread is None:
+                self._start()
+        if size >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Writes the buffered events to the sinks."""
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    events = list(self._events)
+                    self._events.clear()
+                if not events:
+                    return
+                for sink in self.sinks:
+                    try:
+                        sink.write(events)
+                    except Exception:
+                        logger.exception(
+                            "Unable to write %d audit events to %r.",
+                            len(events), sink,
+                        )
+
+    def stop(self):
+        """Stops the background thread, and flushes the remaining events."""
+        self._stopped.set()
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self.flush()
+        for sink in self.sinks:
+            sink.close()
+
+    def _start(self):
+        self._thread = threading.Thread(
+            target=self._run, name='allauth_cas-audit')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                # Database connections are per thread.
+                for connection in connections.all():
+                    connection.close()
+
+
+_audit_log = None
+_audit_log_lock = threading.Lock()
+
+
+def get_audit_log():
+    """Returns the audit log configured by the settings, or ``None``."""
+    global _audit_log
+    if _audit_log is None and app_settings.AUDIT_SINKS:
+        with _audit_log_lock:
+            if _audit_log is None:
+                _audit_log = AuditLog(
+                    sinks=[
+                        import_string(sink['BACKEND'])(
+                            **sink.get('OPTIONS', {}))
+                        for sink in app_settings.AUDIT_SINKS
+                    ],
+                    batch_size=app_settings.AUDIT_BATCH_SIZE,
+                    flush_interval=app_settings.AUDIT_FLUSH_INTERVAL,
+                    max_events=app_settings.AUDIT_MAX_EVENTS,
+                )
+    return _audit_log
+
+
+def audit(kind, provider, request=None, **kwargs):
+    """Records an authentication event, if auditing is enabled.
+
+    Args:
+        kind (str): One of the kinds of :class:`AuditEvent`.
+        provider (str): Id of the provider.
+        request (optional): The IP address is taken from it.
+        **kwargs: Other fields of :class:`AuditEvent`.
+
+    """
+    audit_log = get_audit_log()
+    if audit_log is None:
+        return
+    if request is not None:
+        kwargs.setdefault('ip', request.META.get('REMOTE_ADDR'))
+    audit_log.emit(AuditEvent(kind, provider, **kwargs))
+
+
+@atexit.register
+def shutdown_audit_log():
+    global _audit_log
+    with _audit_log_lock:
+        audit_log, _audit_log = _audit_log, None
+    if audit_log is not None:
+        audit_log.stop()
+
+
+@receiver(setting_changed)
+def reset_audit_log(setting, **kwargs):
+    if setting.startswith('ALLAUTH_CAS_AUDIT_'):
+        shutdown_audit_log()
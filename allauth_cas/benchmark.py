@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+import re
+import threading
+import time
+from collections import Counter
+
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpRequest
+
+from .http import get_http_session
+from .stats import percentile
+
+STEPS = ('ticket', 'validate')
+
+# Object addresses, which would split the breakdown of identical errors.
+_ADDRESS_RE = re.compile(r' at 0x[0-9a-fA-F]+')
+
+
+class BenchmarkRequest(HttpRequest):
+    """Request given to the callback view to build its client.
+
+    Its host is set by the benchmark, not by a client, and is not checked
+    against ``ALLOWED_HOSTS``.
+    """
+
+    def __init__(self, host):
+        super(BenchmarkRequest, self).__init__()
+        self.method = 'GET'
+        self.path = self.path_info = '/'
+        self.META['HTTP_HOST'] = host
+        self.session = {}
+        self.user = AnonymousUser()
+
+    def get_host(self):
+        return self.META['HTTP_HOST']
+
+
+class BenchmarkResult(object):
+    """Measures of a benchmark run.
+
+    Attributes:
+        rounds (int): Number of rounds run.
+        duration (float): Duration of the run, in seconds.
+        latencies (dict): Durations of each step, in seconds, by step name
+            (``ticket``, ``validate``).
+        errors (`Counter`): Number of failed rounds, by error.
+        requests (int): HTTP requests sent to the CAS server by the shared
+            session, including the requests of tickets through the REST
+            protocol.
+        connections (int): Connections opened for these requests.
+
+    """
+
+    def __init__(self):
+        self.rounds = 0
+        self.duration = 0
+        self.latencies = dict((step, []) for step in STEPS)
+        self.errors = Counter()
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    @property
+    def throughput(self):
+        """Rounds per second."""
+        return self.rounds / self.duration if self.duration else 0
+
+    @property
+    def failed(self):
+        return sum(self.errors.values())
+
+    @property
+    def reuse(self):
+        """Share of the requests sent on an already opened connection."""
+        if not self.requests:
+            return 0
+        return max(0, 1 - self.connections / float(self.requests))
+
+    def add_latency(self, step, latency):
+        with self._lock:
+            self.latencies[step].append(latency)
+
+    def add_error(self, error):
+        with self._lock:
+            self.errors[error] += 1
+
+    def __str__(self):
+        lines = [
+            "{} rounds in {:.2f} s ({:.1f} rounds/s), {} errors".format(
+                self.rounds, self.duration, self.throughput, self.failed,
+            )
+        ]
+        for step in STEPS:
+            latencies = self.latencies[step]
+            if latencies:
+                lines.append(
+                    "{}: p50 {:.1f} ms, p95 {:.1f} ms, p99 {:.1f} ms, "
+                    "max {:.1f} ms".format(
+                        step,
+                        percentile(latencies, 50) * 1000,
+                        percentile(latencies, 95) * 1000,
+                        percentile(latencies, 99) * 1000,
+                        max(latencies) * 1000,
+                    )
+                )
+        lines.append(
+            "HTTP: {} requests, {} connections opened ({:.0f}% reused)".format(
+                self.requests, self.connections, self.reuse * 100,
+            )
+        )
+        lines.extend(
+            "Error: {} x {}".format(count, error)
+            for error, count in self.errors.most_common()
+        )
+        return "\n".join(lines)
+
+
+def get_connection_stats(session):
+    """Returns the numbers of requests sent and connections opened by the
+    connection pools of a `requests.Session`."""
+    requests = connections = 0
+    for http_adapter in session.adapters.values():
+        poolmanager = getattr(http_adapter, 'poolmanager', None)
+        if poolmanager is None:
+            continue
+        for key in list(poolmanager.pools.keys()):
+            pool = poolmanager.pools.get(key)
+            if pool is not None:
+                requests += pool.num_requests
+                connections += pool.num_connections
+    return requests, connections
+
+
+class Benchmark(object):
+    """Runs concurrent ticket validations through the client stack of the
+    callback view of a provider.
+
+    Each round gets a service ticket with ``get_ticket``, then validates it
+    with the client built by ``callback.view_class.get_client()``, as the
+    callback view does: same CAS protocol version, same service url and same
+    shared HTTP session, if ``ALLAUTH_CAS_HTTP_POOLING`` is enabled.
+
+    Args:
+        callback: Callback view of the provider, as returned by
+            :meth:`~allauth_cas.views.CASView.adapter_view`.
+        get_ticket (callable): Called with the service url, returns a new
+            service ticket.
+        url (str): Url of the CAS server. Default: the one of the adapter.
+        rounds (int): Number of rounds.
+        concurrency (int): Number of threads running the rounds.
+        host (str): Host of the requests given to the view, used in the
+            service url unless the provider sets ``SERVICE_BASE_URL``.
+
+    """
+
+    def __init__(self, callback, get_ticket, url=None, rounds=100,
+                 concurrency=4, host='testserver'):
+        self.view_class = callback.view_class
+        self.adapter = callback.adapter
+        if url:
+            self.adapter = type(
+                self.adapter.__name__, (self.adapter,), {'url': url})
+        self.get_ticket = get_ticket
+        self.rounds = rounds
+        self.concurrency = concurrency
+        self.host = host
+
+    def get_client(self):
+        """Returns a CAS client, as built by the callback view."""
+        request = BenchmarkRequest(self.host)
+
+        view = self.view_class()
+        view.request = request
+        view.args, view.kwargs = (), {}
+        view.adapter = self.adapter(request)
+        view.provider = view.adapter.provider
+        return view.get_client(request)
+
+    def run(self):
+        """Runs the rounds.
+
+        Returns:
+            :class:`BenchmarkResult`
+
+        """
+        result = BenchmarkResult()
+        session = get_http_session(self.adapter.url)
+
+        indexes = iter(range(self.rounds))
+        indexes_lock = threading.Lock()
+
+        def next_index():
+            with indexes_lock:
+                return next(indexes, None)
+
+        requests, connections = get_connection_stats(session)
+        threads = [
+            threading.Thread(target=self.work, args=(next_index, result))
+            for _ in range(self.concurrency)
+        ]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        result.duration = time.time() - start
+
+        after = get_connection_stats(session)
+        result.rounds = self.rounds
+        result.requests = after[0] - requests
+        result.connections = after[1] - connections
+        return result
+
+    def work(self, next_index, result):
+        while next_index() is not None:
+            try:
+                self.run_round(result)
+            except Exception as e:
+                result.add_error(_ADDRESS_RE.sub('', "{}: {}".format(
+                    e.__class__.__name__, e)))
+
+    def run_round(self, result):
+        client = self.get_client()
+
+        start = time.time()
+        ticket = self.get_ticket(client.service_url)
+        result.add_latency('ticket', time.time() - start)
+
+        start = time.time()
+        uid, _, _ = client.verify_ticket(ticket)
+        result.add_latency('validate', time.time() - start)
+        if not uid:
+            raise ValueError("The ticket was not validated.")
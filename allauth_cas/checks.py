@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from django.core import checks
+
+from allauth.socialaccount import providers
+
+from .providers import CASProvider
+from .urls import import_views
+
+
+@checks.register(checks.Tags.urls)
+def check_provider_views(app_configs, **kwargs):
+    """Checks that the CAS providers have their ``login`` and ``callback``
+    views, as the ``views`` module of a provider is imported on first use.
+    """
+    providers.registry.load()
+    errors = []
+    for cls in providers.registry.provider_map.values():
+        if not issubclass(cls, CASProvider):
+            continue
+        try:
+            import_views(cls)
+        except ImportError as e:
+            errors.append(checks.Error(
+                str(e), obj=cls, id='allauth_cas.E001'))
+    return errors
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import operator
+from functools import reduce
+
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+
+from allauth.account import app_settings as account_settings
+from allauth.account.models import EmailAddress
+from allauth.account.utils import user_email
+
+
+def normalize_email(email):
+    """Returns the form in which email addresses are stored and looked up."""
+    return email.strip().lower()
+
+
+def get_taken_emails(emails):
+    """Returns the addresses among ``emails`` which are already registered,
+    in their normalized form.
+
+    As in allauth, the lookups ignore the case, since existing addresses may
+    not be normalized. They are made with ``iexact``, as allauth does, rather
+    than on ``LOWER(email)``, which no index covers: the database can use an
+    index on the address where case-insensitive comparisons support it (e.g.
+    case-insensitive collations of MySQL, an index on ``UPPER(email)`` with
+    PostgreSQL).
+
+    Args:
+        emails (`list` of `str`)
+
+    Returns:
+        `set` of `str`
+
+    """
+    emails = set(normalize_email(email) for email in emails)
+    if not emails:
+        return set()
+    lookups = reduce(
+        operator.or_, (Q(email__iexact=email) for email in emails))
+    return set(
+        normalize_email(email) for email in
+        EmailAddress.objects.filter(lookups).values_list('email', flat=True)
+    )
+
+
+def sync_user_email_addresses(user, addresses, delete=False):
+    """Updates the email addresses of ``user`` to ``addresses``.
+
+    The current addresses of the user are read with a single query. Then,
+    only the needed changes are written, in bulk:
+
+    * missing addresses are inserted, unless they belong to another user
+      while ``ACCOUNT_UNIQUE_EMAIL`` is set;
+    * addresses which became verified are flagged as such;
+    * the primary address is moved, and ``user.email`` follows it;
+    * if ``delete`` is ``True``, the other addresses of the user are deleted.
+
+    Addresses are compared in their normalized form. Lookups on other users
+    addresses ignore the case, see :func:`get_taken_emails`.
+
+    Args:
+        user: A saved user.
+        addresses (`list` of `EmailAddress`): Addresses given by the CAS
+            server, with at most one primary address.
+        delete (bool)
+
+    """
+    current = dict(
+        (normalize_email(address.email), address)
+        for address in EmailAddress.objects.filter(user=user)
+    )
+    incoming = dict(
+        (normalize_email(address.email), address) for address in addresses
+    )
+
+    to_create = [
+        address for email, address in incoming.items()
+        if email not in current
+    ]
+    if to_create and account_settings.UNIQUE_EMAIL:
+        taken = get_taken_emails(address.email for address in to_create)
+        to_create = [
+            address for address in to_create
+            if normalize_email(address.email) not in taken
+        ]
+
+    to_verify = [
+        current[email].pk for email, address in incoming.items()
+        if email in current and address.verified and
+        not current[email].verified
+    ]
+
+    to_delete = [
+        address.pk for email, address in current.items()
+        if email not in incoming
+    ] if delete else []
+
+    # Move the primary flag.
+    old_primary = None
+    for address in current.values():
+        if address.primary and address.pk not in to_delete:
+            old_primary = address
+    new_primary = None
+    for email, address in incoming.items():
+        if address.primary:
+            new_primary = current.get(email, address)
+
+    if (new_primary is None or new_primary is old_primary or
+            new_primary.pk is None and new_primary not in to_create):
+        # The primary address is unchanged, or the new one belongs to another
+        # user.
+        primary = old_primary
+        new_primary = old_primary = None
+    else:
+        primary = new_primary
+
+    for address in to_create:
+        address.user = user
+        address.primary = address is new_primary
+    update_primary = new_primary is not None and new_primary.pk is not None
+
+    if to_delete:
+        EmailAddress.objects.filter(pk__in=to_delete).delete()
+    if old_primary is not None:
+        EmailAddress.objects.filter(pk=old_primary.pk).update(primary=False)
+    if to_create:
+        EmailAddress.objects.bulk_create(to_create)
+    if to_verify:
+        EmailAddress.objects.filter(pk__in=to_verify).update(verified=True)
+    if update_primary:
+        EmailAddress.objects.filter(pk=new_primary.pk).update(primary=True)
+    if (primary is not None and account_settings.USER_MODEL_EMAIL_FIELD and
+            user_email(user) != primary.email):
+        user_email(user, primary.email)
+        get_user_model().objects.filter(pk=user.pk).update(**{
+            account_settings.USER_MODEL_EMAIL_FIELD: primary.email,
+        })
@@ -5,3 +5,21 @@ class CASAuthenticationError(Exception):
     """
     Base exception to signal CAS authentication failure.
     """
+
+
+class CASRESTError(CASAuthenticationError):
+    """
+    Signals a failure while using the REST protocol of the CAS server.
+    """
+
+
+class CASAuthParamsError(CASAuthenticationError):
+    """
+    Signals dynamic ``auth_params`` rejected by the provider.
+    """
+
+
+class QueryBudgetExceeded(Exception):
+    """
+    Signals that a view executed more queries than its budget.
+    """
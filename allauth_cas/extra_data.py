@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import base64
+import json
+import logging
+import zlib
+
+logger = logging.getLogger(__name__)
+
+#: Key of the wrapper of compressed values.
+COMPRESSED_KEY = '$zlib'
+
+
+def _json_size(value):
+    return len(json.dumps(value, separators=(',', ':')).encode('utf-8'))
+
+
+def compress_value(value):
+    """Returns the compressed form of a JSON-serializable value."""
+    raw = json.dumps(value, separators=(',', ':')).encode('utf-8')
+    return {
+        COMPRESSED_KEY: base64.b64encode(zlib.compress(raw)).decode('ascii'),
+    }
+
+
+def decompress_value(value):
+    """Returns the original value, if ``value`` is compressed."""
+    if isinstance(value, dict) and list(value) == [COMPRESSED_KEY]:
+        raw = zlib.decompress(base64.b64decode(value[COMPRESSED_KEY]))
+        return json.loads(raw.decode('utf-8'))
+    return value
+
+
+def decode_extra_data(extra_data):
+    """Returns ``extra_data`` with all its values decompressed."""
+    return dict(
+        (key, decompress_value(value))
+        for key, value in (extra_data or {}).items()
+    )
+
+
+def compact_extra_data(extra_data, whitelist=None, blacklist=(),
+                       compress_threshold=None, max_size=None):
+    """Reduces the size of ``extra_data``, before it is stored.
+
+    Args:
+        extra_data (dict): Decoded extra data.
+        whitelist (optional): If set, only these attributes are kept.
+        blacklist: These attributes are dropped.
+        compress_threshold (int, optional): Multi-valued attributes whose JSON
+            size, in bytes, exceeds this threshold are compressed.
+        max_size (int, optional): Attributes whose JSON size, in bytes, exceeds
+            this size (once compressed, if it applies) are dropped.
+
+    Returns:
+        dict: The compacted extra data. ``'uid'`` is always kept.
+
+    """
+    ret = {}
+    for key, value in extra_data.items():
+        if key != 'uid':
+            if whitelist is not None and key not in whitelist:
+                continue
+            if key in blacklist:
+                continue
+
+        if compress_threshold is not None or max_size is not None:
+            size = _json_size(value)
+            if (compress_threshold is not None and
+                    isinstance(value, (list, tuple)) and
+                    size > compress_threshold):
+                value = compress_value(value)
+                size = _json_size(value)
+            if key != 'uid' and max_size is not None and size > max_size:
+                logger.warning(
+                    "Attribute '%s' is dropped from extra data, its size "
+                    "(%d bytes) exceeds %d bytes.", key, size, max_size,
+                )
+                continue
+
+        ret[key] = value
+    return ret
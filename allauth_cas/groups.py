@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+import six
+
+import re
+import threading
+
+from django.contrib.auth.models import Group
+from django.core.exceptions import ImproperlyConfigured
+
+_GROUP_REF_RE = re.compile(r'\\g<\w+>|\\\d+')
+
+_mappings = {}
+
+_group_pks = {}
+_group_pks_lock = threading.Lock()
+
+
+class GroupMappingRule(object):
+    """
+    Maps the values of a CAS attribute matching a pattern to a group.
+    """
+
+    def __init__(self, attribute, match, group):
+        self.attribute = attribute
+        self.match = re.compile(match)
+        self.group = group
+
+        # Groups which may be produced by this rule.
+        parts = _GROUP_REF_RE.split(group)
+        self.managed = re.compile(
+            '^' + '.+'.join(re.escape(part) for part in parts) + '$'
+        )
+
+    def get_groups(self, attributes):
+        values = attributes.get(self.attribute)
+        if values is None:
+            return
+        if isinstance(values, six.string_types):
+            values = [values]
+        for value in values:
+            if value is None:
+                continue
+            match = self.match.search(value)
+            if match is not None:
+                yield match.expand(self.group)
+
+
+class GroupMapping(object):
+    """Compiled rules of the ``GROUP_MAPPING`` setting of a provider.
+
+    Each rule is a `dict` with keys:
+
+    * ``'attribute'``: Name of the CAS attribute;
+    * ``'match'``: Regular expression searched in each value of the attribute;
+    * ``'group'``: Name of the group added to the user if a value matches. It
+      may contain references to the groups of ``match``, as ``\\g<name>``.
+
+    The groups managed by the mapping, i.e. those which may be produced by a
+    rule, are removed from a user if no rule produces them anymore. Other
+    groups of the user are left untouched.
+
+    """
+
+    def __init__(self, rules):
+        try:
+            self.rules = [GroupMappingRule(**rule) for rule in rules]
+        except (TypeError, re.error) as e:
+            raise ImproperlyConfigured(
+                "Invalid GROUP_MAPPING rule: {}".format(e))
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    __nonzero__ = __bool__
+
+    def get_groups(self, attributes):
+        groups = set()
+        for rule in self.rules:
+            groups.update(rule.get_groups(attributes))
+        return groups
+
+    def is_managed(self, group):
+        return any(rule.managed.match(group) for rule in self.rules)
+
+
+def get_group_mapping(provider):
+    """Returns the compiled group mapping of ``provider``.
+
+    The rules are compiled once per provider, until the settings change.
+    """
+    rules = provider.get_settings().get('GROUP_MAPPING', [])
+    cached = _mappings.get(provider.id)
+    if cached is None or cached[0] is not rules:
+        cached = _mappings[provider.id] = (rules, GroupMapping(rules))
+    return cached[1]
+
+
+def get_group_pks(names, create=True):
+    """Returns the primary keys of the groups named ``names``.
+
+    Results are cached by the process, and may be stale if groups are
+    deleted by another process: see :func:`sync_user_groups`. Missing groups
+    are created if ``create`` is ``True``, otherwise they are ignored.
+
+    Returns:
+        `dict`: Primary keys, by group name.
+
+    """
+    pks = {}
+    missing = []
+    for name in names:
+        try:
+            pks[name] = _group_pks[name]
+        except KeyError:
+            missing.append(name)
+
+    if not missing:
+        return pks
+
+    found = dict(
+        Group.objects.filter(name__in=missing).values_list('name', 'pk'))
+
+    if create:
+        for name in missing:
+            if name not in found:
+                # Concurrent logins may create the same group.
+                group, _ = Group.objects.get_or_create(name=name)
+                found[name] = group.pk
+
+    with _group_pks_lock:
+        _group_pks.update(found)
+    pks.update(found)
+    return pks
+
+
+def forget_group_pks(names):
+    """Drops the cached primary keys of the groups named ``names``."""
+    with _group_pks_lock:
+        for name in names:
+            _group_pks.pop(name, None)
+
+
+def clear_group_pks():
+    with _group_pks_lock:
+        _group_pks.clear()
+
+
+def sync_user_groups(user, groups, mapping, create=True):
+    """Updates the groups of ``user`` managed by ``mapping`` to ``groups``.
+
+    Only the differences with the current memberships are written, with a
+    ``bulk_create`` for the new memberships and a single ``DELETE`` for the
+    old ones.
+
+    Notes:
+        As the through model is used directly, ``m2m_changed`` signals are
+        not sent.
+
+    Returns:
+        (`set`, `set`): Primary keys of the added and removed groups.
+
+    """
+    manager = user.groups
+    through = manager.through
+    user_field = manager.source_field_name + '_id'
+    group_field = manager.target_field_name + '_id'
+
+    pks = get_group_pks(groups, create=create)
+
+    memberships = through.objects.filter(**{user_field: user.pk})
+    current = dict(memberships.values_list(
+        group_field, manager.target_field_name + '__name'))
+
+    to_add = set(pks.values()) - set(current)
+    if to_add:
+        # Cached pks of groups deleted by another process would break the
+        # foreign key: they are checked before being inserted.
+        existing = dict(
+            Group.objects.filter(pk__in=to_add).values_list('pk', 'name'))
+        stale = [
+            name for name, pk in pks.items()
+            if pk in to_add and existing.get(pk) != name
+        ]
+        if stale:
+            forget_group_pks(stale)
+            for name in stale:
+                del pks[name]
+            pks.update(get_group_pks(stale, create=create))
+            to_add = set(pks.values()) - set(current)
+
+    target = set(pks.values())
+    to_remove = set(
+        pk for pk, name in current.items()
+        if pk not in target and mapping.is_managed(name)
+    )
+
+    if to_add:
+        through.objects.bulk_create([
+            through(**{user_field: user.pk, group_field: pk})
+            for pk in to_add
+        ])
+    if to_remove:
+        memberships.filter(**{group_field + '__in': to_remove}).delete()
+
+    return to_add, to_remove
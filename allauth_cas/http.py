@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from six.moves.http_cookiejar import DefaultCookiePolicy
+from six.moves.urllib.parse import urljoin, urlsplit
+
+import threading
+
+# Headers of the SAML validation requests, as sent by python-cas.
+SAML_HEADERS = {
+    'soapaction': 'http://www.oasis-open.org/committees/security',
+    'cache-control': 'no-cache',
+    'pragma': 'no-cache',
+    'accept': 'text/xml',
+    'connection': 'keep-alive',
+    'content-type': 'text/xml; charset=utf-8',
+}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_http_session(server_url):
+    """Returns the HTTP session shared by the process for a CAS server.
+
+    Sessions are keyed by the scheme and location of ``server_url``, so that
+    every client talking to the same CAS server reuses the same pool of
+    connections.
+
+    As it is shared by all users, the session rejects cookies.
+
+    Args:
+        server_url (str): Url of the CAS server, as in `CASAdapter.url`.
+
+    Returns:
+        `requests.Session`
+
+    """
+    parts = urlsplit(server_url)
+    key = (parts.scheme, parts.netloc)
+    try:
+        return _sessions[key]
+    except KeyError:
+        pass
+    # Imported on first use, see allauth_cas.urls.
+    import requests
+
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            session.cookies.set_policy(
+                DefaultCookiePolicy(allowed_domains=[]))
+            _sessions[key] = session
+    return session
+
+
+def clear_http_sessions():
+    """Closes and forgets all the shared HTTP sessions."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def use_http_session(client, session):
+    """Makes a client of python-cas validate tickets through ``session``.
+
+    python-cas opens a new connection for each validation request. With a
+    shared session (see :func:`get_http_session`), connections to the CAS
+    server are kept alive and reused between requests.
+
+    The methods sending validation requests are replaced on the client
+    instance, and send the same requests as python-cas 1.4. It is only used
+    if ``ALLAUTH_CAS_HTTP_POOLING`` is enabled. Clients of the CAS 1 protocol
+    are left unchanged.
+
+    Args:
+        client: A client of python-cas.
+        session (`requests.Session`)
+
+    """
+    if hasattr(client, 'fetch_saml_validation'):
+        def fetch_saml_validation(ticket):
+            return session.post(
+                urljoin(client.server_url, 'samlValidate'),
+                client.get_saml_assertion(ticket),
+                params={'TARGET': client.service_url},
+                headers=SAML_HEADERS,
+            )
+
+        client.fetch_saml_validation = fetch_saml_validation
+
+    elif hasattr(client, 'get_verification_response'):
+        def get_verification_response(ticket):
+            params = {'ticket': ticket, 'service': client.service_url}
+            if client.proxy_callback:
+                params['pgtUrl'] = client.proxy_callback
+            response = session.get(
+                urljoin(client.server_url, client.url_suffix),
+                params=params,
+                verify=client.verify_ssl_certificate,
+            )
+            try:
+                return response.content
+            finally:
+                response.close()
+
+        client.get_verification_response = get_verification_response
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+import uuid
+
+from django.core.cache import caches
+
+# Locks to release when the request handled by the thread is finished.
+_request_locks = threading.local()
+
+
+class CacheLock(object):
+    """Lock shared by processes through a Django cache.
+
+    It relies on the atomicity of ``cache.add()``, so the cache backend must be
+    shared by all processes (e.g. memcached, redis or a database cache) for
+    the lock to be effective across processes.
+
+    The lock expires after ``timeout`` seconds, so that a crashed owner can't
+    hold it forever.
+
+    Args:
+        key (str): Cache key of the lock.
+        timeout (int): Lifetime of the lock, in seconds.
+        cache_alias (str): Alias of the cache in ``settings.CACHES``.
+
+    """
+
+    def __init__(self, key, timeout=30, cache_alias='default'):
+        self.key = key
+        self.timeout = timeout
+        self.cache = caches[cache_alias]
+        self.token = uuid.uuid4().hex
+
+    def acquire(self, wait=0, interval=0.05):
+        """Acquires the lock, waiting at most ``wait`` seconds.
+
+        Returns:
+            bool: ``True`` if the lock has been acquired.
+
+        """
+        deadline = time.time() + wait
+        while True:
+            if self.cache.add(self.key, self.token, self.timeout):
+                return True
+            if time.time() >= deadline:
+                return False
+            time.sleep(interval)
+
+    def release(self):
+        """Releases the lock, if it is still owned."""
+        if self.cache.get(self.key) == self.token:
+            self.cache.delete(self.key)
+
+
+def release_at_request_end(lock):
+    """Releases ``lock`` when the current request is finished, at the latest.
+
+    The lock is released by :func:`release_request_locks`, on the
+    ``request_finished`` signal, i.e. once the transaction of the request
+    (``ATOMIC_REQUESTS``) has been committed or rolled back.
+    """
+    if not hasattr(_request_locks, 'locks'):
+        _request_locks.locks = []
+    _request_locks.locks.append(lock)
+
+
+def release_request_locks():
+    """Releases the locks registered by :func:`release_at_request_end` in the
+    current thread, if they are still owned."""
+    locks = getattr(_request_locks, 'locks', None)
+    while locks:
+        locks.pop().release()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import getpass
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from allauth_cas.benchmark import Benchmark
+from allauth_cas.warmup import get_cas_callbacks
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs concurrent ticket validations against the CAS server of a "
+        "provider, through the client of its callback view, and reports "
+        "throughput, latencies, errors and connection reuse. Fails if a "
+        "round fails."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('provider_id')
+        parser.add_argument('--rounds', type=int, default=100)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument(
+            '--url',
+            help="Url of the CAS server. Default: the one of the adapter.",
+        )
+        parser.add_argument(
+            '--standin', action='store_true', default=False,
+            help="Run against a local stand-in CAS server.",
+        )
+        parser.add_argument(
+            '--username',
+            help="User whose service tickets are requested through the REST "
+                 "protocol of the CAS server. Its password is read from "
+                 "CAS_BENCHMARK_PASSWORD, or prompted.",
+        )
+        parser.add_argument(
+            '--host', default='testserver',
+            help="Host of the service url, unless the provider sets "
+                 "SERVICE_BASE_URL.",
+        )
+
+    def handle(self, provider_id, **options):
+        try:
+            callback = get_cas_callbacks([provider_id])[provider_id]
+        except KeyError:
+            raise CommandError(
+                "Unknown CAS provider '{}'.".format(provider_id))
+
+        server = None
+        url = options['url']
+        if options['standin']:
+            from allauth_cas.test.server import CASStandInServer
+
+            server = CASStandInServer(
+                username=options['username'] or 'benchmark').start()
+            url = server.url
+
+            def get_ticket(service):
+                return server.issue_ticket()
+        elif options['username']:
+            get_ticket = self.get_rest_ticket_getter(
+                callback.adapter, url, options['username'])
+        else:
+            raise CommandError("Use --standin, or give a --username.")
+
+        benchmark = Benchmark(
+            callback, get_ticket, url=url,
+            rounds=options['rounds'],
+            concurrency=options['concurrency'],
+            host=options['host'],
+        )
+        try:
+            result = benchmark.run()
+        finally:
+            if server is not None:
+                server.stop()
+
+        self.stdout.write(
+            "{} ({}):".format(provider_id, benchmark.adapter.url))
+        self.stdout.write(str(result))
+
+        if result.failed:
+            raise CommandError("{} of {} rounds failed.".format(
+                result.failed, result.rounds))
+        self.stdout.write(self.style.SUCCESS(
+            "Done: {} rounds.".format(result.rounds)))
+
+    def get_rest_ticket_getter(self, adapter, url, username):
+        from allauth_cas.rest import CASRESTClient
+
+        if url:
+            adapter = type(adapter.__name__, (adapter,), {'url': url})
+        password = os.environ.get('CAS_BENCHMARK_PASSWORD')
+        if password is None:
+            password = getpass.getpass("Password of {}: ".format(username))
+        client = CASRESTClient(adapter)
+
+        def get_ticket(service):
+            return client.get_service_ticket(username, password, service)
+
+        return get_ticket
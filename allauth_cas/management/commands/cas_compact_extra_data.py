@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand, CommandError
+
+from allauth.socialaccount import providers
+
+from allauth_cas.provisioning import bulk_compact_extra_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Applies the extra data settings of a CAS provider (whitelist, "
+        "blacklist, compression, size cap) to its existing social accounts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('provider_id')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--dry-run', action='store_true', default=False,
+            help="Only report the number of changes.",
+        )
+
+    def handle(self, provider_id, **options):
+        try:
+            provider = providers.registry.by_id(provider_id)
+        except KeyError:
+            raise CommandError("Unknown provider '{}'.".format(provider_id))
+
+        result = None
+        for result in bulk_compact_extra_data(
+                provider,
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run']):
+            if options['verbosity'] >= 2:
+                self.stdout.write(str(result))
+
+        if result is not None:
+            prefix = "Dry run" if options['dry_run'] else "Done"
+            self.stdout.write(
+                self.style.SUCCESS("{}: {}.".format(prefix, result)))
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import io
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from allauth.socialaccount import providers
+
+from allauth_cas.provisioning import bulk_deprovision, check_sorted_uids
+
+
+def read_uids(stream):
+    """Yields the uids of a list, one per line."""
+    for line in stream:
+        uid = line.strip()
+        if uid:
+            yield uid
+
+
+class Command(BaseCommand):
+    help = (
+        "Deactivates the users of a CAS provider whose uid is missing from "
+        "the authoritative list of uids."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('provider_id')
+        parser.add_argument(
+            'path',
+            help="Path of the uids list, one per line, or '-' to read from "
+                 "the standard input.",
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--dry-run', action='store_true', default=False,
+            help="Only report the users which would be deactivated.",
+        )
+        parser.add_argument(
+            '--sorted', action='store_true', default=False, dest='presorted',
+            help="The uids list is sorted by code points (e.g. with "
+                 "'LC_ALL=C sort'): stream it instead of loading it in "
+                 "memory. Its order is checked in a first pass, so it must "
+                 "be read from a file.",
+        )
+
+    def handle(self, provider_id, path, **options):
+        try:
+            provider = providers.registry.by_id(provider_id)
+        except KeyError:
+            raise CommandError("Unknown provider '{}'.".format(provider_id))
+
+        if options['presorted']:
+            if path == '-':
+                raise CommandError(
+                    "--sorted requires a path, to check the order of the uids "
+                    "list before deactivating users.")
+            with io.open(path, encoding='utf-8') as stream:
+                try:
+                    check_sorted_uids(provider, read_uids(stream))
+                except ValueError as e:
+                    raise CommandError(str(e))
+
+        if path == '-':
+            stream = sys.stdin
+        else:
+            stream = io.open(path, encoding='utf-8')
+
+        try:
+            runner = bulk_deprovision(
+                provider, read_uids(stream),
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+                presorted=options['presorted'],
+            )
+            result = None
+            for result, missing in runner:
+                if options['verbosity'] >= 2:
+                    for uid in missing:
+                        self.stdout.write("Missing upstream: {}".format(uid))
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        if result is not None:
+            prefix = "Dry run" if options['dry_run'] else "Done"
+            self.stdout.write(
+                self.style.SUCCESS("{}: {}.".format(prefix, result)))
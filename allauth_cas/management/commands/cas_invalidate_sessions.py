@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import io
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from allauth.socialaccount import providers
+from allauth.socialaccount.models import SocialAccount
+
+from allauth_cas.provisioning import iter_chunks
+from allauth_cas.sessions import InvalidationResult, invalidate_user_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes the sessions opened by a CAS login of users, using the "
+        "session index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'users', nargs='*',
+            help="Usernames, or uids with --provider.",
+        )
+        parser.add_argument(
+            '--provider',
+            help="Id of the CAS provider the given uids belong to.",
+        )
+        parser.add_argument(
+            '--file',
+            help="Path of a list of users, one per line, or '-' to read from "
+                 "the standard input.",
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, users, **options):
+        provider = None
+        if options['provider']:
+            try:
+                provider = providers.registry.by_id(options['provider'])
+            except KeyError:
+                raise CommandError(
+                    "Unknown provider '{}'.".format(options['provider']))
+
+        names = list(users)
+        if options['file']:
+            names.extend(self.read_file(options['file']))
+        if not names:
+            raise CommandError("No users given.")
+
+        result = InvalidationResult()
+        for chunk in iter_chunks(names, options['batch_size']):
+            try:
+                chunk_result = invalidate_user_sessions(
+                    self.get_user_pks(chunk, provider))
+            except ImproperlyConfigured as e:
+                raise CommandError(str(e))
+            result.users += chunk_result.users
+            result.sessions += chunk_result.sessions
+
+        self.stdout.write(self.style.SUCCESS("Done: {}.".format(result)))
+
+    def read_file(self, path):
+        if path == '-':
+            stream = sys.stdin
+        else:
+            stream = io.open(path, encoding='utf-8')
+        try:
+            return [line.strip() for line in stream if line.strip()]
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+    def get_user_pks(self, names, provider):
+        if provider is not None:
+            return SocialAccount.objects.filter(
+                provider=provider.id,
+                uid__in=[provider.extract_uid((uid, {})) for uid in names],
+            ).values_list('user_id', flat=True)
+        User = get_user_model()
+        return User.objects.filter(**{
+            User.USERNAME_FIELD + '__in': names,
+        }).values_list('pk', flat=True)
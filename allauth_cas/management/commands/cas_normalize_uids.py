@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand, CommandError
+
+from allauth.socialaccount import providers
+
+from allauth_cas.provisioning import bulk_normalize_uids
+
+
+class Command(BaseCommand):
+    help = (
+        "Applies the uid normalization of a CAS provider to its existing "
+        "social accounts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('provider_id')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--dry-run', action='store_true', default=False,
+            help="Only report the changes.",
+        )
+
+    def handle(self, provider_id, **options):
+        try:
+            provider = providers.registry.by_id(provider_id)
+        except KeyError:
+            raise CommandError("Unknown provider '{}'.".format(provider_id))
+
+        runner = bulk_normalize_uids(
+            provider,
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        result = None
+        for result, conflicts in runner:
+            for uid, normalized in conflicts:
+                self.stderr.write(
+                    "Conflict: '{}' can't be renamed to '{}', already used."
+                    .format(uid, normalized)
+                )
+
+        if result is not None:
+            prefix = "Dry run" if options['dry_run'] else "Done"
+            self.stdout.write(
+                self.style.SUCCESS("{}: {}.".format(prefix, result)))
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from six import StringIO
+
+from django.core.management.base import BaseCommand, CommandError
+
+from allauth_cas.profiling import get_profile_store
+
+
+class Command(BaseCommand):
+    help = "Shows the hottest functions of the profiled CAS views."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'views', nargs='*', metavar='view',
+            help="Names of the views, as '<provider id>.<view class>'. "
+                 "By default, all profiled views.",
+        )
+        parser.add_argument(
+            '--sort', default='cumulative',
+            choices=['cumulative', 'tottime', 'ncalls'],
+        )
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help="Number of functions shown per view.",
+        )
+
+    def handle(self, views, **options):
+        store = get_profile_store()
+        if store is None:
+            raise CommandError(
+                "Profiling is disabled, set ALLAUTH_CAS_PROFILING_DIR.")
+
+        for view_name in views or store.get_views():
+            count = len(store.get_profiles(view_name))
+            output = StringIO()
+            stats = store.get_stats(view_name, stream=output)
+            if stats is None:
+                self.stderr.write("{}: no profiles.".format(view_name))
+                continue
+
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                "{}: {} profiles".format(view_name, count)))
+            stats.sort_stats(options['sort']).print_stats(options['limit'])
+            self.stdout.write(output.getvalue())
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import six
+
+import csv
+import io
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from allauth.socialaccount import providers
+
+from allauth_cas.provisioning import bulk_provision
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates the accounts of CAS users from an export of their "
+        "attributes (CSV or JSON lines), before their first login."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('provider_id')
+        parser.add_argument(
+            'path',
+            help="Path of the export, or '-' to read from the standard input.",
+        )
+        parser.add_argument(
+            '--format', choices=['csv', 'jsonl'],
+            help="Format of the export. Default to the extension of path.",
+        )
+        parser.add_argument(
+            '--uid-field', default='uid',
+            help="CSV column of the uid. Default: 'uid'.",
+        )
+        parser.add_argument(
+            '--separator',
+            help="Split the CSV values on this separator, for multi-valued "
+                 "attributes.",
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, provider_id, path, **options):
+        try:
+            provider = providers.registry.by_id(provider_id)
+        except KeyError:
+            raise CommandError("Unknown provider '{}'.".format(provider_id))
+
+        fmt = options['format'] or path.rpartition('.')[2]
+        if fmt not in ('csv', 'jsonl'):
+            raise CommandError("Unable to guess the format of the export.")
+
+        stream = self.open(path)
+        try:
+            if fmt == 'csv':
+                rows = self.read_csv(
+                    stream, options['uid_field'], options['separator'])
+            else:
+                rows = self.read_jsonl(stream)
+
+            result = None
+            for result in bulk_provision(
+                    provider, rows, batch_size=options['batch_size']):
+                if options['verbosity'] >= 1:
+                    self.stdout.write(str(result))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        if result is not None:
+            self.stdout.write(self.style.SUCCESS("Done: {}.".format(result)))
+
+    def open(self, path):
+        if path == '-':
+            return sys.stdin
+        if six.PY2:
+            return open(path, 'rb')
+        return io.open(path, encoding='utf-8', newline='')
+
+    def read_csv(self, stream, uid_field, separator=None):
+        for row in csv.DictReader(stream):
+            if six.PY2:
+                row = dict(
+                    (key.decode('utf-8'), value.decode('utf-8'))
+                    for key, value in row.items()
+                )
+            try:
+                uid = row.pop(uid_field)
+            except KeyError:
+                raise CommandError(
+                    "Column '{}' is missing.".format(uid_field))
+            attributes = {}
+            for key, value in row.items():
+                if not value:
+                    continue
+                if separator and separator in value:
+                    value = value.split(separator)
+                attributes[key] = value
+            yield uid, attributes
+
+    def read_jsonl(self, stream):
+        for line in stream:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            line = line.strip()
+            if not line:
+                continue
+            obj = json.loads(line)
+            yield obj['uid'], obj.get('attributes') or {}
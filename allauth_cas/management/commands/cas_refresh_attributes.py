@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from allauth_cas.refresh import get_active_uids, refresh_attributes
+from allauth_cas.registry import get_provider
+
+
+class Command(BaseCommand):
+    help = (
+        "Updates the attributes of the users of a CAS provider from its "
+        "ATTRIBUTES_FETCHER, without a login. Meant to be run on a schedule."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('provider_id')
+        parser.add_argument(
+            'uids', nargs='*',
+            help="Uids of the users. Default: the users logged in since "
+                 "--since seconds.",
+        )
+        parser.add_argument(
+            '--since', type=int,
+            help="Age of the oldest login refreshed, in seconds. Default: "
+                 "SESSION_COOKIE_AGE.",
+        )
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--rate', type=float,
+            help="Maximum number of users fetched per second.",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true', default=False,
+            help="Only report the users whose attributes would be updated.",
+        )
+
+    def handle(self, provider_id, uids, **options):
+        try:
+            provider = get_provider(provider_id)
+        except KeyError:
+            raise CommandError("Unknown provider '{}'.".format(provider_id))
+
+        if not uids:
+            uids = get_active_uids(provider, since=options['since'])
+
+        result = None
+        try:
+            for result in refresh_attributes(
+                    provider, uids,
+                    batch_size=options['batch_size'],
+                    rate=options['rate'],
+                    dry_run=options['dry_run']):
+                if options['verbosity'] >= 2:
+                    self.stdout.write(str(result))
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+
+        if result is not None:
+            prefix = "Dry run" if options['dry_run'] else "Done"
+            self.stdout.write(
+                self.style.SUCCESS("{}: {}.".format(prefix, result)))
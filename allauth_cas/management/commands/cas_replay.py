@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from allauth_cas.recording import load_recordings
+from allauth_cas.replay import ReplayRunner, load_baseline, save_baseline
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays recorded CAS validation responses through the views of a "
+        "provider, against a local CAS server, and compares their latency and "
+        "allocations to a baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'adapter', help="Dotted path of the CASAdapter subclass.")
+        parser.add_argument('path', help="File of recorded responses.")
+        parser.add_argument('--baseline', help="File of the baseline.")
+        parser.add_argument(
+            '--update-baseline', action='store_true', default=False,
+            help="Write the measures as the new baseline.",
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--latency-budget', type=float, default=1.5,
+            help="Maximum ratio of the latency to the baseline.",
+        )
+        parser.add_argument(
+            '--allocation-budget', type=float, default=1.5,
+            help="Maximum ratio of the allocations to the baseline.",
+        )
+        parser.add_argument(
+            '--max-latency', type=float,
+            help="Maximum latency, in seconds.",
+        )
+
+    def handle(self, adapter, path, **options):
+        try:
+            adapter = import_string(adapter)
+        except ImportError as e:
+            raise CommandError(str(e))
+
+        if options['update_baseline'] and not options['baseline']:
+            raise CommandError("--update-baseline requires --baseline.")
+
+        baseline = None
+        if options['baseline'] and not options['update_baseline']:
+            baseline = load_baseline(options['baseline'])
+
+        runner = ReplayRunner(
+            adapter,
+            repeat=options['repeat'],
+            latency_budget=options['latency_budget'],
+            allocation_budget=options['allocation_budget'],
+            max_latency=options['max_latency'],
+        )
+        results = runner.run(load_recordings(path), baseline=baseline)
+
+        for result in results:
+            if result.passed:
+                self.stdout.write(str(result))
+            else:
+                self.stdout.write(self.style.ERROR(str(result)))
+
+        if options['update_baseline']:
+            save_baseline(results, options['baseline'])
+
+        failed = sum(1 for result in results if not result.passed)
+        if failed:
+            raise CommandError(
+                "{} of {} responses exceeded their budgets.".format(
+                    failed, len(results)))
+        self.stdout.write(self.style.SUCCESS(
+            "Done: {} responses replayed.".format(len(results))))
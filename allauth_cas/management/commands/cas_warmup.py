@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand, CommandError
+
+from allauth_cas.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports the ticket validation stack and opens connections to the "
+        "CAS servers. Fails if a CAS server can't be reached."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'provider_ids', nargs='*',
+            help="Ids of the providers. Default: all the CAS providers.",
+        )
+        parser.add_argument(
+            '--connections', type=int, default=1,
+            help="Number of connections opened to each CAS server.",
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=5,
+            help="Timeout of the requests, in seconds.",
+        )
+
+    def handle(self, provider_ids, **options):
+        try:
+            import_time, results = warm_up(
+                provider_ids,
+                connections=options['connections'],
+                timeout=options['timeout'],
+            )
+        except KeyError as e:
+            raise CommandError(
+                "Unknown CAS provider '{}'.".format(e.args[0]))
+
+        self.stdout.write("Validation stack imported in {:.1f} ms.".format(
+            import_time * 1000))
+        for result in results:
+            if result.ok:
+                self.stdout.write(str(result))
+            else:
+                self.stdout.write(self.style.ERROR(str(result)))
+
+        failed = sum(1 for result in results if not result.ok)
+        if failed:
+            raise CommandError(
+                "{} of {} providers failed to warm up.".format(
+                    failed, len(results)))
+        self.stdout.write(self.style.SUCCESS(
+            "Done: {} providers warmed up.".format(len(results))))
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import re
+
+import django
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponseRedirect
+
+from . import app_settings
+from .registry import get_provider
+
+if django.VERSION >= (1, 10):
+    from django.urls import (
+        NoReverseMatch, get_script_prefix, get_urlconf, reverse,
+    )
+    from django.utils.deprecation import MiddlewareMixin
+else:
+    from django.core.urlresolvers import (
+        NoReverseMatch, get_script_prefix, get_urlconf, reverse,
+    )
+    MiddlewareMixin = object
+
+
+def get_gateway_cache_key(request):
+    """Returns the cache key of the client of ``request``, identified by its
+    IP address and its user agent."""
+    client = u'{}\n{}'.format(
+        request.META.get('REMOTE_ADDR', ''),
+        request.META.get('HTTP_USER_AGENT', ''),
+    )
+    return 'allauth_cas:gateway:{}'.format(
+        hashlib.sha1(client.encode('utf-8')).hexdigest())
+
+
+def set_gateway_cache(request):
+    """Remembers that a gateway login has been tried by a client which
+    doesn't keep cookies, see :func:`~allauth_cas.views.set_gateway_cookie`.
+
+    Gateway logins are not tried again for this client for
+    ``ALLAUTH_CAS_GATEWAY_NEGATIVE_TTL`` seconds.
+    """
+    caches[app_settings.GATEWAY_CACHE].set(
+        get_gateway_cache_key(request), True,
+        app_settings.GATEWAY_NEGATIVE_TTL,
+    )
+
+
+class CASGatewayMiddleware(MiddlewareMixin):
+    """Tries a gateway login for anonymous users.
+
+    An anonymous user requesting a page is redirected to the CAS server of
+    the ``ALLAUTH_CAS_GATEWAY_PROVIDER`` provider, without being prompted
+    for their credentials. If they have an SSO session, they come back
+    logged in; otherwise they come back to the requested page, as an
+    anonymous user.
+
+    The result is remembered by a cookie, so that the CAS server is not
+    requested again for ``ALLAUTH_CAS_GATEWAY_NEGATIVE_TTL`` seconds. The
+    cookie is also set on logout, so that a user logging out of the site only
+    is not logged in again by the next request. For clients which come back
+    without the cookie, it is remembered in the ``ALLAUTH_CAS_GATEWAY_CACHE``
+    cache instead, see :func:`set_gateway_cache`.
+
+    Only ``GET`` and ``HEAD`` requests, which are not AJAX, and whose path
+    matches ``ALLAUTH_CAS_GATEWAY_PATHS`` but not
+    ``ALLAUTH_CAS_GATEWAY_EXEMPT_PATHS``, are redirected.
+
+    It must be placed after ``AuthenticationMiddleware``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(CASGatewayMiddleware, self).__init__(*args, **kwargs)
+        self.provider_id = app_settings.GATEWAY_PROVIDER
+        if not self.provider_id:
+            raise ImproperlyConfigured(
+                "CASGatewayMiddleware requires "
+                "ALLAUTH_CAS_GATEWAY_PROVIDER to be set."
+            )
+        self.paths = [re.compile(p) for p in app_settings.GATEWAY_PATHS]
+        self.exempt_paths = [
+            re.compile(p) for p in app_settings.GATEWAY_EXEMPT_PATHS]
+        self._provider_paths = {}
+
+    def process_request(self, request):
+        if not self.should_try(request):
+            return None
+        provider = get_provider(self.provider_id, request)
+        return HttpResponseRedirect(provider.get_login_url(
+            request, action='gateway', next=request.get_full_path()))
+
+    def process_response(self, request, response):
+        if getattr(request, 'cas_gateway_logout', False):
+            from .views import set_gateway_cookie
+            set_gateway_cookie(response)
+        return response
+
+    def should_try(self, request):
+        """Returns whether a gateway login should be tried for ``request``."""
+        if request.method not in ('GET', 'HEAD') or request.is_ajax():
+            return False
+        if app_settings.GATEWAY_COOKIE_NAME in request.COOKIES:
+            return False
+
+        is_authenticated = request.user.is_authenticated
+        if callable(is_authenticated):  # Django < 1.10
+            is_authenticated = is_authenticated()
+        if is_authenticated:
+            return False
+
+        if request.path in self.get_provider_paths():
+            return False
+        path = request.path_info
+        if not any(p.search(path) for p in self.paths):
+            return False
+        if any(p.search(path) for p in self.exempt_paths):
+            return False
+
+        cache = caches[app_settings.GATEWAY_CACHE]
+        return cache.get(get_gateway_cache_key(request)) is None
+
+    def get_provider_paths(self):
+        # The URLconf and the script prefix may differ per request.
+        key = (get_urlconf() or settings.ROOT_URLCONF, get_script_prefix())
+        paths = self._provider_paths.get(key)
+        if paths is None:
+            paths = set()
+            for name in ('login', 'callback', 'logout'):
+                try:
+                    paths.add(reverse('{}_{}'.format(self.provider_id, name)))
+                except NoReverseMatch:  # No logout view.
+                    pass
+            paths = self._provider_paths[key] = frozenset(paths)
+        return paths
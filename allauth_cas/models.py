@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+
+class AbstractCASAuditEvent(models.Model):
+    """
+    Base model of the audit events of CAS authentications.
+
+    Subclass it in one of your apps to store audit events with
+    :class:`~allauth_cas.audit.ModelSink`.
+    """
+    kind = models.CharField(_("kind"), max_length=16, db_index=True)
+    provider = models.CharField(_("provider"), max_length=30)
+    uid = models.CharField(_("uid"), max_length=191, blank=True, db_index=True)
+    ip = models.GenericIPAddressField(_("IP address"), null=True, blank=True)
+    latency = models.FloatField(_("validation latency"), null=True, blank=True)
+    detail = models.TextField(_("detail"), blank=True)
+    created_at = models.DateTimeField(_("created at"), db_index=True)
+
+    class Meta:
+        abstract = True
+        verbose_name = _("CAS audit event")
+        verbose_name_plural = _("CAS audit events")
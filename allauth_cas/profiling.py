@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+import cProfile
+import errno
+import itertools
+import logging
+import os
+import pstats
+import re
+import time
+
+from . import app_settings
+
+logger = logging.getLogger(__name__)
+
+_VIEW_NAME_RE = re.compile(r'[^\w.-]')
+_PROFILE_NAME_RE = re.compile(r'^(\d+)-(\d+)-(\d+)-\d+ms\.prof$')
+
+_requests = itertools.count(1)
+
+
+class ProfileStore(object):
+    """Stores profiles on disk, one directory per view.
+
+    Profiles are written in the format of :mod:`pstats`. At most
+    ``max_files`` profiles are kept per view, oldest profiles being removed
+    beyond.
+
+    Args:
+        path (str): Root directory of the store.
+        max_files (int)
+
+    """
+
+    def __init__(self, path, max_files=100):
+        self.path = path
+        self.max_files = max_files
+
+    def get_view_path(self, view_name):
+        return os.path.join(self.path, _VIEW_NAME_RE.sub('_', view_name))
+
+    def save(self, view_name, profiler, duration, seq=0):
+        """Writes the profile of a request, and rotates the profiles of the
+        view.
+
+        Returns:
+            str: Path of the profile.
+
+        """
+        view_path = self.get_view_path(view_name)
+        try:
+            os.makedirs(view_path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        filename = '{:d}-{:d}-{:d}-{:d}ms.prof'.format(
+            int(time.time() * 1000), os.getpid(), seq, int(duration * 1000))
+        path = os.path.join(view_path, filename)
+        profiler.dump_stats(path)
+
+        self.rotate(view_name)
+        return path
+
+    def rotate(self, view_name):
+        for path in self.get_profiles(view_name)[:-self.max_files or None]:
+            try:
+                os.remove(path)
+            except OSError:
+                # Already removed by another process.
+                pass
+
+    def get_views(self):
+        """Returns the names of the views having profiles."""
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return []
+        return sorted(
+            name for name in names
+            if os.path.isdir(os.path.join(self.path, name))
+        )
+
+    def get_profiles(self, view_name):
+        """Returns the paths of the profiles of a view, oldest first."""
+        view_path = self.get_view_path(view_name)
+        try:
+            names = os.listdir(view_path)
+        except OSError:
+            return []
+        # Names are '<timestamp in ms>-<pid>-<seq>-<duration>ms.prof'.
+        profiles = []
+        for name in names:
+            match = _PROFILE_NAME_RE.match(name)
+            if match is not None:
+                key = tuple(int(part) for part in match.groups())
+                profiles.append((key, os.path.join(view_path, name)))
+        return [path for _, path in sorted(profiles)]
+
+    def get_stats(self, view_name, stream=None):
+        """Returns the aggregated profiles of a view.
+
+        Returns:
+            `pstats.Stats`, or ``None`` if the view has no profiles.
+
+        """
+        stats = None
+        for path in self.get_profiles(view_name):
+            try:
+                if stats is None:
+                    stats = pstats.Stats(path, stream=stream)
+                else:
+                    stats.add(path)
+            except (IOError, OSError, EOFError, ValueError):
+                # Removed by a rotation, or partially written.
+                continue
+        return stats
+
+
+def get_profile_store():
+    """Returns the store configured by the settings, or ``None``."""
+    if not app_settings.PROFILING_DIR:
+        return None
+    return ProfileStore(
+        app_settings.PROFILING_DIR,
+        max_files=app_settings.PROFILING_MAX_FILES,
+    )
+
+
+def profile_request(view_name, func, *args, **kwargs):
+    """Calls ``func``, profiling it if the request is sampled.
+
+    Profiling is enabled by ``ALLAUTH_CAS_PROFILING_DIR``. Then, one request
+    out of ``ALLAUTH_CAS_PROFILING_SAMPLE_RATE`` is profiled, and its profile
+    is kept if it lasted at least ``ALLAUTH_CAS_PROFILING_LATENCY_THRESHOLD``
+    seconds.
+
+    Returns:
+        The result of ``func``.
+
+    """
+    store = get_profile_store()
+    rate = app_settings.PROFILING_SAMPLE_RATE
+    if store is None or not rate:
+        return func(*args, **kwargs)
+
+    seq = next(_requests)
+    if seq % rate:
+        return func(*args, **kwargs)
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active in this thread.
+        return func(*args, **kwargs)
+
+    start = time.time()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        duration = time.time() - start
+        if duration >= app_settings.PROFILING_LATENCY_THRESHOLD:
+            try:
+                store.save(view_name, profiler, duration, seq=seq)
+            except (IOError, OSError):
+                logger.exception(
+                    "Unable to save the profile of %s.", view_name)
@@ -1,29 +1,155 @@
 # -*- coding: utf-8 -*-
-from six.moves.urllib.parse import parse_qsl
+import six
+from six.moves.urllib.parse import parse_qsl, urlsplit
+
+import time
 
 import django
 from django.contrib import messages
-from django.template.loader import render_to_string
+from django.core.exceptions import ImproperlyConfigured
+from django.template.loader import get_template
+from django.utils.encoding import python_2_unicode_compatible
+from django.utils.functional import Promise
 from django.utils.http import urlencode
 from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
 
+from allauth.account.models import EmailAddress
 from allauth.socialaccount.providers.base import Provider
 
+from . import app_settings
+from .exceptions import CASAuthParamsError
+from .lru import LRUCache
+from .registry import get_generation
+
 if django.VERSION >= (1, 10):
-    from django.urls import reverse
+    from django.urls import get_script_prefix, get_urlconf, reverse
 else:
-    from django.core.urlresolvers import reverse
+    from django.core.urlresolvers import (
+        get_script_prefix, get_urlconf, reverse,
+    )
+
+
+# Parameters of the CAS protocol, which dynamic auth_params can't override.
+RESERVED_AUTH_PARAMS = frozenset(['service', 'ticket', 'renew', 'gateway'])
+
+UID_NORMALIZERS = {
+    'strip': lambda uid: uid.strip(),
+    'lower': lambda uid: uid.lower(),
+    'casefold': lambda uid: getattr(uid, 'casefold', uid.lower)(),
+}
+
+
+@python_2_unicode_compatible
+class LazyMessage(Promise):
+    """A message rendered by ``func(*args)`` when it is first converted to
+    text.
+
+    Unlike ``django.utils.functional.lazy``, checking its truth value, as
+    the messages framework does when a message is added, doesn't render it.
+    """
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __bool__(self):
+        return True
+
+    __nonzero__ = __bool__
+
+    def __str__(self):
+        try:
+            return self._text
+        except AttributeError:
+            self._text = self.func(*self.args)
+            return self._text
+
+    def __html__(self):
+        return six.text_type(self)
 
 
 class CASProvider(Provider):
 
+    def __init__(self, request):
+        super(CASProvider, self).__init__(request)
+        # Request-independent state, shared by the copies of this instance.
+        self._shared = {}
+
     def get_auth_params(self, request, action):
+        """Returns the extra parameters of the login url of the CAS server.
+
+        These are the static ``AUTH_PARAMS`` of the provider settings,
+        updated with the dynamic ones of the GET param ``auth_params``.
+
+        Dynamic parameters are checked against the provider settings:
+
+        * ``AUTH_PARAMS_MAX_LENGTH``: maximum length of the encoded
+          ``auth_params`` (default: ``1024``);
+        * ``AUTH_PARAMS_ALLOWED``: allowed keys (default: ``None``, all keys
+          are allowed).
+
+        Validated sets are cached by their encoded value, in a LRU cache of
+        ``AUTH_PARAMS_CACHE_SIZE`` entries (default: ``128``, ``0`` disables
+        the cache).
+
+        Returns:
+            dict: A new dict, which may be modified by the caller.
+
+        Raises:
+            CASAuthParamsError: If the dynamic parameters are rejected.
+
+        """
         settings = self.get_settings()
-        ret = dict(settings.get('AUTH_PARAMS', {}))
         dynamic_auth_params = request.GET.get('auth_params')
-        if dynamic_auth_params:
-            ret.update(dict(parse_qsl(dynamic_auth_params)))
-        return ret
+        if not dynamic_auth_params:
+            return dict(settings.get('AUTH_PARAMS', {}))
+
+        max_length = settings.get('AUTH_PARAMS_MAX_LENGTH', 1024)
+        if len(dynamic_auth_params) > max_length:
+            raise CASAuthParamsError(
+                "auth_params of {} characters, over the limit of {}.".format(
+                    len(dynamic_auth_params), max_length)
+            )
+
+        cache_size = settings.get('AUTH_PARAMS_CACHE_SIZE', 128)
+        cache = None
+        if cache_size:
+            cache = self.get_shared(
+                'auth_params_cache', lambda: LRUCache(cache_size))
+            auth_params = cache.get(dynamic_auth_params)
+            if auth_params is not None:
+                return dict(auth_params)
+
+        auth_params = dict(settings.get('AUTH_PARAMS', {}))
+        auth_params.update(self.parse_auth_params(dynamic_auth_params))
+
+        if cache is not None:
+            cache.set(dynamic_auth_params, auth_params)
+        return dict(auth_params)
+
+    def parse_auth_params(self, value):
+        """Parses and validates the encoded dynamic ``auth_params``.
+
+        Keys of the CAS protocol set by the client (``service``, ``ticket``,
+        ``renew``, ``gateway``) are always rejected.
+
+        Raises:
+            CASAuthParamsError: If a key is reserved, or isn't in
+                ``AUTH_PARAMS_ALLOWED``.
+
+        """
+        params = dict(parse_qsl(value))
+        rejected = set(params) & RESERVED_AUTH_PARAMS
+        allowed = self.get_settings().get('AUTH_PARAMS_ALLOWED')
+        if allowed is not None:
+            rejected |= set(params) - set(allowed)
+        if rejected:
+            raise CASAuthParamsError(
+                "auth_params not allowed: {}.".format(
+                    ", ".join(sorted(rejected)))
+            )
+        return params
 
     ##
     # Data extraction from CAS responses.
@@ -41,10 +167,40 @@ class CASProvider(Provider):
                 ``('alice', {'name': 'Alice'})``
 
         Returns:
-            str: Default to ``data[0]``, user identifier for the CAS server.
+            str: Default to ``data[0]``, user identifier for the CAS server,
+            normalized by :meth:`normalize_uid`.
 
         """
         uid, _ = data
+        return self.normalize_uid(uid)
+
+    def normalize_uid(self, uid):
+        """Normalize a uid returned by the CAS server.
+
+        Social accounts are looked up by exact match on their uid, which is
+        backed by an index. Normalizing uids before they are stored and
+        looked up keeps this lookup index-backed, even if the CAS server is
+        inconsistent about the case or whitespaces of uids.
+
+        By default, it applies the steps listed in
+        ``settings.SOCIALACCOUNT_PROVIDERS[self.id]['UID_NORMALIZATION']``, in
+        order, among ``'strip'``, ``'lower'`` and ``'casefold'``. No step is
+        applied by default.
+
+        Notes:
+            Existing social accounts must be updated after a change of the
+            normalization, using the command ``cas_normalize_uids``.
+
+        """
+        for step in self.get_settings().get('UID_NORMALIZATION', ()):
+            try:
+                normalizer = UID_NORMALIZERS[step]
+            except KeyError:
+                raise ImproperlyConfigured(
+                    "Unknown uid normalization step '{}' for the provider "
+                    "'{}'.".format(step, self.id)
+                )
+            uid = normalizer(uid)
         return uid
 
     def extract_common_fields(self, data):
@@ -78,6 +234,17 @@ class CASProvider(Provider):
     def extract_email_addresses(self, data):
         """Extract the email addresses.
 
+        Addresses are read from the attributes listed in
+        ``settings.SOCIALACCOUNT_PROVIDERS[self.id]['EMAIL_ATTRIBUTES']``, in
+        order. Each item is the name of an attribute, or a `dict` with keys:
+
+        * ``'attribute'``: Name of the attribute, single or multi-valued;
+        * ``'verified'`` (optional): Whether its addresses are verified.
+          Default: ``False``;
+        * ``'primary'`` (optional): Whether its first address is the primary
+          one, if no previous attribute gave a primary address. Default:
+          ``False``.
+
         Args:
             data (uid (str), extra (dict)): CAS response. Example:
                 ``('alice', {'name': 'Alice'})``
@@ -99,7 +266,65 @@ class CASProvider(Provider):
                 ]
 
         """
-        return super(CASProvider, self).extract_email_addresses(data)
+        from .emails import normalize_email
+
+        uid, extra = data
+        addresses = []
+        seen = set()
+        has_primary = False
+
+        for rule in self.get_settings().get('EMAIL_ATTRIBUTES', []):
+            if isinstance(rule, six.string_types):
+                rule = {'attribute': rule}
+            values = extra.get(rule['attribute']) or []
+            if isinstance(values, six.string_types):
+                values = [values]
+            for value in values:
+                email = normalize_email(value or '')
+                if not email or email in seen:
+                    continue
+                seen.add(email)
+                primary = rule.get('primary', False) and not has_primary
+                has_primary = has_primary or primary
+                addresses.append(EmailAddress(
+                    email=email,
+                    verified=rule.get('verified', False),
+                    primary=primary,
+                ))
+
+        return addresses
+
+    def sync_email_addresses(self, user, data):
+        """Update the email addresses of a user after a successful login.
+
+        Only applies if ``EMAIL_ATTRIBUTES`` is set. The addresses given by
+        :meth:`extract_email_addresses` are compared to the current ones of
+        the user, and only the differences are written.
+
+        Other addresses of the user are deleted only if
+        ``settings.SOCIALACCOUNT_PROVIDERS[self.id]['EMAIL_SYNC_DELETE']`` is
+        ``True``.
+
+        Args:
+            user: A saved user.
+            data (uid (str), extra (dict)): CAS response.
+
+        """
+        from .emails import sync_user_email_addresses
+
+        settings = self.get_settings()
+        if not settings.get('EMAIL_ATTRIBUTES'):
+            return
+
+        addresses = self.extract_email_addresses(data)
+        if settings.get('VERIFIED_EMAIL', False):
+            for address in addresses:
+                address.verified = True
+
+        sync_user_email_addresses(
+            user, addresses,
+            delete=settings.get('EMAIL_SYNC_DELETE', False),
+        )
 
     def extract_extra_data(self, data):
         """Extract the data to save to `SocialAccount.extra_data`.
@@ -109,22 +334,212 @@ class CASProvider(Provider):
                 ``('alice', {'name': 'Alice'})``
 
         Returns:
-            dict: By default, ``data``.
+            dict: By default, ``data``, compacted by
+            :meth:`compact_extra_data`.
         """
         uid, extra = data
-        return dict(extra, uid=uid)
+        return self.compact_extra_data(dict(extra, uid=uid))
+
+    def compact_extra_data(self, extra_data):
+        """Reduce the size of the extra data, before it is stored.
+
+        It applies these settings of
+        ``settings.SOCIALACCOUNT_PROVIDERS[self.id]``, none being set by
+        default:
+
+        * ``'EXTRA_DATA_WHITELIST'``: Only these attributes are kept;
+        * ``'EXTRA_DATA_BLACKLIST'``: These attributes are dropped;
+        * ``'EXTRA_DATA_COMPRESS_THRESHOLD'``: Multi-valued attributes whose
+          size exceeds this threshold (in bytes, as JSON) are compressed;
+        * ``'EXTRA_DATA_MAX_SIZE'``: Attributes whose size, once compressed,
+          exceeds this size (in bytes, as JSON) are dropped.
+
+        Compressed values are restored by :meth:`get_extra_data`.
+
+        Args:
+            extra_data (dict): Decoded extra data.
+
+        Returns:
+            dict: The compacted extra data.
+
+        """
+        from .extra_data import compact_extra_data
+
+        settings = self.get_settings()
+        return compact_extra_data(
+            extra_data,
+            whitelist=settings.get('EXTRA_DATA_WHITELIST'),
+            blacklist=settings.get('EXTRA_DATA_BLACKLIST', ()),
+            compress_threshold=settings.get('EXTRA_DATA_COMPRESS_THRESHOLD'),
+            max_size=settings.get('EXTRA_DATA_MAX_SIZE'),
+        )
+
+    def get_extra_data(self, account):
+        """Returns the extra data of a social account, decompressed.
+
+        Args:
+            account (`SocialAccount`)
+
+        """
+        from .extra_data import decode_extra_data
+
+        return decode_extra_data(account.extra_data)
+
+    ##
+    # Cached attributes of users.
+    ##
+
+    def get_attribute_cache(self):
+        """Returns the cache of the attributes of the users of the provider.
+
+        It is configured in ``settings.SOCIALACCOUNT_PROVIDERS[self.id]``:
+
+        * ``'ATTRIBUTES_CACHE'``: Alias of the Django cache shared by the
+          processes. Default: ``None``, only the request and the process
+          cache the attributes;
+        * ``'ATTRIBUTES_CACHE_TIMEOUT'``: Lifetime of its entries, in
+          seconds. Default: ``300``;
+        * ``'ATTRIBUTES_LOCAL_CACHE_SIZE'``: Number of entries cached by each
+          process. Default: ``1024``, ``0`` disables this cache;
+        * ``'ATTRIBUTES_LOCAL_CACHE_TIMEOUT'``: Lifetime of these entries, in
+          seconds. Default: ``30``.
+
+        Returns:
+            :class:`~allauth_cas.attributes.AttributeCache`
+
+        """
+        from .attributes import AttributeCache
+
+        def build():
+            settings = self.get_settings()
+            return AttributeCache(
+                self.id,
+                cache_alias=settings.get('ATTRIBUTES_CACHE'),
+                timeout=settings.get('ATTRIBUTES_CACHE_TIMEOUT', 300),
+                local_size=settings.get('ATTRIBUTES_LOCAL_CACHE_SIZE', 1024),
+                local_timeout=settings.get(
+                    'ATTRIBUTES_LOCAL_CACHE_TIMEOUT', 30),
+            )
+
+        return self.get_shared('attribute_cache', build)
+
+    def get_attributes(self, uid, request=None):
+        """Returns the attributes of the user ``uid``, as stored in the extra
+        data of their social account.
+
+        They are cached, and updated by each login of the user. The returned
+        dict must not be modified.
+
+        Args:
+            uid (str)
+            request (`HttpRequest`): Current request, if any, to cache the
+                attributes for its later lookups.
+
+        Returns:
+            dict: ``None`` if the user has no social account.
+
+        """
+        return self.get_attribute_cache().get(
+            uid, request=request, loader=self.load_attributes)
+
+    def get_request_attributes(self, request):
+        """Returns the attributes of the user logged in by ``request``
+        through this provider.
+
+        Returns:
+            dict: ``None`` if the session has no CAS login of the provider.
+
+        """
+        from .sessions import get_cas_login
+
+        provider_id, uid = get_cas_login(request.session)
+        if provider_id != self.id or uid is None:
+            return None
+        return self.get_attributes(uid, request=request)
+
+    def load_attributes(self, uid):
+        """Reads the attributes of ``uid`` from the database."""
+        from allauth.socialaccount.models import SocialAccount
+
+        account = (
+            SocialAccount.objects
+            .filter(provider=self.id, uid=uid)
+            .only('extra_data')
+            .first()
+        )
+        if account is None:
+            return None
+        return self.get_extra_data(account)
+
+    ##
+    # Groups of users.
+    ##
+
+    def extract_groups(self, data):
+        """Extract the names of the groups of the user.
+
+        Args:
+            data (uid (str), extra (dict)): CAS response. Example:
+                ``('alice', {'memberOf': ['cn=staff,ou=groups']})``
+
+        Returns:
+            `set` of `str`: By default, the groups produced by the rules of
+            ``settings.SOCIALACCOUNT_PROVIDERS[self.id]['GROUP_MAPPING']``.
+
+        """
+        from .groups import get_group_mapping
+
+        uid, extra = data
+        return get_group_mapping(self).get_groups(extra)
+
+    def sync_groups(self, user, data):
+        """Update the groups of a user after a successful login.
+
+        The groups given by :meth:`extract_groups` are compared to the current
+        groups of the user, and only the differences are written. Groups not
+        managed by ``GROUP_MAPPING`` are left untouched.
+
+        Missing groups are created, unless
+        ``settings.SOCIALACCOUNT_PROVIDERS[self.id]['GROUP_CREATE']`` is
+        ``False``.
+
+        Args:
+            user: A saved user.
+            data (uid (str), extra (dict)): CAS response.
+
+        """
+        from .groups import get_group_mapping, sync_user_groups
+
+        mapping = get_group_mapping(self)
+        if not mapping or not hasattr(user, 'groups'):
+            return
+
+        sync_user_groups(
+            user, self.extract_groups(data), mapping,
+            create=self.get_settings().get('GROUP_CREATE', True),
+        )
 
     ##
     # Message to suggest users to logout of the CAS server.
     ##
 
+    #: Template of the message.
+    message_suggest_caslogout_template = (
+        'socialaccount/messages/suggest_caslogout.html')
+
     def add_message_suggest_caslogout(
         self, request, next_page=None, level=None,
     ):
         """Add a message with a link for the user to logout of the CAS server.
 
         It uses the template ``socialaccount/messages/suggest_caslogout.html``,
-        with the ``provider`` and the ``logout_url`` as context.
+        with the ``provider`` and the ``logout_url`` as context. See
+        :meth:`render_message_suggest_caslogout`.
+
+        If ``settings.SOCIALACCOUNT_PROVIDERS[self.id]
+        ['MESSAGE_SUGGEST_CASLOGOUT_DEFER']`` is ``True``, the message is
+        rendered when the messages are stored, at the end of the request. It
+        is not rendered at all if the message level is filtered out.
 
         Args:
             request: The request to which the message is added.
@@ -139,22 +554,57 @@ class CASProvider(Provider):
         if level is None:
             level = messages.INFO
 
-        logout_url = self.get_logout_url(request, next=next_page)
-
         # DefaultAccountAdapter.add_message is unusable because it always
         # escape the message content.
 
-        template = 'socialaccount/messages/suggest_caslogout.html'
+        if self.get_settings().get('MESSAGE_SUGGEST_CASLOGOUT_DEFER', False):
+            message = LazyMessage(
+                self.render_message_suggest_caslogout, request, next_page)
+        else:
+            message = self.render_message_suggest_caslogout(
+                request, next_page)
+
+        messages.add_message(request, level, message, fail_silently=True)
+
+    def render_message_suggest_caslogout(self, request, next_page):
+        """Returns the content of the message suggesting to logout of the CAS
+        server.
+
+        The template is loaded once per provider. Rendered messages are
+        cached by language and ``next_page``, in a LRU cache of
+        ``settings.SOCIALACCOUNT_PROVIDERS[self.id]
+        ['MESSAGE_SUGGEST_CASLOGOUT_CACHE_SIZE']`` entries (default:
+        ``128``, ``0`` disables the cache).
+
+        Returns:
+            `SafeText`
+
+        """
+        cache_size = self.get_settings().get(
+            'MESSAGE_SUGGEST_CASLOGOUT_CACHE_SIZE', 128)
+
+        cache = None
+        key = (get_language(), get_script_prefix(), next_page)
+        if cache_size:
+            cache = self.get_shared(
+                'suggest_caslogout_cache', lambda: LRUCache(cache_size))
+            message = cache.get(key)
+            if message is not None:
+                return message
+
+        template = self.get_shared(
+            'suggest_caslogout_template',
+            lambda: get_template(self.message_suggest_caslogout_template),
+        )
         context = {
             'provider': self,
-            'logout_url': logout_url,
+            'logout_url': self.get_logout_url(request, next=next_page),
         }
+        message = mark_safe(template.render(context).strip())
 
-        messages.add_message(
-            request, level,
-            mark_safe(render_to_string(template, context).strip()),
-            fail_silently=True,
-        )
+        if cache is not None:
+            cache.set(key, message)
+        return message
 
     def message_suggest_caslogout_on_logout(self, request):
         """Indicates whether the logout message should be sent on user logout.
@@ -190,6 +640,102 @@ class CASProvider(Provider):
             .get('MESSAGE_SUGGEST_CASLOGOUT_ON_LOGOUT_LEVEL', messages.INFO)
         )
 
+    ##
+    # Request-independent state, shared by the provider instances returned by
+    # `allauth_cas.registry.get_provider`.
+    ##
+
+    def get_shared(self, name, factory, timeout=None):
+        """Returns the request-independent value ``name``.
+
+        It is built by ``factory`` once per provider, until the settings or a
+        social app change, or ``timeout`` seconds have passed. Values of the
+        previous generations are dropped.
+        """
+        generation = get_generation()
+        key = (name, generation)
+        entry = self._shared.get(key)
+        if entry is not None and (entry[1] is None or entry[1] > time.time()):
+            return entry[0]
+
+        expires_at = None if timeout is None else time.time() + timeout
+        if entry is None:
+            entry = self._shared.setdefault(key, (factory(), expires_at))
+            for stale in [k for k in list(self._shared) if k[1] != generation]:
+                self._shared.pop(stale, None)
+        else:
+            entry = self._shared[key] = (factory(), expires_at)
+        return entry[0]
+
+    def get_settings(self):
+        """Returns ``settings.SOCIALACCOUNT_PROVIDERS[self.id]``.
+
+        It is read once per provider, until the settings change.
+        """
+        return self.get_shared(
+            'settings', super(CASProvider, self).get_settings)
+
+    def get_app(self, request):
+        """Returns the social app of the provider, for the current site.
+
+        It is read once per provider and site, until a social app or the
+        settings change, or for ``ALLAUTH_CAS_SOCIAL_APP_CACHE_TIMEOUT``
+        seconds, so that changes made by other processes are picked up.
+        """
+        from django.contrib.sites.shortcuts import get_current_site
+
+        return self.get_shared(
+            ('app', get_current_site(request).pk),
+            lambda: super(CASProvider, self).get_app(request),
+            timeout=app_settings.SOCIAL_APP_CACHE_TIMEOUT,
+        )
+
+    def get_service_base_url(self):
+        """Returns the canonical base url of the service urls, if any.
+
+        It is set in ``SERVICE_BASE_URL`` of the provider settings, e.g.
+        ``'https://app.example.com'``. Service urls then don't depend on the
+        ``Host`` of the request, and are identical on every node.
+
+        It has no path: the path of the callback view, joined to it, already
+        starts with the script prefix of the site.
+
+        Raises:
+            ImproperlyConfigured: If it isn't an absolute url, or has a path,
+                a query or a fragment.
+
+        """
+        def build():
+            base_url = self.get_settings().get('SERVICE_BASE_URL')
+            if not base_url:
+                return None
+            parts = urlsplit(base_url)
+            if not parts.scheme or not parts.netloc:
+                raise ImproperlyConfigured(
+                    "SERVICE_BASE_URL of the provider '{}' must be an "
+                    "absolute url, got '{}'.".format(self.id, base_url)
+                )
+            if parts.path.strip('/') or parts.query or parts.fragment:
+                raise ImproperlyConfigured(
+                    "SERVICE_BASE_URL of the provider '{}' must only hold a "
+                    "scheme and a host, got '{}'. The script prefix is "
+                    "already part of the callback path.".format(
+                        self.id, base_url)
+                )
+            return base_url.rstrip('/')
+
+        return self.get_shared('service_base_url', build)
+
+    def get_callback_path(self):
+        """Returns the path of the callback view.
+
+        It is reversed once per script prefix and urlconf.
+        """
+        return self.get_shared(
+            ('callback_path', get_script_prefix(), get_urlconf()),
+            lambda: reverse(self.id + '_callback'),
+        )
+
     ##
     # Shortcuts functions.
     ##
@@ -201,7 +747,7 @@ class CASProvider(Provider):
         return url
 
     def get_callback_url(self, request, **kwargs):
-        url = reverse(self.id + '_callback')
+        url = self.get_callback_path()
         if kwargs:
             url += '?' + urlencode(kwargs)
         return url
@@ -0,0 +1,533 @@
+# -*- coding: utf-8 -*-
+from itertools import count, islice
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, CharField, Value, When
+
+from allauth.account import app_settings as account_settings
+from allauth.account.adapter import get_adapter as get_account_adapter
+from allauth.account.models import EmailAddress
+from allauth.account.utils import filter_users_by_username, user_username
+from allauth.socialaccount.models import SocialAccount
+
+from .emails import get_taken_emails, normalize_email
+from .sessions import get_session_index
+
+
+def iter_chunks(iterable, size):
+    """Yields lists of at most ``size`` items from ``iterable``."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ProvisioningResult(object):
+    """
+    Counters of a provisioning run.
+    """
+
+    def __init__(self):
+        self.processed = 0
+        self.created = 0
+        self.skipped = 0
+
+    def __str__(self):
+        return "{} processed, {} created, {} skipped".format(
+            self.processed, self.created, self.skipped,
+        )
+
+
+def bulk_provision(provider, rows, batch_size=500):
+    """Creates the accounts of CAS users before their first login.
+
+    Each row is handled as a CAS response, so the data extraction methods of
+    the provider (``extract_uid``, ``extract_common_fields``…) and the
+    ``populate_user`` hook of ``SOCIALACCOUNT_ADAPTER`` apply as they would on
+    login.
+
+    Rows are consumed by chunks of ``batch_size``: the users, social accounts
+    and email addresses of a chunk are created with a few ``bulk_create`` in a
+    single transaction. Users already known for this provider are skipped, so
+    that a run can safely be restarted.
+
+    Notes:
+        As ``bulk_create`` is used, ``post_save`` signals are not sent.
+
+    Args:
+        provider (:class:`~allauth_cas.providers.CASProvider`)
+        rows: Iterable of CAS responses, as ``(uid, attributes)``.
+        batch_size (int): Number of rows per chunk.
+
+    Yields:
+        :class:`ProvisioningResult`: Cumulated counters, after each chunk.
+
+    """
+    result = ProvisioningResult()
+
+    for chunk in iter_chunks(rows, batch_size):
+        with transaction.atomic():
+            created = _provision_chunk(provider, chunk)
+        result.processed += len(chunk)
+        result.created += created
+        result.skipped += len(chunk) - created
+        yield result
+
+
+def _provision_chunk(provider, rows):
+    logins = {}
+    for data in rows:
+        login = provider.sociallogin_from_response(None, data)
+        # The first occurrence of a uid in a chunk wins.
+        logins.setdefault(login.account.uid, login)
+
+    existing = set(
+        SocialAccount.objects
+        .filter(provider=provider.id, uid__in=list(logins))
+        .values_list('uid', flat=True)
+    )
+    logins = [
+        login for uid, login in logins.items() if uid not in existing
+    ]
+
+    if not logins:
+        return 0
+
+    users = _bulk_create_users([login.user for login in logins])
+
+    accounts = []
+    for login, user in zip(logins, users):
+        login.user = login.account.user = user
+        accounts.append(login.account)
+    SocialAccount.objects.bulk_create(accounts)
+
+    _bulk_create_email_addresses(logins)
+
+    return len(logins)
+
+
+def _bulk_create_users(users):
+    User = get_user_model()
+    username_field = account_settings.USER_MODEL_USERNAME_FIELD
+
+    if username_field:
+        # Give a new username to users whose username is already taken.
+        usernames = [user_username(user) for user in users]
+        taken = set(
+            User.objects
+            .filter(**{username_field + '__in': usernames})
+            .values_list(username_field, flat=True)
+        )
+        account_adapter = get_account_adapter()
+        for user in users:
+            username = user_username(user)
+            if not username or username in taken:
+                user_username(user, '')
+                account_adapter.populate_username(None, user)
+                if user_username(user) in taken:
+                    # populate_username only checks the database, not the
+                    # users of the chunk.
+                    user_username(user, _get_free_username(
+                        user_username(user), taken))
+            taken.add(user_username(user))
+
+    users = User.objects.bulk_create(users)
+
+    if all(user.pk is not None for user in users):
+        return users
+
+    # Primary keys are not set by bulk_create on most databases.
+    if username_field:
+        pks = dict(
+            User.objects
+            .filter(**{username_field + '__in': [
+                user_username(user) for user in users
+            ]})
+            .values_list(username_field, 'pk')
+        )
+        for user in users:
+            user.pk = pks[user_username(user)]
+    else:
+        raise ValueError(
+            "Users can't be provisioned in bulk without a username field on "
+            "the user model."
+        )
+
+    return users
+
+
+def _get_free_username(username, taken):
+    """Returns ``username`` with the lowest numeric suffix which is neither in
+    ``taken`` nor in the database."""
+    max_length = get_user_model()._meta.get_field(
+        account_settings.USER_MODEL_USERNAME_FIELD).max_length
+    for i in count(2):
+        suffix = str(i)
+        candidate = username[:max_length - len(suffix)] + suffix
+        if (candidate not in taken and
+                not filter_users_by_username(candidate).exists()):
+            return candidate
+
+
+def _bulk_create_email_addresses(logins):
+    addresses = []
+    for login in logins:
+        seen = set()
+        has_primary = False
+        for address in login.email_addresses:
+            email = normalize_email(address.email)
+            if email in seen:
+                continue
+            seen.add(email)
+            address.user = login.user
+            address.primary = address.primary and not has_primary
+            has_primary = has_primary or address.primary
+            addresses.append(address)
+
+    if account_settings.UNIQUE_EMAIL:
+        # Existing addresses may not be normalized.
+        taken = get_taken_emails(address.email for address in addresses)
+        unique = []
+        for address in addresses:
+            email = normalize_email(address.email)
+            if email not in taken:
+                taken.add(email)
+                unique.append(address)
+        addresses = unique
+
+    EmailAddress.objects.bulk_create(addresses)
+
+
+class DeprovisioningResult(object):
+    """
+    Counters of a deprovisioning run.
+    """
+
+    def __init__(self):
+        self.checked = 0
+        self.missing = 0
+        self.deactivated = 0
+
+    def __str__(self):
+        return "{} checked, {} missing upstream, {} deactivated".format(
+            self.checked, self.missing, self.deactivated,
+        )
+
+
+class SortedUids(object):
+    """Membership test on a sorted iterable of uids, consumed as the looked up
+    uids increase, so that only the current uid is kept in memory.
+
+    Uids are compared by code points, as Python strings. The order of the
+    iterable and of the lookups is checked as they go.
+
+    Raises:
+        ValueError: The uids are not sorted, or are looked up in decreasing
+            order.
+
+    """
+
+    def __init__(self, uids):
+        self.uids = iter(uids)
+        self.current = None
+        self.last_lookup = None
+        self.advance()
+
+    def __bool__(self):
+        return self.current is not None
+
+    __nonzero__ = __bool__
+
+    def advance(self):
+        previous, self.current = self.current, next(self.uids, None)
+        if (previous is not None and self.current is not None and
+                self.current < previous):
+            raise ValueError(
+                "The uids list is not sorted: {!r} comes after {!r}.".format(
+                    self.current, previous))
+
+    def __contains__(self, uid):
+        if self.last_lookup is not None and uid < self.last_lookup:
+            raise ValueError(
+                "The social accounts are not read in the order of the uids: "
+                "{!r} comes after {!r}. Check the collation of the uid "
+                "column.".format(uid, self.last_lookup))
+        self.last_lookup = uid
+        while self.current is not None and self.current < uid:
+            self.advance()
+        return self.current == uid
+
+    def check(self):
+        """Consumes the remaining uids, checking their order."""
+        while self.current is not None:
+            self.advance()
+
+
+def check_sorted_uids(provider, uids):
+    """Checks that ``uids`` is sorted once extracted, as expected by
+    :func:`bulk_deprovision` with ``presorted``, without keeping it in memory.
+
+    Raises:
+        ValueError: The uids are not sorted.
+
+    """
+    SortedUids(provider.extract_uid((uid, {})) for uid in uids).check()
+
+
+def bulk_deprovision(provider, uids, batch_size=500, dry_run=False,
+                     presorted=False):
+    """Deactivates the users whose uid is not known anymore by CAS.
+
+    ``uids`` is the authoritative list of the uids known by the CAS server.
+    Each one goes through ``provider.extract_uid()``, so that it matches the
+    uids stored on the social accounts.
+
+    Social accounts of the provider are then read by chunks of ``batch_size``,
+    and the users of the accounts missing from ``uids`` are deactivated with a
+    single ``UPDATE`` per chunk.
+
+    By default, the whole uids list is loaded in a set, so memory grows with
+    the number of uids upstream. If ``presorted`` is ``True``, ``uids`` must be
+    sorted by code points once extracted (e.g. with ``LC_ALL=C sort``): it is
+    then streamed, merged with the social accounts read in the order of their
+    uid (see :class:`SortedUids`). A list found unsorted raises
+    :exc:`ValueError`, possibly after users have been wrongly deactivated:
+    check it with :func:`check_sorted_uids` first.
+
+    If the session index is enabled, the sessions of the deactivated users
+    are deleted too.
+
+    Args:
+        provider (:class:`~allauth_cas.providers.CASProvider`)
+        uids: Iterable of the uids known by the CAS server.
+        batch_size (int): Number of social accounts per chunk.
+        dry_run (bool): If ``True``, users are not deactivated.
+        presorted (bool): Whether ``uids`` is sorted.
+
+    Yields:
+        (:class:`DeprovisioningResult`, `list`): Cumulated counters and the
+        missing uids of the chunk, after each chunk.
+
+    """
+    uids = (provider.extract_uid((uid, {})) for uid in uids)
+    upstream = SortedUids(uids) if presorted else set(uids)
+    if not upstream:
+        raise ValueError(
+            "An empty uids list would deactivate every user of the provider."
+        )
+
+    User = get_user_model()
+    result = DeprovisioningResult()
+    session_index = get_session_index()
+
+    # Keyset pagination, on the uid when merging with the sorted list.
+    key = 'uid' if presorted else 'pk'
+    accounts = (
+        SocialAccount.objects
+        .filter(provider=provider.id)
+        .order_by(key)
+        .values_list('pk', 'uid', 'user_id')
+    )
+    last_key = None
+
+    while True:
+        qs = (accounts if last_key is None else
+              accounts.filter(**{key + '__gt': last_key}))
+        chunk = list(qs[:batch_size])
+        missing = [
+            (uid, user_id) for _, uid, user_id in chunk
+            if uid not in upstream
+        ]
+        if presorted and len(chunk) < batch_size:
+            # Last chunk: check the order of the rest of the list before
+            # deactivating users.
+            upstream.check()
+        if not chunk:
+            return
+        last_key = chunk[-1][1 if presorted else 0]
+
+        result.checked += len(chunk)
+        result.missing += len(missing)
+
+        if missing and not dry_run:
+            user_ids = [user_id for _, user_id in missing]
+            result.deactivated += (
+                User.objects
+                .filter(pk__in=user_ids, is_active=True)
+                .update(is_active=False)
+            )
+            if session_index is not None:
+                session_index.invalidate(user_ids)
+
+        yield result, [uid for uid, _ in missing]
+
+
+class NormalizationResult(object):
+    """
+    Counters of a uids normalization run.
+    """
+
+    def __init__(self):
+        self.checked = 0
+        self.updated = 0
+        self.conflicts = 0
+
+    def __str__(self):
+        return "{} checked, {} updated, {} conflicts".format(
+            self.checked, self.updated, self.conflicts,
+        )
+
+
+def bulk_normalize_uids(provider, batch_size=500, dry_run=False):
+    """Applies ``provider.normalize_uid()`` to the existing social accounts.
+
+    Social accounts of the provider are read by chunks of ``batch_size``, and
+    the uids of a chunk are updated with a single ``UPDATE``.
+
+    An account is left untouched if its normalized uid is already used by
+    another account of the provider. Such conflicts must be resolved by hand,
+    e.g. by merging the related users.
+
+    Args:
+        provider (:class:`~allauth_cas.providers.CASProvider`)
+        batch_size (int): Number of social accounts per chunk.
+        dry_run (bool): If ``True``, uids are not updated.
+
+    Yields:
+        (:class:`NormalizationResult`, `list`): Cumulated counters and the
+        conflicting uids of the chunk, as ``(uid, normalized uid)``, after each
+        chunk.
+
+    """
+    result = NormalizationResult()
+
+    accounts = (
+        SocialAccount.objects
+        .filter(provider=provider.id)
+        .order_by('pk')
+        .values_list('pk', 'uid')
+    )
+    last_pk = None
+
+    while True:
+        qs = accounts if last_pk is None else accounts.filter(pk__gt=last_pk)
+        chunk = list(qs[:batch_size])
+        if not chunk:
+            return
+        last_pk = chunk[-1][0]
+
+        changes = {}
+        for pk, uid in chunk:
+            normalized = provider.normalize_uid(uid)
+            if normalized != uid:
+                changes[pk] = (uid, normalized)
+
+        taken = set(
+            SocialAccount.objects
+            .filter(
+                provider=provider.id,
+                uid__in=[normalized for _, normalized in changes.values()],
+            )
+            .values_list('uid', flat=True)
+        ) if changes else set()
+
+        updates = {}
+        conflicts = []
+        for pk, (uid, normalized) in sorted(changes.items()):
+            if normalized in taken:
+                conflicts.append((uid, normalized))
+            else:
+                taken.add(normalized)
+                updates[pk] = normalized
+
+        if updates and not dry_run:
+            SocialAccount.objects.filter(pk__in=list(updates)).update(
+                uid=Case(
+                    *[
+                        When(pk=pk, then=Value(uid))
+                        for pk, uid in updates.items()
+                    ],
+                    output_field=CharField()
+                ),
+            )
+
+        result.checked += len(chunk)
+        result.updated += len(updates)
+        result.conflicts += len(conflicts)
+
+        yield result, conflicts
+
+
+class CompactionResult(object):
+    """
+    Counters of an extra data compaction run.
+    """
+
+    def __init__(self):
+        self.checked = 0
+        self.updated = 0
+
+    def __str__(self):
+        return "{} checked, {} updated".format(self.checked, self.updated)
+
+
+def bulk_compact_extra_data(provider, batch_size=500, dry_run=False):
+    """Applies ``provider.compact_extra_data()`` to the existing accounts.
+
+    Social accounts of the provider are read by chunks of ``batch_size``, and
+    the changed extra data of a chunk are written with a single ``UPDATE``.
+
+    Args:
+        provider (:class:`~allauth_cas.providers.CASProvider`)
+        batch_size (int): Number of social accounts per chunk.
+        dry_run (bool): If ``True``, extra data are not updated.
+
+    Yields:
+        :class:`CompactionResult`: Cumulated counters, after each chunk.
+
+    """
+    from .extra_data import decode_extra_data
+
+    result = CompactionResult()
+    field = SocialAccount._meta.get_field('extra_data')
+
+    accounts = (
+        SocialAccount.objects
+        .filter(provider=provider.id)
+        .order_by('pk')
+        .values_list('pk', 'extra_data')
+    )
+    last_pk = None
+
+    while True:
+        qs = accounts if last_pk is None else accounts.filter(pk__gt=last_pk)
+        chunk = list(qs[:batch_size])
+        if not chunk:
+            return
+        last_pk = chunk[-1][0]
+
+        updates = {}
+        for pk, extra_data in chunk:
+            compacted = provider.compact_extra_data(
+                decode_extra_data(extra_data))
+            if compacted != extra_data:
+                updates[pk] = compacted
+
+        if updates and not dry_run:
+            SocialAccount.objects.filter(pk__in=list(updates)).update(
+                extra_data=Case(
+                    *[
+                        When(pk=pk, then=Value(data, output_field=field))
+                        for pk, data in updates.items()
+                    ],
+                    output_field=field
+                ),
+            )
+
+        result.checked += len(chunk)
+        result.updated += len(updates)
+
+        yield result
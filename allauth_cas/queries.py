@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import connection
+
+from . import app_settings
+from .exceptions import QueryBudgetExceeded
+
+logger = logging.getLogger(__name__)
+
+_LITERALS_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r'\bIN \((?:\?, )*\?\)', re.IGNORECASE)
+_SAVEPOINT_RE = re.compile(r'SAVEPOINT "?\w+"?')
+
+
+def normalize_sql(sql):
+    """Replaces the literals of ``sql`` by ``?``, so that queries which only
+    differ by their parameters are grouped."""
+    sql = _LITERALS_RE.sub('?', sql)
+    sql = _SAVEPOINT_RE.sub('SAVEPOINT ?', sql)
+    return _IN_LIST_RE.sub('IN (...)', sql)
+
+
+class QueryBreakdown(object):
+    """Executed queries, grouped by statement.
+
+    Args:
+        queries (`list` of `dict`): Queries, as in ``connection.queries``.
+
+    """
+
+    def __init__(self, queries):
+        self.total = len(queries)
+        self.counts = Counter(normalize_sql(query['sql']) for query in queries)
+
+    def __len__(self):
+        return self.total
+
+    def __str__(self):
+        lines = []
+        for sql, count in self.counts.most_common():
+            if len(sql) > 200:
+                sql = sql[:197] + '...'
+            lines.append("{:>4} x {}".format(count, sql))
+        return "\n".join(lines)
+
+
+class QueryCapture(object):
+    """Captures the queries executed on the default database.
+
+    As ``CaptureQueriesContext`` of ``django.test.utils``, without loading the
+    test framework.
+    """
+
+    def __enter__(self):
+        self.force_debug_cursor = connection.force_debug_cursor
+        connection.force_debug_cursor = True
+        connection.ensure_connection()
+        self.start = len(connection.queries_log)
+        self.queries = []
+        return self
+
+    def __exit__(self, *exc_info):
+        connection.force_debug_cursor = self.force_debug_cursor
+        self.queries = list(connection.queries_log)[self.start:]
+
+    def __len__(self):
+        return len(self.queries)
+
+    def get_breakdown(self):
+        return QueryBreakdown(self.queries)
+
+
+@contextmanager
+def query_budget(budget, name):
+    """Checks the number of queries executed in the block.
+
+    If it exceeds ``budget``, a warning with the breakdown of the queries is
+    logged, or :class:`~allauth_cas.exceptions.QueryBudgetExceeded` is
+    raised if ``ALLAUTH_CAS_QUERY_BUDGET_RAISE`` is set.
+
+    Args:
+        budget (int): Maximum number of queries. If ``None``, queries are
+            not counted.
+        name (str): Name of the block, for the message.
+
+    """
+    if budget is None:
+        yield None
+        return
+
+    with QueryCapture() as capture:
+        yield capture
+
+    if len(capture) > budget:
+        message = "{} executed {} queries, over its budget of {}:\n{}".format(
+            name, len(capture), budget, capture.get_breakdown())
+        if app_settings.QUERY_BUDGET_RAISE:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
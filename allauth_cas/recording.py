@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import six
+
+import hashlib
+import io
+import itertools
+import json
+import logging
+import re
+import threading
+
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+
+from . import app_settings
+
+logger = logging.getLogger(__name__)
+
+# Text between two tags, which is not only whitespace.
+_XML_TEXT_RE = re.compile(r'>(\s*)([^<]*[^<\s])(\s*)<')
+
+_recorders = {}
+_recorders_lock = threading.Lock()
+_requests = itertools.count(1)
+
+
+def pseudonymize(value):
+    """Returns a pseudonym of ``value``, of the same length.
+
+    Pseudonyms are stable for a given ``SECRET_KEY``, so that equal values
+    stay equal.
+    """
+    digest = salted_hmac('allauth_cas.recording', value).hexdigest()
+    return (digest * (len(value) // len(digest) + 1))[:len(value)]
+
+
+def anonymize_response(content):
+    """Replaces the user data of a validation response with pseudonyms.
+
+    All the text values of the XML document (the user, the attributes, the
+    proxy-granting ticket IOU…) are replaced by pseudonyms of the same
+    length. The structure of the document and its size are kept.
+
+    Args:
+        content (str): A CAS 2, CAS 3 or SAML 1.1 validation response.
+
+    """
+    return _XML_TEXT_RE.sub(
+        lambda m: u'>{}{}{}<'.format(
+            m.group(1), pseudonymize(m.group(2)), m.group(3)),
+        content,
+    )
+
+
+class ResponseRecorder(object):
+    """Appends validation responses to a file, one JSON object per line.
+
+    Each line has keys ``'id'``, ``'provider'``, ``'version'``,
+    ``'content'`` and ``'recorded_at'``.
+
+    Args:
+        path (str): Path of the file.
+        anonymize (bool): If ``True``, responses are anonymized with
+            :func:`anonymize_response`.
+
+    """
+
+    def __init__(self, path, anonymize=True):
+        self.path = path
+        self.anonymize = anonymize
+        self.lock = threading.Lock()
+
+    def record(self, provider_id, version, content):
+        if isinstance(content, six.binary_type):
+            content = content.decode('utf-8')
+        if self.anonymize:
+            content = anonymize_response(content)
+        line = json.dumps({
+            'id': hashlib.sha1(content.encode('utf-8')).hexdigest()[:12],
+            'provider': provider_id,
+            'version': str(version),
+            'content': content,
+            'recorded_at': timezone.now().isoformat(),
+        }, sort_keys=True)
+        with self.lock:
+            with io.open(self.path, 'a', encoding='utf-8') as f:
+                f.write(six.text_type(line) + u'\n')
+
+
+def load_recordings(path):
+    """Returns the responses recorded in a file, as dicts."""
+    with io.open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def get_response_recorder():
+    """Returns the recorder configured by the settings, or ``None``."""
+    path = app_settings.RECORDING_PATH
+    if not path:
+        return None
+    anonymize = app_settings.RECORDING_ANONYMIZE
+    key = (path, anonymize)
+    recorder = _recorders.get(key)
+    if recorder is None:
+        with _recorders_lock:
+            recorder = _recorders.setdefault(
+                key, ResponseRecorder(path, anonymize=anonymize))
+    return recorder
+
+
+def record_client(client, provider_id, version):
+    """Records the validation response received by ``client``, if recording
+    is enabled and the request is sampled.
+
+    Recording is enabled by ``ALLAUTH_CAS_RECORDING_PATH``. One request out
+    of ``ALLAUTH_CAS_RECORDING_SAMPLE_RATE`` is recorded.
+
+    Notes:
+        Responses of the CAS 1 protocol are not recorded, as they carry only
+        the user.
+
+    Args:
+        client: A client of python-cas. Its methods fetching the validation
+            response are wrapped.
+
+    """
+    recorder = get_response_recorder()
+    rate = app_settings.RECORDING_SAMPLE_RATE
+    if recorder is None or not rate or next(_requests) % rate:
+        return
+
+    def save(content):
+        try:
+            recorder.record(provider_id, version, content)
+        except Exception:
+            logger.exception("Unable to record a CAS validation response.")
+
+    if hasattr(client, 'fetch_saml_validation'):
+        fetch_saml_validation = client.fetch_saml_validation
+
+        def fetch_and_record(ticket):
+            response = fetch_saml_validation(ticket)
+            save(response.content)
+            return response
+
+        client.fetch_saml_validation = fetch_and_record
+
+    elif hasattr(client, 'get_verification_response'):
+        get_verification_response = client.get_verification_response
+
+        def get_and_record(ticket):
+            content = get_verification_response(ticket)
+            save(content)
+            return content
+
+        client.get_verification_response = get_and_record
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from allauth.socialaccount.models import SocialAccount
+
+from .provisioning import iter_chunks
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshResult(object):
+    """
+    Counters of an attributes refresh.
+    """
+
+    def __init__(self):
+        self.checked = 0
+        self.updated = 0
+        self.missing = 0
+        self.failed = 0
+
+    def __str__(self):
+        return "{} checked, {} updated, {} missing upstream, {} failed".format(
+            self.checked, self.updated, self.missing, self.failed,
+        )
+
+
+def get_attributes_fetcher(provider):
+    """Returns the function fetching the current attributes of users from
+    the CAS server, or another attribute service.
+
+    It is set by its dotted path in
+    ``settings.SOCIALACCOUNT_PROVIDERS[<id>]['ATTRIBUTES_FETCHER']``. It is
+    called with the provider and a list of uids, and returns a dict of the
+    attributes of these uids, as returned by the CAS server on login. Uids
+    unknown to the service are left out.
+
+    Raises:
+        ImproperlyConfigured: No fetcher is set.
+
+    """
+    path = provider.get_settings().get('ATTRIBUTES_FETCHER')
+    if not path:
+        raise ImproperlyConfigured(
+            "ATTRIBUTES_FETCHER is not set for the provider '{}'.".format(
+                provider.id)
+        )
+    return import_string(path)
+
+
+def get_active_uids(provider, since=None, batch_size=1000):
+    """Yields the uids of the users who may still have a session.
+
+    Social accounts are read by chunks of ``batch_size``, paginated on their
+    primary key, so that the uids are not all kept in memory, and no cursor
+    stays open while they are refreshed.
+
+    Args:
+        since (int): Age, in seconds, of the oldest login considered.
+            Default: ``settings.SESSION_COOKIE_AGE``.
+        batch_size (int): Number of social accounts per query.
+
+    """
+    if since is None:
+        since = settings.SESSION_COOKIE_AGE
+    accounts = (
+        SocialAccount.objects
+        .filter(
+            provider=provider.id,
+            last_login__gte=timezone.now() - timedelta(seconds=since),
+        )
+        .order_by('pk')
+        .values_list('pk', 'uid')
+    )
+    last_pk = None
+
+    while True:
+        qs = accounts if last_pk is None else accounts.filter(pk__gt=last_pk)
+        chunk = list(qs[:batch_size])
+        for _, uid in chunk:
+            yield uid
+        if len(chunk) < batch_size:
+            return
+        last_pk = chunk[-1][0]
+
+
+def refresh_attributes(provider, uids, batch_size=100, rate=None,
+                       dry_run=False):
+    """Updates the attributes of users, without a login.
+
+    The attributes of each chunk of ``batch_size`` uids are fetched at once
+    with :func:`get_attributes_fetcher`. The extra data is saved, and the
+    groups and email addresses are synchronized as on login, only for the
+    accounts whose attributes have changed. The attributes cache of the
+    provider is updated for these accounts.
+
+    Args:
+        provider (:class:`~allauth_cas.providers.CASProvider`)
+        uids: Iterable of uids, e.g. from :func:`get_active_uids`.
+        batch_size (int): Number of uids per chunk.
+        rate (float): Maximum number of uids fetched per second. ``None``
+            disables the limit.
+        dry_run (bool): Only count the accounts which would be updated.
+
+    Yields:
+        :class:`RefreshResult`: Cumulated counters, after each chunk.
+
+    """
+    fetch = get_attributes_fetcher(provider)
+    result = RefreshResult()
+
+    for chunk in iter_chunks(uids, batch_size):
+        start = time.time()
+        try:
+            fetched = fetch(provider, chunk)
+        except Exception:
+            logger.exception(
+                "Failed to fetch the attributes of %d users of %s.",
+                len(chunk), provider.id,
+            )
+            result.failed += len(chunk)
+        else:
+            _refresh_chunk(provider, chunk, fetched, result, dry_run)
+        result.checked += len(chunk)
+        yield result
+
+        if rate:
+            time.sleep(max(0, len(chunk) / float(rate) -
+                           (time.time() - start)))
+
+
+def _refresh_chunk(provider, uids, fetched, result, dry_run):
+    accounts = (
+        SocialAccount.objects
+        .filter(provider=provider.id, uid__in=uids)
+        .select_related('user')
+    )
+    attribute_cache = provider.get_attribute_cache()
+
+    for account in accounts:
+        attributes = fetched.get(account.uid)
+        if attributes is None:
+            result.missing += 1
+            continue
+
+        data = (account.uid, attributes)
+        extra_data = provider.extract_extra_data(data)
+        if extra_data == account.extra_data:
+            continue
+
+        result.updated += 1
+        if dry_run:
+            continue
+
+        account.extra_data = extra_data
+        with transaction.atomic():
+            account.save(update_fields=['extra_data'])
+            provider.sync_groups(account.user, data)
+            provider.sync_email_addresses(account.user, data)
+        attribute_cache.set(account.uid, provider.get_extra_data(account))
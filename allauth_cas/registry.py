@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import copy
+import threading
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from allauth.socialaccount import providers
+
+_providers = {}
+_generation = 0
+_lock = threading.Lock()
+
+
+def get_provider(provider_id, request=None):
+    """Returns a provider instance for ``request``.
+
+    Unlike ``providers.registry.by_id``, the provider is not built from
+    scratch on each call. A base instance is kept per process, holding the
+    request-independent state (settings, social apps). Each call returns a
+    shallow copy of it, bound to ``request``, so that the per-request state
+    is never shared between threads.
+
+    The cache is cleared when settings or social apps change, see
+    :func:`clear_provider_cache`.
+
+    Raises:
+        KeyError: Unknown provider.
+
+    """
+    base = _providers.get(provider_id)
+    if base is None:
+        base = providers.registry.by_id(provider_id)
+        with _lock:
+            base = _providers.setdefault(provider_id, base)
+    provider = copy.copy(base)
+    provider.request = request
+    return provider
+
+
+def get_generation():
+    """Returns a number incremented each time the cache is cleared.
+
+    Providers use it to invalidate the state they cache.
+    """
+    return _generation
+
+
+def clear_provider_cache():
+    global _generation
+    with _lock:
+        _providers.clear()
+        _generation += 1
+
+
+@receiver(setting_changed)
+def reset_provider_cache(setting, **kwargs):
+    if (setting.startswith('SOCIALACCOUNT_') or
+            setting in ('INSTALLED_APPS', 'SITE_ID', 'TEMPLATES',
+                        'LANGUAGES')):
+        clear_provider_cache()
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import time
+
+import django
+from django.conf import settings
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+
+from .test.server import CASStandInServer
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+if django.VERSION >= (1, 10):
+    from django.urls import reverse
+else:
+    from django.core.urlresolvers import reverse
+
+_missing = object()
+
+
+class ReplayResult(object):
+    """Measures of a recorded response replayed through the views.
+
+    Attributes:
+        id (str): Id of the recorded response.
+        status_code (int): Status code of the callback view.
+        latency (float): Median duration of the callback view, in seconds.
+        allocations (int): Peak of memory allocated by the callback view, in
+            bytes. ``None`` if :mod:`tracemalloc` is not available.
+        baseline (dict): Baseline of the response, if any.
+        failures (`list` of `str`): The exceeded budgets.
+
+    """
+
+    def __init__(self, id, status_code, latency, allocations, baseline=None):
+        self.id = id
+        self.status_code = status_code
+        self.latency = latency
+        self.allocations = allocations
+        self.baseline = baseline
+        self.failures = []
+
+    @property
+    def passed(self):
+        return not self.failures
+
+    def as_baseline(self):
+        return {'latency': self.latency, 'allocations': self.allocations}
+
+    def __str__(self):
+        ret = "{} [{}] {:.1f} ms".format(
+            self.id, self.status_code, self.latency * 1000)
+        if self.baseline:
+            ret += " ({:+.0%})".format(
+                self.latency / self.baseline['latency'] - 1)
+        if self.allocations is not None:
+            ret += ", {:.1f} KiB".format(self.allocations / 1024.)
+            if self.baseline and self.baseline.get('allocations'):
+                ret += " ({:+.0%})".format(
+                    float(self.allocations) /
+                    self.baseline['allocations'] - 1
+                )
+        if self.failures:
+            ret += ": " + "; ".join(self.failures)
+        return ret
+
+
+def load_baseline(path):
+    with io.open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(results, path):
+    data = dict((result.id, result.as_baseline()) for result in results)
+    with io.open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(data, indent=2, sort_keys=True))
+
+
+class ReplayRunner(object):
+    """Replays recorded validation responses through the views of a provider.
+
+    For each response, a full login flow goes through the Django stack, with
+    the test client: the login view, then the callback view with a ticket
+    whose validation is served by a :class:`CASStandInServer`. Changes made
+    to the database are rolled back after each flow.
+
+    The callback view is measured: its latency (median of ``repeat`` runs)
+    and the peak of memory it allocates. Measures are compared to a
+    baseline, if given:
+
+    * ``latency_budget``: Maximum ratio of the latency to the baseline;
+    * ``allocation_budget``: Maximum ratio of the allocations to the
+      baseline;
+    * ``max_latency``: Maximum latency, in seconds, with or without a
+      baseline.
+
+    Args:
+        adapter (:class:`~allauth_cas.views.CASAdapter` subclass): The
+            adapter used by the views. Its ``url`` and ``version`` are
+            replaced during the replay.
+
+    """
+
+    def __init__(self, adapter, repeat=5, latency_budget=1.5,
+                 allocation_budget=1.5, max_latency=None):
+        self.adapter = adapter
+        self.repeat = repeat
+        self.latency_budget = latency_budget
+        self.allocation_budget = allocation_budget
+        self.max_latency = max_latency
+
+    def run(self, recordings, baseline=None):
+        """Replays ``recordings``.
+
+        Args:
+            recordings (`list` of `dict`): Recorded responses, as returned
+                by :func:`~allauth_cas.recording.load_recordings`. Responses
+                of other providers are skipped.
+            baseline (dict, optional): Baseline measures, by response id.
+
+        Returns:
+            `list` of :class:`ReplayResult`
+
+        """
+        baseline = baseline or {}
+        recordings = [
+            recording for recording in recordings
+            if recording['provider'] == self.adapter.provider_id
+        ]
+
+        results = []
+        allowed_hosts = list(settings.ALLOWED_HOSTS) + ['testserver']
+        with CASStandInServer() as server, \
+                override_settings(ALLOWED_HOSTS=allowed_hosts):
+            for recording in recordings:
+                with self.patch_adapter(url=server.url,
+                                        version=recording['version']):
+                    result = self.replay(server, recording)
+                result.baseline = baseline.get(result.id)
+                self.check_budgets(result)
+                results.append(result)
+        return results
+
+    def replay(self, server, recording):
+        # Warm up, then measure.
+        self.login(server, recording)
+
+        latencies = []
+        for _ in range(self.repeat):
+            response, latency = self.login(server, recording)
+            latencies.append(latency)
+
+        allocations = None
+        if tracemalloc is not None and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            try:
+                self.login(server, recording, traced=True)
+                allocations = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        latencies.sort()
+        return ReplayResult(
+            recording['id'], response.status_code,
+            latencies[len(latencies) // 2], allocations,
+        )
+
+    def login(self, server, recording, traced=False):
+        provider_id = self.adapter.provider_id
+        client = Client()
+        with transaction.atomic():
+            try:
+                client.get(reverse('{}_login'.format(provider_id)))
+                ticket = server.add_ticket(recording['content'])
+                if traced:
+                    tracemalloc.clear_traces()
+                start = time.time()
+                response = client.get(
+                    reverse('{}_callback'.format(provider_id)),
+                    {'ticket': ticket},
+                )
+                latency = time.time() - start
+            finally:
+                transaction.set_rollback(True)
+        return response, latency
+
+    def check_budgets(self, result):
+        if self.max_latency is not None and result.latency > self.max_latency:
+            result.failures.append("latency exceeds {:.1f} ms".format(
+                self.max_latency * 1000))
+
+        baseline = result.baseline
+        if not baseline:
+            return
+        if (self.latency_budget is not None and
+                result.latency >
+                baseline['latency'] * self.latency_budget):
+            result.failures.append(
+                "latency exceeds {} x baseline".format(self.latency_budget))
+        if (self.allocation_budget is not None and
+                result.allocations is not None and
+                baseline.get('allocations') and
+                result.allocations >
+                baseline['allocations'] * self.allocation_budget):
+            result.failures.append(
+                "allocations exceed {} x baseline".format(
+                    self.allocation_budget))
+
+    def patch_adapter(self, **attrs):
+        return _PatchedAttributes(self.adapter, attrs)
+
+
+class _PatchedAttributes(object):
+
+    def __init__(self, obj, attrs):
+        self.obj = obj
+        self.attrs = attrs
+        self.saved = {}
+
+    def __enter__(self):
+        for name, value in self.attrs.items():
+            self.saved[name] = self.obj.__dict__.get(name, _missing)
+            setattr(self.obj, name, value)
+
+    def __exit__(self, *exc_info):
+        for name, value in self.saved.items():
+            if value is _missing:
+                delattr(self.obj, name)
+            else:
+                setattr(self.obj, name, value)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+from six.moves.urllib.parse import urljoin
+
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+
+from .exceptions import CASRESTError
+from .http import get_http_session
+from .lru import LRUCache
+
+
+class CASRESTClient(object):
+    """Client of the REST protocol of a CAS server.
+
+    It lets non-browser clients (batch jobs, workers…) obtain service tickets
+    from credentials, using the server and provider configured for a
+    `CASAdapter`.
+
+    Ticket-granting tickets (TGT) are cached per credentials until they
+    expire, so that the CAS server is only hit once per credentials and
+    lifetime of a TGT. At most ``max_tgts`` TGT are cached, the least
+    recently used being dropped first. Concurrent requests of a TGT for the
+    same credentials are coalesced: a single request is sent to the server,
+    and the other threads wait for its result.
+
+    An instance is meant to be shared by all threads of a process.
+
+    Args:
+        adapter (:class:`~allauth_cas.views.CASAdapter`): Adapter class, or
+            instance, of the CAS server.
+        tgt_timeout (int, optional): Lifetime of the cached TGT, in seconds.
+            Default:
+            ``settings.SOCIALACCOUNT_PROVIDERS[<id>]['REST_TGT_TIMEOUT']`` or
+            ``7200``.
+        max_tgts (int, optional): Maximum number of cached TGT. Default:
+            ``settings.SOCIALACCOUNT_PROVIDERS[<id>]['REST_TGT_CACHE_SIZE']``
+            or ``1024``.
+
+    """
+    #: Path of the tickets endpoint, relative to the CAS server url.
+    tickets_path = 'v1/tickets'
+
+    def __init__(self, adapter, tgt_timeout=None, max_tgts=None):
+        if isinstance(adapter, type):
+            adapter = adapter(None)
+        self.adapter = adapter
+
+        provider_settings = adapter.provider.get_settings()
+        if tgt_timeout is None:
+            tgt_timeout = provider_settings.get('REST_TGT_TIMEOUT', 7200)
+        self.tgt_timeout = tgt_timeout
+        if max_tgts is None:
+            max_tgts = provider_settings.get('REST_TGT_CACHE_SIZE', 1024)
+
+        self._tgts = LRUCache(max_tgts)
+        # Locks of the credentials being used, with their number of users.
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    @property
+    def tickets_url(self):
+        return urljoin(self.adapter.url.rstrip('/') + '/', self.tickets_path)
+
+    @property
+    def session(self):
+        return get_http_session(self.adapter.url)
+
+    def get_ticket_granting_ticket(self, username, password):
+        """Returns the url of a valid TGT for these credentials.
+
+        Raises:
+            CASRESTError: The CAS server rejected the credentials.
+
+        """
+        key = self._get_key(username, password)
+
+        tgt = self._get_cached_tgt(key)
+        if tgt is not None:
+            return tgt
+
+        with self._lock(key):
+            # Another thread may have obtained a TGT while we were waiting.
+            tgt = self._get_cached_tgt(key)
+            if tgt is None:
+                tgt = self._request_tgt(username, password)
+                self._tgts.set(key, (tgt, time.time() + self.tgt_timeout))
+
+        return tgt
+
+    def get_service_ticket(self, username, password, service):
+        """Returns a service ticket for ``service``.
+
+        Service tickets can be used once, so a new one is requested on each
+        call. If the cached TGT has expired on the server side, it is dropped
+        and a new one is requested.
+
+        Raises:
+            CASRESTError: The CAS server didn't issue a service ticket.
+
+        """
+        key = self._get_key(username, password)
+        tgt = self.get_ticket_granting_ticket(username, password)
+
+        response = self.session.post(tgt, data={'service': service})
+
+        if response.status_code in (400, 404):
+            # The TGT has expired or has been destroyed on the server.
+            self._forget_tgt(key, tgt)
+            tgt = self.get_ticket_granting_ticket(username, password)
+            response = self.session.post(tgt, data={'service': service})
+
+        if response.status_code != 200:
+            raise CASRESTError(
+                "CAS server didn't issue a service ticket "
+                "(HTTP {}).".format(response.status_code)
+            )
+
+        return response.text.strip()
+
+    def logout(self, username, password):
+        """Destroys the TGT of these credentials, if any."""
+        key = self._get_key(username, password)
+        cached = self._tgts.get(key)
+        if cached is not None:
+            self._tgts.delete(key)
+            self.session.delete(cached[0])
+
+    def _get_key(self, username, password):
+        # Credentials are never kept as is.
+        raw = u'{}\0{}'.format(username, password).encode('utf-8')
+        return hashlib.sha256(raw).hexdigest()
+
+    @contextmanager
+    def _lock(self, key):
+        # The lock of a key is dropped once no thread uses it anymore.
+        with self._locks_lock:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.RLock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._locks_lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+    def _get_cached_tgt(self, key):
+        cached = self._tgts.get(key)
+        if cached is None:
+            return None
+        tgt, expires_at = cached
+        if expires_at <= time.time():
+            self._forget_tgt(key, tgt)
+            return None
+        return tgt
+
+    def _forget_tgt(self, key, tgt):
+        with self._lock(key):
+            cached = self._tgts.get(key)
+            if cached is not None and cached[0] == tgt:
+                self._tgts.delete(key)
+
+    def _request_tgt(self, username, password):
+        response = self.session.post(self.tickets_url, data={
+            'username': username,
+            'password': password,
+        })
+
+        if response.status_code != 201:
+            raise CASRESTError(
+                "CAS server didn't issue a ticket-granting ticket "
+                "(HTTP {}).".format(response.status_code)
+            )
+
+        tgt = response.headers.get('Location')
+        if not tgt:
+            raise CASRESTError(
+                "CAS server didn't give the location of the ticket-granting "
+                "ticket."
+            )
+
+        return tgt
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+import logging
+from importlib import import_module
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+
+from . import CAS_PROVIDER_SESSION_KEY, CAS_SESSION_KEY, app_settings
+from .locks import CacheLock
+
+logger = logging.getLogger(__name__)
+
+
+def get_cas_login(session):
+    """Returns the provider id and the uid of the last CAS login of
+    ``session``.
+
+    Returns:
+        (str, str): ``(None, None)`` if the session has no CAS login. The uid
+        is ``None`` for sessions opened by older versions.
+
+    """
+    entry = session.get(CAS_SESSION_KEY)
+    if entry:
+        return entry[0], entry[1]
+    return session.get(CAS_PROVIDER_SESSION_KEY), None
+
+
+def set_cas_login(session, provider_id, uid):
+    """Records a CAS login in ``session``.
+
+    All the CAS data lives in a single compact entry, written along with the
+    rest of the session.
+    """
+    session[CAS_SESSION_KEY] = [provider_id, uid]
+    if CAS_PROVIDER_SESSION_KEY in session:
+        del session[CAS_PROVIDER_SESSION_KEY]
+
+
+class InvalidationResult(object):
+    """
+    Counters of a sessions invalidation.
+    """
+
+    def __init__(self):
+        self.users = 0
+        self.sessions = 0
+
+    def __str__(self):
+        return "{} users, {} sessions invalidated".format(
+            self.users, self.sessions,
+        )
+
+
+class SessionIndex(object):
+    """Index of the session keys of each user, stored in a Django cache.
+
+    Session backends can't list the sessions of a user without reading all of
+    them. The index keeps, for each user, the keys of the sessions opened by
+    a CAS login, so that they can be deleted in bulk.
+
+    Entries expire after ``timeout`` seconds, which should not be shorter
+    than the lifetime of sessions. The cache must be shared by all processes
+    (e.g. memcached, redis or a database cache).
+
+    Args:
+        cache_alias (str): Alias of the cache in ``settings.CACHES``.
+        timeout (int): Lifetime of the entries, in seconds. Default:
+            ``settings.SESSION_COOKIE_AGE``.
+
+    """
+    key_prefix = 'allauth_cas:sessions:'
+    #: Maximum time waited for the lock of an update, in seconds.
+    lock_wait = 3
+
+    def __init__(self, cache_alias='default', timeout=None):
+        self.cache_alias = cache_alias
+        self.cache = caches[cache_alias]
+        self.timeout = timeout or settings.SESSION_COOKIE_AGE
+
+    def get_key(self, user_pk):
+        return '{}{}'.format(self.key_prefix, user_pk)
+
+    def update(self, user_pk, func):
+        """Replaces the session keys of a user by ``func(session_keys)``.
+
+        Concurrent updates of a user are serialized with a
+        :class:`~allauth_cas.locks.CacheLock`, so that none is lost. If the
+        lock can't be acquired within ``lock_wait`` seconds, the index is left
+        unchanged.
+
+        Returns:
+            bool: Whether the index has been updated.
+
+        """
+        key = self.get_key(user_pk)
+        lock = CacheLock(
+            key + ':lock', timeout=5, cache_alias=self.cache_alias)
+        if not lock.acquire(wait=self.lock_wait):
+            logger.warning(
+                "The session index of the user %s is locked, it is left "
+                "unchanged.", user_pk,
+            )
+            return False
+        try:
+            session_keys = func(self.cache.get(key, []))
+            if session_keys:
+                self.cache.set(key, session_keys, self.timeout)
+            else:
+                self.cache.delete(key)
+        finally:
+            lock.release()
+        return True
+
+    def add(self, user_pk, session_key):
+        """Records that the session ``session_key`` belongs to a user."""
+        return self.update(user_pk, lambda keys: (
+            [k for k in keys if k != session_key] + [session_key]
+        ))
+
+    def remove(self, user_pk, session_key):
+        """Removes the session ``session_key`` from the index of a user."""
+        return self.update(user_pk, lambda keys: (
+            [k for k in keys if k != session_key]
+        ))
+
+    def get_session_keys(self, user_pks):
+        """Returns the indexed session keys, by user pk.
+
+        Users without sessions are omitted.
+        """
+        keys = dict((self.get_key(pk), pk) for pk in user_pks)
+        return dict(
+            (keys[key], session_keys)
+            for key, session_keys in self.cache.get_many(list(keys)).items()
+        )
+
+    def invalidate(self, user_pks):
+        """Deletes all the indexed sessions of the users ``user_pks``.
+
+        Sessions are deleted with a single query if the session engine is
+        ``django.contrib.sessions.backends.db``, one by one otherwise.
+
+        Returns:
+            :class:`InvalidationResult`
+
+        """
+        result = InvalidationResult()
+        by_user = self.get_session_keys(user_pks)
+        session_keys = [
+            session_key
+            for keys in by_user.values()
+            for session_key in keys
+        ]
+
+        delete_sessions(session_keys)
+        self.cache.delete_many([self.get_key(pk) for pk in by_user])
+
+        result.users = len(by_user)
+        result.sessions = len(session_keys)
+        return result
+
+
+def get_session_model(store_class):
+    """Returns the model of a database session store.
+
+    ``SessionStore.get_model_class()`` is missing before Django 1.9.
+    """
+    try:
+        return store_class.get_model_class()
+    except AttributeError:
+        from django.contrib.sessions.models import Session
+        return Session
+
+
+def delete_sessions(session_keys):
+    """Deletes the sessions ``session_keys`` from the session engine."""
+    if not session_keys:
+        return
+    # Imported here, as it loads the Session model.
+    from django.contrib.sessions.backends.db import SessionStore as DBStore
+
+    SessionStore = import_module(settings.SESSION_ENGINE).SessionStore
+    if SessionStore is DBStore:
+        get_session_model(SessionStore).objects.filter(
+            session_key__in=session_keys,
+        ).delete()
+    else:
+        store = SessionStore()
+        for session_key in session_keys:
+            store.delete(session_key)
+
+
+def get_session_index():
+    """Returns the session index configured by the settings, or ``None``."""
+    if app_settings.SESSION_INDEX_CACHE is None:
+        return None
+    return SessionIndex(
+        cache_alias=app_settings.SESSION_INDEX_CACHE,
+        timeout=app_settings.SESSION_INDEX_TIMEOUT,
+    )
+
+
+def index_session(request):
+    """Records the session of ``request`` in the index of its user, if the
+    session index is enabled."""
+    index = get_session_index()
+    session_key = request.session.session_key
+    if index is not None and session_key and request.user.pk is not None:
+        index.add(request.user.pk, session_key)
+
+
+def unindex_session(request, user):
+    """Removes the session of ``request`` from the index of ``user``, if the
+    session index is enabled."""
+    index = get_session_index()
+    session_key = request.session.session_key
+    if index is not None and session_key and user is not None:
+        index.remove(user.pk, session_key)
+
+
+def invalidate_user_sessions(users):
+    """Deletes all the sessions opened by a CAS login of ``users``.
+
+    Args:
+        users: Iterable of users, or of user pks.
+
+    Returns:
+        :class:`InvalidationResult`
+
+    Raises:
+        ImproperlyConfigured: The session index is not enabled.
+
+    """
+    index = get_session_index()
+    if index is None:
+        raise ImproperlyConfigured(
+            "The session index requires ALLAUTH_CAS_SESSION_INDEX_CACHE to "
+            "be set."
+        )
+    return index.invalidate([getattr(user, 'pk', user) for user in users])
@@ -1,22 +1,40 @@
 # -*- coding: utf-8 -*-
+from django.contrib.auth.models import Group
 from django.contrib.auth.signals import user_logged_out
+from django.core.signals import request_finished
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 
 from allauth.account.adapter import get_adapter
 from allauth.account.utils import get_next_redirect_url
-from allauth.socialaccount import providers
+from allauth.socialaccount.models import SocialAccount, SocialApp
 
-from . import CAS_PROVIDER_SESSION_KEY
+from . import app_settings
+from .audit import AuditEvent, audit, get_audit_log
+from .groups import clear_group_pks
+from .locks import release_request_locks
+from .registry import clear_provider_cache, get_provider
+from .sessions import get_cas_login, unindex_session
 
 
 @receiver(user_logged_out)
 def cas_account_logout(sender, request, **kwargs):
-    provider_id = request.session.get(CAS_PROVIDER_SESSION_KEY)
+    provider_id, uid = get_cas_login(request.session)
 
     if not provider_id:
         return
 
-    provider = providers.registry.by_id(provider_id, request)
+    unindex_session(request, kwargs.get('user'))
+
+    provider = get_provider(provider_id, request)
+
+    if get_audit_log() is not None:
+        if uid is None:
+            user = kwargs.get('user')
+            uid = SocialAccount.objects.filter(
+                user_id=getattr(user, 'pk', None), provider=provider_id,
+            ).values_list('uid', flat=True).first()
+        audit(AuditEvent.LOGOUT, provider_id, request, uid=uid)
 
     if not provider.message_suggest_caslogout_on_logout(request):
         return
@@ -30,3 +48,31 @@ def cas_account_logout(sender, request, **kwargs):
         request, next_page=next_page,
         level=provider.message_suggest_caslogout_on_logout_level(request),
     )
+
+
+@receiver(user_logged_out)
+def cas_gateway_logout(sender, request, **kwargs):
+    # Picked up by CASGatewayMiddleware, which sets the gateway cookie, so
+    # that the user is not logged in again by the next request.
+    if app_settings.GATEWAY_PROVIDER and request is not None:
+        request.cas_gateway_logout = True
+
+
+@receiver(request_finished)
+def cas_request_finished(sender, **kwargs):
+    # Provisioning locks held until the transaction of the request commits
+    # are released here if it has been rolled back.
+    release_request_locks()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def cas_group_changed(sender, **kwargs):
+    clear_group_pks()
+
+
+@receiver(post_save, sender=SocialApp)
+@receiver(post_delete, sender=SocialApp)
+@receiver(m2m_changed, sender=SocialApp.sites.through)
+def cas_social_app_changed(sender, **kwargs):
+    clear_provider_cache()
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+
+
+def percentile(values, p):
+    """Returns the ``p``-th percentile of ``values`` (nearest rank)."""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = int(round(p / 100. * (len(values) - 1)))
+    return values[rank]
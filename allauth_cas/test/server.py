@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+import six
+from six.moves import socketserver
+from six.moves.urllib.parse import parse_qs, urlencode
+
+import itertools
+import re
+import threading
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.utils.html import escape
+
+CAS_NS = 'http://www.yale.edu/tp/cas'
+
+_SAML_ARTIFACT_RE = re.compile(
+    r'<samlp:AssertionArtifact>\s*([^<\s]+)\s*</samlp:AssertionArtifact>')
+
+SUCCESS_TEMPLATE = (
+    u'<cas:serviceResponse xmlns:cas="{ns}">\n'
+    u'  <cas:authenticationSuccess>\n'
+    u'    <cas:user>{user}</cas:user>\n'
+    u'{attributes}'
+    u'  </cas:authenticationSuccess>\n'
+    u'</cas:serviceResponse>\n'
+)
+
+FAILURE_TEMPLATE = (
+    u'<cas:serviceResponse xmlns:cas="{ns}">\n'
+    u'  <cas:authenticationFailure code="INVALID_TICKET">\n'
+    u'    Ticket {ticket} not recognized\n'
+    u'  </cas:authenticationFailure>\n'
+    u'</cas:serviceResponse>\n'
+)
+
+
+def build_success_response(username, attributes=None):
+    """Returns a CAS 2/3 validation response, authenticating ``username``.
+
+    Args:
+        username (str)
+        attributes (dict, optional): Attributes of the user. Values may be
+            lists, for multi-valued attributes.
+
+    """
+    lines = []
+    for name, values in sorted((attributes or {}).items()):
+        if isinstance(values, six.string_types):
+            values = [values]
+        for value in values:
+            lines.append(u'      <cas:{name}>{value}</cas:{name}>\n'.format(
+                name=name, value=escape(value)))
+    if lines:
+        lines = (
+            [u'    <cas:attributes>\n'] + lines +
+            [u'    </cas:attributes>\n']
+        )
+    return SUCCESS_TEMPLATE.format(
+        ns=CAS_NS, user=escape(username), attributes=u''.join(lines))
+
+
+def build_failure_response(ticket):
+    """Returns a CAS 2/3 validation response, rejecting ``ticket``."""
+    return FAILURE_TEMPLATE.format(ns=CAS_NS, ticket=escape(ticket))
+
+
+class _ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+class CASStandInServer(object):
+    """A local CAS server, for tests and benchmarks.
+
+    It serves the CAS 2, CAS 3 and SAML 1.1 validation endpoints, in a
+    background thread, with real HTTP round trips. Each ticket is valid once.
+
+    Tickets are either issued by the ``/login`` endpoint, which redirects to
+    the service as a CAS server would, authenticating ``username`` with
+    ``attributes``, or registered with :meth:`add_ticket`, with the exact
+    response to return.
+
+    Use it as a context manager, or call :meth:`start` and :meth:`stop`::
+
+        with CASStandInServer() as server:
+            # Point the adapter to server.url.
+
+    Args:
+        username (str): User authenticated by tickets issued by ``/login``.
+        attributes (dict, optional): Its attributes.
+
+    """
+
+    def __init__(self, username='username', attributes=None,
+                 host='127.0.0.1', port=0):
+        self.username = username
+        self.attributes = attributes or {}
+        self.host = host
+        self.port = port
+
+        self.requests = 0
+
+        self._tickets = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self):
+        """Url of the server, to set as ``CASAdapter.url``."""
+        return 'http://{}:{}/'.format(self.host, self._httpd.server_port)
+
+    def add_ticket(self, content, ticket=None):
+        """Registers a ticket.
+
+        Args:
+            content (str): The response of the validation endpoints for this
+                ticket.
+            ticket (str, optional): By default, a new ticket is generated.
+
+        Returns:
+            str: The ticket.
+
+        """
+        if ticket is None:
+            ticket = 'ST-{}-standin'.format(next(self._seq))
+        with self._lock:
+            self._tickets[ticket] = content
+        return ticket
+
+    def issue_ticket(self, username=None, attributes=None):
+        """Registers a ticket authenticating ``username``."""
+        return self.add_ticket(build_success_response(
+            username or self.username,
+            self.attributes if attributes is None else attributes,
+        ))
+
+    def start(self):
+        self._httpd = make_server(
+            self.host, self.port, self.application,
+            server_class=_ThreadingWSGIServer, handler_class=_QuietHandler,
+        )
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, kwargs={'poll_interval': 0.05},
+            name='allauth_cas-standin',
+        )
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def application(self, environ, start_response):
+        with self._lock:
+            self.requests += 1
+        path = environ['PATH_INFO'].strip('/')
+        params = dict(
+            (key, values[0]) for key, values in
+            parse_qs(environ.get('QUERY_STRING', '')).items()
+        )
+
+        if path == 'login':
+            return self.login(params, start_response)
+        if path == 'logout':
+            return self.respond(start_response, u'Logged out.\n')
+        if path in ('serviceValidate', 'proxyValidate',
+                    'p3/serviceValidate', 'p3/proxyValidate'):
+            return self.validate(params.get('ticket', ''), start_response)
+        if path == 'samlValidate':
+            return self.validate(
+                self.read_saml_ticket(environ), start_response)
+        return self.respond(start_response, u'Not found.\n', '404 Not Found')
+
+    def login(self, params, start_response):
+        service = params.get('service', '')
+        ticket = self.issue_ticket()
+        separator = '&' if '?' in service else '?'
+        location = service + separator + urlencode({'ticket': ticket})
+        start_response('302 Found', [('Location', location)])
+        return [b'']
+
+    def read_saml_ticket(self, environ):
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        body = environ['wsgi.input'].read(length).decode('utf-8')
+        match = _SAML_ARTIFACT_RE.search(body)
+        return match.group(1) if match else ''
+
+    def validate(self, ticket, start_response):
+        with self._lock:
+            content = self._tickets.pop(ticket, None)
+        if content is None:
+            content = build_failure_response(ticket)
+        return self.respond(start_response, content, content_type='text/xml')
+
+    def respond(self, start_response, content, status='200 OK',
+                content_type='text/plain'):
+        body = content.encode('utf-8')
+        start_response(status, [
+            ('Content-Type', content_type + '; charset=utf-8'),
+            ('Content-Length', str(len(body))),
+        ])
+        return [body]
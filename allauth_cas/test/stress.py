@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from collections import Counter
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from allauth.socialaccount.models import SocialAccount
+
+from ..replay import _PatchedAttributes
+from ..stats import percentile
+from .server import CASStandInServer
+
+if django.VERSION >= (1, 10):
+    from django.urls import reverse
+else:
+    from django.core.urlresolvers import reverse
+
+STEPS = ('login', 'callback', 'logout')
+
+
+class StressResult(object):
+    """Measures of a stress run.
+
+    Attributes:
+        flows (int): Number of flows run.
+        duration (float): Duration of the run, in seconds.
+        latencies (dict): Durations of each step, in seconds, by step name
+            (``login``, ``callback``, ``logout``).
+        errors (`list` of `str`): Errors of the flows.
+        violations (`list` of `str`): Invariants broken after the run.
+
+    """
+
+    def __init__(self):
+        self.flows = 0
+        self.duration = 0
+        self.latencies = dict((step, []) for step in STEPS)
+        self.errors = []
+        self.violations = []
+        self._lock = threading.Lock()
+
+    @property
+    def throughput(self):
+        """Flows per second."""
+        return self.flows / self.duration if self.duration else 0
+
+    @property
+    def passed(self):
+        return not self.errors and not self.violations
+
+    def add_latency(self, step, latency):
+        with self._lock:
+            self.latencies[step].append(latency)
+
+    def add_error(self, error):
+        with self._lock:
+            self.errors.append(error)
+
+    def __str__(self):
+        lines = [
+            "{} flows in {:.2f} s ({:.1f} flows/s), {} errors, "
+            "{} violations".format(
+                self.flows, self.duration, self.throughput,
+                len(self.errors), len(self.violations),
+            )
+        ]
+        for step in STEPS:
+            latencies = self.latencies[step]
+            if latencies:
+                lines.append(
+                    "{}: p50 {:.1f} ms, p95 {:.1f} ms, p99 {:.1f} ms, "
+                    "max {:.1f} ms".format(
+                        step,
+                        percentile(latencies, 50) * 1000,
+                        percentile(latencies, 95) * 1000,
+                        percentile(latencies, 99) * 1000,
+                        max(latencies) * 1000,
+                    )
+                )
+        lines.extend("Error: {}".format(error) for error in self.errors[:10])
+        lines.extend("Violation: {}".format(v) for v in self.violations)
+        return "\n".join(lines)
+
+
+class StressRunner(object):
+    """Runs concurrent login flows through the views of a provider.
+
+    ``flows`` flows are run by ``concurrency`` threads, each with its own
+    test client and database connection. A flow goes through the login view,
+    the callback view with a ticket whose validation is served by a
+    :class:`CASStandInServer`, and the logout view of allauth.
+
+    Flows authenticate ``users`` distinct uids in turn, so that several
+    flows race on the first login of the same user.
+
+    After the run, invariants are checked:
+
+    * each uid has exactly one social account;
+    * each user created by the run has one social account of the provider.
+
+    The threads share the test database, so it must be used from a
+    ``TransactionTestCase`` (see
+    :class:`~allauth_cas.test.testcases.CASStressTestCase`), as data
+    created in the transaction of a ``TestCase`` is not visible from other
+    connections.
+
+    Args:
+        adapter (:class:`~allauth_cas.views.CASAdapter` subclass): The
+            adapter used by the views. Its ``url`` is replaced during the
+            run.
+        attributes (dict): Attributes of the users, returned by the CAS
+            server.
+
+    """
+
+    def __init__(self, adapter, flows=50, concurrency=8, users=5,
+                 attributes=None):
+        self.adapter = adapter
+        self.flows = flows
+        self.concurrency = concurrency
+        self.users = users
+        self.attributes = attributes or {}
+
+    def get_uid(self, index):
+        return 'stress-user-{}'.format(index % self.users)
+
+    def run(self):
+        """Runs the flows.
+
+        Returns:
+            :class:`StressResult`
+
+        """
+        result = StressResult()
+        User = get_user_model()
+        existing_users = set(User.objects.values_list('pk', flat=True))
+
+        indexes = iter(range(self.flows))
+        indexes_lock = threading.Lock()
+
+        def next_index():
+            with indexes_lock:
+                return next(indexes, None)
+
+        allowed_hosts = list(settings.ALLOWED_HOSTS) + ['testserver']
+        with CASStandInServer(attributes=self.attributes) as server, \
+                override_settings(ALLOWED_HOSTS=allowed_hosts), \
+                _PatchedAttributes(self.adapter, {'url': server.url}):
+            threads = [
+                threading.Thread(
+                    target=self.work, args=(server, next_index, result))
+                for _ in range(self.concurrency)
+            ]
+            start = time.time()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            result.duration = time.time() - start
+
+        result.flows = self.flows
+        result.violations = self.check_invariants(existing_users)
+        return result
+
+    def work(self, server, next_index, result):
+        try:
+            while True:
+                index = next_index()
+                if index is None:
+                    return
+                try:
+                    self.run_flow(server, index, result)
+                except Exception as e:
+                    result.add_error("Flow {}: {!r}".format(index, e))
+        finally:
+            connection.close()
+
+    def run_flow(self, server, index, result):
+        provider_id = self.adapter.provider_id
+        uid = self.get_uid(index)
+        client = Client()
+
+        start = time.time()
+        response = client.get(reverse('{}_login'.format(provider_id)))
+        result.add_latency('login', time.time() - start)
+        if response.status_code != 302:
+            raise AssertionError(
+                "login returned {}".format(response.status_code))
+
+        ticket = server.issue_ticket(uid)
+        start = time.time()
+        response = client.get(
+            reverse('{}_callback'.format(provider_id)), {'ticket': ticket})
+        result.add_latency('callback', time.time() - start)
+        if '_auth_user_id' not in client.session:
+            raise AssertionError(
+                "callback returned {} without logging in {}".format(
+                    response.status_code, uid))
+
+        start = time.time()
+        response = client.post(reverse('account_logout'))
+        result.add_latency('logout', time.time() - start)
+        if '_auth_user_id' in client.session:
+            raise AssertionError("{} is still logged in".format(uid))
+
+    def check_invariants(self, existing_users):
+        provider_id = self.adapter.provider_id
+        uids = set(self.get_uid(i) for i in range(self.flows))
+        violations = []
+
+        accounts = list(
+            SocialAccount.objects
+            .filter(provider=provider_id, uid__in=uids)
+            .values_list('uid', 'user_id')
+        )
+        per_uid = Counter(uid for uid, _ in accounts)
+        for uid in sorted(uids):
+            if per_uid[uid] != 1:
+                violations.append("{} has {} social accounts".format(
+                    uid, per_uid[uid]))
+
+        User = get_user_model()
+        created = set(
+            User.objects.values_list('pk', flat=True)) - existing_users
+        per_user = Counter(
+            SocialAccount.objects
+            .filter(provider=provider_id, user_id__in=created)
+            .values_list('user_id', flat=True)
+        )
+        for pk in sorted(created):
+            if per_user[pk] != 1:
+                violations.append("user {} has {} social accounts".format(
+                    pk, per_user[pk]))
+        return violations
@@ -4,13 +4,17 @@ try:
 except ImportError:
     from mock import patch
 
+from importlib import import_module
+from unittest import SkipTest
+
 import django
 from django.conf import settings
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
 
 import cas
 
-from allauth_cas import CAS_PROVIDER_SESSION_KEY
+from allauth_cas import CAS_SESSION_KEY
 
 if django.VERSION >= (1, 10):
     from django.urls import reverse
@@ -18,8 +22,64 @@ else:
     from django.core.urlresolvers import reverse
 
 
+class SessionSaveCounter(object):
+    """
+    Counts the writes of sessions of settings.SESSION_ENGINE, as a context
+    manager.
+
+    A save creating the session counts once, though the session engines
+    implement it with nested calls of save().
+    """
+
+    def __enter__(self):
+        store_class = import_module(settings.SESSION_ENGINE).SessionStore
+        save = store_class.save
+        counter = self
+        self.count = 0
+
+        def counting_save(store, *args, **kwargs):
+            depth = getattr(store, '_save_counter_depth', 0)
+            if not depth:
+                counter.count += 1
+            store._save_counter_depth = depth + 1
+            try:
+                return save(store, *args, **kwargs)
+            finally:
+                store._save_counter_depth = depth
+
+        self._patcher = patch.object(store_class, 'save', counting_save)
+        self._patcher.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._patcher.stop()
+
+
+class _AssertNumSessionSavesContext(SessionSaveCounter):
+
+    def __init__(self, test_case, num):
+        self.test_case = test_case
+        self.num = num
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super(_AssertNumSessionSavesContext, self).__exit__(
+            exc_type, exc_value, traceback)
+        if exc_type is None:
+            self.test_case.assertEqual(
+                self.count, self.num,
+                "{} session saves, {} expected".format(self.count, self.num),
+            )
+
+
 class CASTestCase(TestCase):
 
+    def assertNumSessionSaves(self, num):
+        """
+        Asserts sessions are saved num times in the block, as a context
+        manager.
+        """
+        return _AssertNumSessionSavesContext(self, num)
+
     def client_cas_login(
             self,
             client, provider_id='theid',
@@ -71,6 +131,9 @@ class CASTestCase(TestCase):
         if hasattr(self, '_patch_cas_client'):
             self.patch_cas_response_stop()
 
+        # Patches of the client classes, undone with the client patch.
+        self._patch_cas_client_classes = []
+
         class MockCASClient(object):
             _username = username
 
@@ -100,6 +163,7 @@ class CASTestCase(TestCase):
                     new=verify_ticket,
                 )
                 patcher.start()
+                self._patch_cas_client_classes.append(patcher)
 
                 return client_class(*args, **kwargs)
 
@@ -112,6 +176,9 @@ class CASTestCase(TestCase):
     def patch_cas_response_stop(self):
         self._patch_cas_client.stop()
         del self._patch_cas_client
+        for patcher in reversed(self._patch_cas_client_classes):
+            patcher.stop()
+        del self._patch_cas_client_classes
 
     def tearDown(self):
         if hasattr(self, '_patch_cas_client'):
@@ -126,7 +193,7 @@ class CASViewTestCase(CASTestCase):
 
         To check this, the response should redirect to redirect_to (default to
         /accounts/profile/, the default redirect after a successful login).
-        Also CAS_PROVIDER_SESSION_KEY should be set in the client' session. By
+        Also the CAS login should be recorded in the client' session. By
         default, self.client is used.
         """
         if redirect_to is None:
@@ -137,10 +204,43 @@ class CASViewTestCase(CASTestCase):
             fetch_redirect_response=False,
         )
         self.assertIn(
-            CAS_PROVIDER_SESSION_KEY,
+            CAS_SESSION_KEY,
             response.wsgi_request.session,
         )
 
+    def assertCASLoginQueries(
+            self, num, client=None, provider_id='theid',
+            username=None, attributes={}):
+        """
+        Asserts the callback request of a CAS login executes num queries on
+        the default database, middlewares included.
+
+        The failure message details the executed queries, grouped by
+        statement. Arguments are the ones of client_cas_login. Returns the
+        response of the callback view.
+        """
+        from allauth_cas.queries import QueryCapture
+
+        client = client or self.client
+        client.get(reverse('{id}_login'.format(id=provider_id)))
+        self.patch_cas_response(
+            valid_ticket='__all__',
+            username=username, attributes=attributes,
+        )
+        callback_url = reverse('{id}_callback'.format(id=provider_id))
+        try:
+            with QueryCapture() as capture:
+                r = client.get(callback_url, {'ticket': 'fake-ticket'})
+        finally:
+            self.patch_cas_response_stop()
+
+        if len(capture) != num:
+            self.fail(
+                "{} queries executed by the CAS login, {} expected:\n"
+                "{}".format(len(capture), num, capture.get_breakdown())
+            )
+        return r
+
     def assertLoginFailure(self, response):
         """
         Asserts response corresponds to a failed login.
@@ -149,3 +249,38 @@ class CASViewTestCase(CASTestCase):
             '<h1>Social Network Login Failure</h1>',
             str(response.content),
         )
+
+
+class CASStressTestCase(TransactionTestCase):
+    """
+    Runs concurrent login flows, with a transactional test database shared by
+    the threads.
+
+    Skipped with an in-memory SQLite database, which fails concurrent writes.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        name = connection.settings_dict['NAME']
+        if connection.vendor == 'sqlite' and (
+                name == ':memory:' or 'mode=memory' in name):
+            raise SkipTest(
+                "Stress tests require a test database on disk with SQLite.")
+        super(CASStressTestCase, cls).setUpClass()
+
+    def run_cas_stress(self, adapter, **kwargs):
+        """
+        Runs concurrent login flows through the views of the provider of
+        adapter, and returns their StressResult.
+
+        Keyword arguments are passed to StressRunner.
+        """
+        from .stress import StressRunner
+        return StressRunner(adapter, **kwargs).run()
+
+    def assertStressPassed(self, result):
+        """
+        Asserts no flow failed and no invariant was broken.
+        """
+        if not result.passed:
+            self.fail(str(result))
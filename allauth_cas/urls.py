@@ -1,51 +1,93 @@
 # -*- coding: utf-8 -*-
-from django.conf.urls import include, url
+from django.conf.urls import url
+from django.utils.functional import cached_property
 from django.utils.module_loading import import_string
 
+MISSING_VIEW_MESSAGE = (
+    "The {name} view for the '{id}' provider is lacking from the 'views' "
+    "module of its app.\n"
+    "You may want to add:\n"
+    "from allauth_cas.views import {view_class}\n\n"
+    "{name} = {view_class}.adapter_view(<LocalCASAdapter>)"
+)
 
-def default_urlpatterns(provider):
+REQUIRED_VIEWS = (
+    ('login', 'CASLoginView'),
+    ('callback', 'CASCallbackView'),
+)
+
+
+def import_views(provider):
+    """Imports the views of a CAS provider, from the ``views`` module of its
+    app.
+
+    Returns:
+        `dict`: Views, by name. The ``logout`` view is optional.
+
+    Raises:
+        ImportError: The ``login`` or ``callback`` view is missing.
+
+    """
     package = provider.get_package()
 
-    try:
-        login_view = import_string(package + '.views.login')
-    except ImportError:
-        raise ImportError(
-            "The login view for the '{id}' provider is lacking from the "
-            "'views' module of its app.\n"
-            "You may want to add:\n"
-            "from allauth_cas.views import CASLoginView\n\n"
-            "login = CASLoginView.adapter_view(<LocalCASAdapter>)"
-            .format(id=provider.id)
-        )
+    views = {}
+    for name, view_class in REQUIRED_VIEWS:
+        try:
+            views[name] = import_string(package + '.views.' + name)
+        except ImportError:
+            raise ImportError(MISSING_VIEW_MESSAGE.format(
+                name=name, id=provider.id, view_class=view_class))
 
     try:
-        callback_view = import_string(package + '.views.callback')
+        views['logout'] = import_string(package + '.views.logout')
     except ImportError:
-        raise ImportError(
-            "The callback view for the '{id}' provider is lacking from the "
-            "'views' module of its app.\n"
-            "You may want to add:\n"
-            "from allauth_cas.views import CASCallbackView\n\n"
-            "callback = CASCallbackView.adapter_view(<LocalCASAdapter>)"
-            .format(id=provider.id)
-        )
+        pass
 
-    try:
-        logout_view = import_string(package + '.views.logout')
-    except ImportError:
-        logout_view = None
-
-    urlpatterns = [
-        url('^login/$', login_view,
-            name=provider.id + '_login'),
-        url('^login/callback/$', callback_view,
-            name=provider.id + '_callback'),
-    ]
-
-    if logout_view is not None:
-        urlpatterns += [
-            url('^logout/$', logout_view,
-                name=provider.id + '_logout'),
+    return views
+
+
+class ProviderURLconf(object):
+    """URLconf of the views of a CAS provider, loaded on its first use.
+
+    Importing the ``views`` module of a provider loads ``allauth_cas.views``.
+    It is deferred until an url of the provider is resolved or reversed,
+    instead of happening when the root URLconf is loaded.
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+
+    @cached_property
+    def urlpatterns(self):
+        views = import_views(self.provider)
+
+        urlpatterns = [
+            url('^login/$', views['login'],
+                name=self.provider.id + '_login'),
+            url('^login/callback/$', views['callback'],
+                name=self.provider.id + '_callback'),
         ]
 
-    return [url('^' + provider.get_slug() + '/', include(urlpatterns))]
+        if 'logout' in views:
+            urlpatterns += [
+                url('^logout/$', views['logout'],
+                    name=self.provider.id + '_logout'),
+            ]
+
+        return urlpatterns
+
+    def __repr__(self):
+        return '<ProviderURLconf {}>'.format(self.provider.id)
+
+
+def default_urlpatterns(provider):
+    """Returns the urlpatterns of the views of a CAS provider.
+
+    The ``login`` and ``callback`` views, and optionally the ``logout`` view,
+    are taken from the ``views`` module of the provider app, see
+    :func:`import_views`. It is imported when an url of the provider is
+    first resolved or reversed, see :class:`ProviderURLconf`.
+    """
+    # As returned by include(), which would load the urlpatterns right away.
+    return [url('^' + provider.get_slug() + '/',
+                (ProviderURLconf(provider), None, None))]
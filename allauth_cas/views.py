@@ -1,25 +1,53 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import time
+from importlib import import_module
+
+from django.db import transaction
 from django.http import HttpResponseRedirect
-from django.utils.functional import cached_property
+from django.utils.functional import SimpleLazyObject, cached_property
 
 from allauth.account.adapter import get_adapter
 from allauth.account.utils import get_next_redirect_url
-from allauth.socialaccount import providers
 from allauth.socialaccount.helpers import (
     complete_social_login, render_authentication_error,
 )
 from allauth.socialaccount.models import SocialLogin
 
-import cas
-
-from . import CAS_PROVIDER_SESSION_KEY
+from . import app_settings
+from .audit import AuditEvent, audit
 from .exceptions import CASAuthenticationError
+from .http import get_http_session, use_http_session
+from .locks import CacheLock, release_at_request_end
+from .middleware import set_gateway_cache
+from .profiling import profile_request
+from .queries import query_budget
+from .recording import record_client
+from .registry import get_provider
+from .sessions import get_cas_login, index_session, set_cas_login
+
+# python-cas, and the requests and XML stacks it depends on, are imported on
+# first use rather than when the URLconf is loaded.
+cas = SimpleLazyObject(lambda: import_module('cas'))
 
 
 class AuthAction(object):
     AUTHENTICATE = 'authenticate'
     REAUTHENTICATE = 'reauthenticate'
     DEAUTHENTICATE = 'deauthenticate'
+    GATEWAY = 'gateway'
+
+
+def set_gateway_cookie(response):
+    """Remembers on the client that a gateway login has been tried.
+
+    Gateway logins are not tried again while the cookie is set, i.e. for
+    ``ALLAUTH_CAS_GATEWAY_NEGATIVE_TTL`` seconds.
+    """
+    response.set_cookie(
+        app_settings.GATEWAY_COOKIE_NAME, '1',
+        max_age=app_settings.GATEWAY_NEGATIVE_TTL, httponly=True,
+    )
 
 
 class CASAdapter(object):
@@ -51,14 +79,33 @@ class CASAdapter(object):
             **any** CAS provider in the current session, ``False`` otherwise.
 
         """
-        return CAS_PROVIDER_SESSION_KEY in self.request.session
+        return get_cas_login(self.request.session)[0] is not None
+
+    @cached_property
+    def gateway(self):
+        """Whether the current request is part of a gateway login.
+
+        In a gateway login, the CAS server doesn't prompt the user for their
+        credentials. If the user has no SSO session, the CAS server redirects
+        them to the callback url without a ticket.
+
+        Returns:
+            ``True`` if the login view is requested with
+            ``action=gateway``, or for the callback view of such a login.
+
+        """
+        GET = self.request.GET
+        return (
+            GET.get('action') == AuthAction.GATEWAY or
+            GET.get('gateway') == '1'
+        )
 
     @cached_property
     def provider(self):
         """
         Returns a provider instance for the current request.
         """
-        return providers.registry.by_id(self.provider_id, self.request)
+        return get_provider(self.provider_id, self.request)
 
     def complete_login(self, request, response):
         """
@@ -88,14 +135,24 @@ class CASAdapter(object):
         It is used as redirection from the CAS server after a succssful
         authentication. So, the callback url is used as service url.
 
-        If present, the GET param ``next`` is added to the service url.
+        If present, the GET param ``next`` is added to the service url, as
+        well as ``gateway=1`` for a gateway login.
+
+        If the provider has a ``SERVICE_BASE_URL``, the service url is built
+        from it instead of the host of the request.
         """
         redirect_to = get_next_redirect_url(request)
 
         callback_kwargs = {'next': redirect_to} if redirect_to else {}
+        if self.gateway:
+            callback_kwargs['gateway'] = '1'
         callback_url = (
             self.provider.get_callback_url(request, **callback_kwargs))
 
+        base_url = self.provider.get_service_base_url()
+        if base_url is not None:
+            return base_url + callback_url
+
         service_url = request.build_absolute_uri(callback_url)
 
         return service_url
@@ -105,6 +162,9 @@ class CASView(object):
     """
     Base class for CAS views.
     """
+    #: Key of the view in the ``QUERY_BUDGETS`` setting of the provider.
+    query_budget_key = None
+
     @classmethod
     def adapter_view(cls, adapter):
         """Transform the view class into a view function.
@@ -115,12 +175,17 @@ class CASView(object):
             An (human) error page is rendered if any ``CASAuthenticationError``
             is catched.
 
+            Requests may be profiled, see
+            :func:`~allauth_cas.profiling.profile_request`.
+
         Args:
             adapter (:class:`CASAdapter`): Provide specifics of a CAS server.
 
         Returns:
             A view function. The given adapter and related provider are
-            accessible as attributes from the view class.
+            accessible as attributes from the view class. The adapter and
+            the view class are also set as ``adapter`` and ``view_class``
+            attributes of the function.
 
 
         """
@@ -136,18 +201,51 @@ class CASView(object):
             self.adapter = adapter(request)
             self.provider = self.adapter.provider
 
-            try:
-                return self.dispatch(request, *args, **kwargs)
-            except CASAuthenticationError:
-                return self.render_error()
+            return profile_request(
+                '{}.{}'.format(self.provider.id, cls.__name__),
+                self.handle, request, *args, **kwargs
+            )
 
+        view.adapter = adapter
+        view.view_class = cls
         return view
 
+    def handle(self, request, *args, **kwargs):
+        with query_budget(
+                self.get_query_budget(),
+                '{}.{}'.format(self.provider.id, self.__class__.__name__)):
+            return self.handle_errors(request, *args, **kwargs)
+
+    def get_query_budget(self):
+        """Returns the maximum number of queries of the view, if any.
+
+        Budgets are set per provider, by view, in
+        ``settings.SOCIALACCOUNT_PROVIDERS[<id>]['QUERY_BUDGETS']``, e.g.
+        ``{'login': 2, 'callback': 25}``.
+
+        See :func:`~allauth_cas.queries.query_budget`.
+        """
+        budgets = self.provider.get_settings().get('QUERY_BUDGETS', {})
+        return budgets.get(self.query_budget_key)
+
+    def handle_errors(self, request, *args, **kwargs):
+        try:
+            return self.dispatch(request, *args, **kwargs)
+        except CASAuthenticationError as e:
+            audit(
+                AuditEvent.FAILURE, self.provider.id, request,
+                latency=getattr(self, 'validation_latency', None),
+                detail=str(e),
+            )
+            return self.render_error()
+
     def get_client(self, request, action=AuthAction.AUTHENTICATE):
         """
         Returns the CAS client to interact with the CAS server.
         """
         auth_params = self.provider.get_auth_params(request, action)
+        if action == AuthAction.GATEWAY:
+            auth_params['gateway'] = 'true'
 
         service_url = self.adapter.get_service_url(request)
 
@@ -155,9 +253,13 @@ class CASView(object):
             service_url=service_url,
             server_url=self.adapter.url,
             version=self.adapter.version,
-            renew=self.adapter.renew,
+            # renew and gateway are exclusive.
+            renew=self.adapter.renew and not self.adapter.gateway,
             extra_login_params=auth_params,
         )
+        if app_settings.HTTP_POOLING:
+            # Reuse the connections to the CAS server.
+            use_http_session(client, get_http_session(self.adapter.url))
 
         return client
 
@@ -169,18 +271,38 @@ class CASView(object):
 
 
 class CASLoginView(CASView):
+    query_budget_key = 'login'
 
     def dispatch(self, request):
         """
         Redirects to the CAS server login page.
         """
         action = request.GET.get('action', AuthAction.AUTHENTICATE)
-        SocialLogin.stash_state(request)
+        self.stash_state(request)
         client = self.get_client(request, action=action)
-        return HttpResponseRedirect(client.get_login_url())
+        response = HttpResponseRedirect(client.get_login_url())
+        if action == AuthAction.GATEWAY:
+            # Set before the result is known, so that a failing CAS server
+            # can't trigger a redirection loop.
+            set_gateway_cookie(response)
+        return response
+
+    def stash_state(self, request):
+        """Stashes the state of the login flow in the session, for the
+        callback view.
+
+        The session is left unchanged, and is not saved, if the same state is
+        already stashed, e.g. when the login view is requested again before
+        the callback.
+        """
+        stashed = request.session.get('socialaccount_state')
+        if stashed and stashed[0] == SocialLogin.state_from_request(request):
+            return
+        SocialLogin.stash_state(request)
 
 
 class CASCallbackView(CASView):
+    query_budget_key = 'callback'
 
     def dispatch(self, request):
         """
@@ -192,11 +314,21 @@ class CASCallbackView(CASView):
         about user.
         """
         client = self.get_client(request)
+        record_client(client, self.provider.id, self.adapter.version)
+
+        if (self.adapter.gateway and
+                app_settings.GATEWAY_COOKIE_NAME not in request.COOKIES):
+            # The cookie set by the login view is lost: without this, a
+            # client which doesn't keep cookies would be redirected to the
+            # CAS server again by CASGatewayMiddleware, endlessly.
+            set_gateway_cache(request)
 
         # CAS server should let a ticket.
         try:
             ticket = request.GET['ticket']
         except KeyError:
+            if self.adapter.gateway:
+                return self.gateway_fallback(request)
             raise CASAuthenticationError(
                 "CAS server didn't respond with a ticket."
             )
@@ -205,7 +337,9 @@ class CASCallbackView(CASView):
         # Response format on:
         # - success: username, attributes, pgtiou
         # - error: None, {}, None
+        start = time.time()
         response = client.verify_ticket(ticket)
+        self.validation_latency = time.time() - start
 
         uid, extra, _ = response
 
@@ -214,18 +348,119 @@ class CASCallbackView(CASView):
                 "CAS server doesn't validate the ticket."
             )
 
-        # Keep tracks of the last used CAS provider.
-        request.session[CAS_PROVIDER_SESSION_KEY] = self.provider.id
-
         data = (uid, extra or {})
 
         # Finish the login flow.
         login = self.adapter.complete_login(request, data)
         login.state = SocialLogin.unstash_state(request)
-        return complete_social_login(request, login)
+
+        # Keep tracks of the last used CAS provider. It is written with the
+        # session created on login.
+        set_cas_login(request.session, self.provider.id, login.account.uid)
+
+        response = self.complete_login(request, login)
+
+        # The user is not saved yet if a signup form has to be filled.
+        if login.user.pk is not None:
+            if request.user.pk == login.user.pk:
+                index_session(request)
+            self.provider.sync_groups(login.user, data)
+            self.provider.sync_email_addresses(login.user, data)
+            # Replace the attributes cached by a previous login.
+            self.provider.get_attribute_cache().set(
+                login.account.uid,
+                self.provider.get_extra_data(login.account),
+                request=request,
+            )
+
+        audit(
+            AuditEvent.LOGIN, self.provider.id, request,
+            uid=login.account.uid, latency=self.validation_latency,
+        )
+
+        return response
+
+    def gateway_fallback(self, request):
+        """Returns the response to a gateway login, when the user has no SSO
+        session.
+
+        The user is redirected to the ``next`` url, or to ``/``, and the
+        result is remembered with :func:`set_gateway_cookie`.
+        """
+        request.session.pop('socialaccount_state', None)
+        response = HttpResponseRedirect(get_next_redirect_url(request) or '/')
+        set_gateway_cookie(response)
+        return response
+
+    def complete_login(self, request, login):
+        """Completes the login flow of allauth.
+
+        The first login of a user creates their account. Concurrent callbacks
+        for the same ``(provider_id, uid)`` (several tabs, retries…) are
+        serialized with a :class:`~allauth_cas.locks.CacheLock`: the first
+        request creates the account, while the others wait for it and then
+        log in the user with the created account. The account is looked up
+        by allauth once the lock is acquired.
+
+        When the request runs in a transaction (``ATOMIC_REQUESTS``), the lock
+        is released once it commits, so that waiting requests see the created
+        account. If it is rolled back, e.g. because of an error later in the
+        request, the lock is released when the request is finished.
+
+        It can be configured in
+        ``settings.SOCIALACCOUNT_PROVIDERS[<id>]``:
+
+        * ``'PROVISIONING_LOCK'``: Set to ``False`` to disable the lock;
+        * ``'PROVISIONING_LOCK_TIMEOUT'``: Lifetime of the lock, in seconds.
+          Default: ``30``;
+        * ``'PROVISIONING_LOCK_WAIT'``: Maximum time waited for the lock, in
+          seconds. Default: ``10``;
+        * ``'PROVISIONING_LOCK_CACHE'``: Alias of the cache used for the lock.
+          Default: ``'default'``.
+
+        Raises:
+            CASAuthenticationError: The lock could not be acquired in time.
+
+        """
+        settings = self.provider.get_settings()
+        if not settings.get('PROVISIONING_LOCK', True):
+            return complete_social_login(request, login)
+
+        lock = CacheLock(
+            'allauth_cas:provisioning:{}:{}'.format(
+                self.provider.id,
+                hashlib.sha1(login.account.uid.encode('utf-8')).hexdigest(),
+            ),
+            timeout=settings.get('PROVISIONING_LOCK_TIMEOUT', 30),
+            cache_alias=settings.get('PROVISIONING_LOCK_CACHE', 'default'),
+        )
+
+        if not lock.acquire(wait=settings.get('PROVISIONING_LOCK_WAIT', 10)):
+            raise CASAuthenticationError(
+                "The account is being created by another request."
+            )
+
+        try:
+            # If another request has created the account meanwhile, allauth
+            # finds it and logs in the user.
+            response = complete_social_login(request, login)
+        except Exception:
+            lock.release()
+            raise
+
+        connection = transaction.get_connection()
+        if (connection.in_atomic_block and
+                connection.settings_dict.get('ATOMIC_REQUESTS') and
+                hasattr(transaction, 'on_commit')):
+            transaction.on_commit(lock.release)
+            release_at_request_end(lock)
+        else:
+            lock.release()
+        return response
 
 
 class CASLogoutView(CASView):
+    query_budget_key = 'logout'
 
     def dispatch(self, request, next_page=None):
         """
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+from six.moves.urllib.parse import urljoin
+
+import logging
+import threading
+import time
+from importlib import import_module
+
+from allauth.socialaccount import providers
+
+from . import app_settings
+from .http import get_http_session
+from .providers import CASProvider
+
+logger = logging.getLogger(__name__)
+
+# Modules used to validate tickets, imported on first use otherwise.
+VALIDATION_MODULES = ['requests', 'cas', 'lxml.etree', 'xml.etree.ElementTree']
+
+
+class WarmupResult(object):
+    """Outcome of the warm-up of the connections to a CAS server.
+
+    Attributes:
+        provider_id (str)
+        url (str): Url of the CAS server.
+        connect_time (float): Duration of the warm-up, in seconds: DNS
+            resolution, connection and TLS handshake, and a first request.
+        error (str): Error raised by the warm-up, if any.
+
+    """
+
+    def __init__(self, provider_id, url):
+        self.provider_id = provider_id
+        self.url = url
+        self.connect_time = None
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __str__(self):
+        ret = "{} ({})".format(self.provider_id, self.url)
+        if self.error is not None:
+            return ret + ": failed, {}".format(self.error)
+        return ret + ": {:.1f} ms".format(self.connect_time * 1000)
+
+
+def import_validation_stack():
+    """Imports the modules used to validate tickets.
+
+    Returns:
+        float: Duration of the imports, in seconds.
+
+    """
+    start = time.time()
+    for name in VALIDATION_MODULES:
+        try:
+            import_module(name)
+        except ImportError:
+            pass
+    return time.time() - start
+
+
+def get_cas_callbacks(provider_ids=None):
+    """Returns the callback views of the CAS providers, by provider id.
+
+    The callback view of a provider is ``callback``, from the ``views``
+    module of the provider app.
+
+    Args:
+        provider_ids (`list` of `str`): Restricts to these providers. By
+            default, all the CAS providers with a callback view.
+
+    Raises:
+        KeyError: Unknown provider, or without callback view.
+
+    """
+    if provider_ids:
+        classes = [providers.registry.by_id(id).__class__
+                   for id in provider_ids]
+    else:
+        providers.registry.load()
+        classes = [cls for cls in providers.registry.provider_map.values()
+                   if issubclass(cls, CASProvider)]
+
+    callbacks = {}
+    for cls in classes:
+        try:
+            views = import_module(cls(None).get_package() + '.views')
+            callbacks[cls.id] = views.callback
+        except (ImportError, AttributeError):
+            if provider_ids:
+                raise KeyError(cls.id)
+    return callbacks
+
+
+def get_cas_adapters(provider_ids=None):
+    """Returns the adapters of the CAS providers, by provider id.
+
+    The adapter of a provider is the one of its callback view, see
+    :func:`get_cas_callbacks`.
+
+    Raises:
+        KeyError: Unknown provider, or without callback view.
+
+    """
+    return dict(
+        (provider_id, callback.adapter)
+        for provider_id, callback in get_cas_callbacks(provider_ids).items()
+    )
+
+
+def warm_up_adapter(adapter, connections=1, timeout=5):
+    """Opens ``connections`` connections to the CAS server of ``adapter``.
+
+    Connections are opened by concurrent ``HEAD`` requests to the login url,
+    and kept in the pool of the shared HTTP session used to validate tickets
+    (see :func:`~allauth_cas.http.get_http_session`).
+
+    Returns:
+        :class:`WarmupResult`
+
+    """
+    result = WarmupResult(adapter.provider_id, adapter.url)
+    session = get_http_session(adapter.url)
+    url = urljoin(adapter.url, 'login')
+    errors = []
+
+    def connect():
+        try:
+            session.head(url, timeout=timeout, allow_redirects=False).close()
+        except Exception as e:
+            errors.append(e)
+
+    start = time.time()
+    threads = [threading.Thread(target=connect) for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.connect_time = time.time() - start
+
+    if errors:
+        result.error = str(errors[0])
+    return result
+
+
+def warm_up(provider_ids=None, connections=1, timeout=5):
+    """Warms up the validation of tickets of the CAS providers.
+
+    The validation stack is imported, then connections to the CAS server of
+    each provider are opened.
+
+    Returns:
+        (float, `list` of :class:`WarmupResult`): The import duration, in
+        seconds, and the result for each provider.
+
+    """
+    import_time = import_validation_stack()
+    adapters = get_cas_adapters(provider_ids)
+    results = [
+        warm_up_adapter(adapter, connections=connections, timeout=timeout)
+        for _, adapter in sorted(adapters.items())
+    ]
+    return import_time, results
+
+
+def warm_up_on_ready():
+    """Runs :func:`warm_up` at startup, logging the results.
+
+    Errors are logged, never raised, so that the CAS server being down does
+    not prevent the site from starting.
+    """
+    try:
+        import_time, results = warm_up(
+            connections=app_settings.WARMUP_CONNECTIONS,
+            timeout=app_settings.WARMUP_TIMEOUT,
+        )
+    except Exception:
+        logger.exception("Unable to warm up the CAS providers.")
+        return
+
+    logger.info("CAS validation stack imported in %.1f ms.",
+                import_time * 1000)
+    for result in results:
+        if result.ok:
+            logger.info("CAS warm-up of %s", result)
+        else:
+            logger.warning("CAS warm-up of %s", result)
@@ -46,6 +46,7 @@ setup(
     install_requires=[
         'django-allauth',
         'python-cas',
+        'requests',
         'six',
     ],
     extras_require={
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+from allauth_cas.models import AbstractCASAuditEvent
+
+
+class CASAuditEvent(AbstractCASAuditEvent):
+    pass
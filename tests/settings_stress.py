@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+from .settings import *  # noqa
+
+# On disk, so that the concurrent writes of the stress tests wait for each
+# other instead of failing on table locks.
+DATABASES['default']['TEST'] = {'NAME': 'test_allauth_cas.sqlite3'}  # noqa
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+try:
+    from unittest.mock import Mock, patch
+except ImportError:
+    from mock import Mock, patch
+
+import time
+
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+
+from allauth_cas.attributes import AttributeCache
+from allauth_cas.registry import get_provider
+from allauth_cas.test.testcases import CASTestCase
+
+
+class AttributeCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.cache = AttributeCache('theid', cache_alias='default')
+        self.loader = Mock(return_value={'name': 'Alice'})
+
+    def test_get_loads_once(self):
+        self.assertEqual(self.cache.get('alice', loader=self.loader),
+                         {'name': 'Alice'})
+        self.assertEqual(self.cache.get('alice', loader=self.loader),
+                         {'name': 'Alice'})
+        self.loader.assert_called_once_with('alice')
+
+    def test_get_unknown(self):
+        self.loader.return_value = None
+        self.assertIsNone(self.cache.get('alice', loader=self.loader))
+        self.assertIsNone(self.cache.get('alice', loader=self.loader))
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_request_layer(self):
+        request = RequestFactory().get('/')
+        self.cache.get('alice', request=request, loader=self.loader)
+
+        with patch.object(self.cache, 'get_cached') as get_cached:
+            attributes = self.cache.get('alice', request=request)
+
+        self.assertFalse(get_cached.called)
+        self.assertEqual(attributes, {'name': 'Alice'})
+
+    def test_shared_layer(self):
+        """
+        Attributes loaded by a process are found by the others in the shared
+        cache.
+        """
+        other = AttributeCache('theid', cache_alias='default')
+        self.cache.get('alice', loader=self.loader)
+
+        self.assertEqual(other.get('alice'), {'name': 'Alice'})
+        self.assertEqual(len(other.local), 1)
+
+    def test_local_layer_expires(self):
+        local_only = AttributeCache('theid', local_timeout=30)
+        local_only.get('alice', loader=self.loader)
+
+        with patch('allauth_cas.attributes.time.time',
+                   return_value=time.time() + 60):
+            local_only.get('alice', loader=self.loader)
+
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_set_delete(self):
+        request = RequestFactory().get('/')
+        other = AttributeCache('theid', cache_alias='default')
+        self.cache.get('alice', request=request, loader=self.loader)
+
+        self.cache.set('alice', {'name': 'Alicia'}, request=request)
+        self.assertEqual(self.cache.get('alice', request=request),
+                         {'name': 'Alicia'})
+        self.assertEqual(other.get('alice'), {'name': 'Alicia'})
+
+        self.cache.delete('alice', request=request)
+        self.assertIsNone(self.cache.get('alice', request=request))
+
+    def test_keys_by_provider(self):
+        self.assertNotEqual(
+            self.cache.get_key('alice'),
+            AttributeCache('other').get_key('alice'),
+        )
+
+
+class ProviderAttributesTests(CASTestCase):
+
+    def setUp(self):
+        self.provider = get_provider('theid')
+        self.provider.get_attribute_cache().local.clear()
+
+    def test_get_attributes_unknown(self):
+        self.assertIsNone(self.provider.get_attributes('unknown'))
+
+    def test_login_caches_attributes(self):
+        r = self.client_cas_login(
+            self.client, username='alice', attributes={'name': 'Alice'})
+
+        request = RequestFactory().get('/')
+        request.session = r.wsgi_request.session
+        with self.assertNumQueries(0):
+            attributes = self.provider.get_request_attributes(request)
+
+        self.assertEqual(attributes, {'uid': 'alice', 'name': 'Alice'})
+
+    def test_login_replaces_attributes(self):
+        self.client_cas_login(
+            self.client, username='alice', attributes={'name': 'Alice'})
+        self.client_cas_login(
+            self.client, username='alice', attributes={'name': 'Alicia'})
+
+        self.assertEqual(self.provider.get_attributes('alice'),
+                         {'uid': 'alice', 'name': 'Alicia'})
+
+    def test_get_attributes_loads_extra_data(self):
+        self.client_cas_login(
+            self.client, username='alice', attributes={'name': 'Alice'})
+        self.provider.get_attribute_cache().local.clear()
+
+        with self.assertNumQueries(1):
+            attributes = self.provider.get_attributes('alice')
+
+        self.assertEqual(attributes, {'uid': 'alice', 'name': 'Alice'})
+
+    def test_get_request_attributes_other_provider(self):
+        request = RequestFactory().get('/')
+        request.session = {}
+        self.assertIsNone(self.provider.get_request_attributes(request))
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from django.test import TestCase, override_settings
+
+from allauth_cas.audit import (
+    AuditEvent, AuditLog, AuditSink, JSONLinesSink, ModelSink, get_audit_log,
+    shutdown_audit_log,
+)
+from allauth_cas.test.testcases import CASTestCase
+
+from .example.models import CASAuditEvent
+
+
+class MemorySink(AuditSink):
+
+    def __init__(self):
+        self.batches = []
+
+    def write(self, events):
+        self.batches.append(events)
+
+
+class AuditLogTests(TestCase):
+
+    def setUp(self):
+        self.sink = MemorySink()
+
+    def get_audit_log(self, **kwargs):
+        audit_log = AuditLog([self.sink], **kwargs)
+        self.addCleanup(audit_log.stop)
+        return audit_log
+
+    def test_flush_on_batch_size(self):
+        audit_log = self.get_audit_log(batch_size=2, flush_interval=60)
+
+        audit_log.emit(AuditEvent(AuditEvent.LOGIN, 'theid'))
+        audit_log.emit(AuditEvent(AuditEvent.LOGIN, 'theid'))
+
+        for _ in range(50):
+            if self.sink.batches:
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(self.sink.batches), 1)
+        self.assertEqual(len(self.sink.batches[0]), 2)
+
+    def test_flush_on_interval(self):
+        audit_log = self.get_audit_log(batch_size=100, flush_interval=0.05)
+
+        audit_log.emit(AuditEvent(AuditEvent.LOGIN, 'theid'))
+
+        for _ in range(50):
+            if self.sink.batches:
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(self.sink.batches), 1)
+
+    def test_bounded_buffer(self):
+        audit_log = self.get_audit_log(
+            batch_size=100, flush_interval=60, max_events=2)
+
+        for uid in ('a', 'b', 'c'):
+            audit_log.emit(AuditEvent(AuditEvent.LOGIN, 'theid', uid=uid))
+        audit_log.flush()
+
+        self.assertEqual(audit_log.dropped, 1)
+        self.assertEqual(
+            [event.uid for event in self.sink.batches[0]], ['b', 'c'])
+
+    def test_stop_drains(self):
+        audit_log = AuditLog([self.sink], flush_interval=60)
+        audit_log.emit(AuditEvent(AuditEvent.LOGOUT, 'theid'))
+
+        audit_log.stop()
+
+        self.assertEqual(len(self.sink.batches), 1)
+
+    def test_failing_sink(self):
+        class FailingSink(AuditSink):
+            def write(self, events):
+                raise IOError
+
+        audit_log = AuditLog([FailingSink(), self.sink], flush_interval=60)
+        audit_log.emit(AuditEvent(AuditEvent.LOGIN, 'theid'))
+        with patch('allauth_cas.audit.logger') as mock_logger:
+            audit_log.flush()
+        audit_log.stop()
+
+        self.assertEqual(len(self.sink.batches), 1)
+        self.assertTrue(mock_logger.exception.called)
+
+
+class AuditSinksTests(TestCase):
+
+    def setUp(self):
+        self.events = [
+            AuditEvent(
+                AuditEvent.LOGIN, 'theid', uid='alice', ip='127.0.0.1',
+                latency=0.5,
+            ),
+            AuditEvent(AuditEvent.FAILURE, 'theid', detail='Invalid.'),
+        ]
+
+    def test_model_sink(self):
+        sink = ModelSink('example.CASAuditEvent')
+
+        with self.assertNumQueries(1):
+            sink.write(self.events)
+
+        self.assertQuerysetEqual(
+            CASAuditEvent.objects.order_by('pk'),
+            [
+                ('login', 'theid', 'alice', '127.0.0.1', 0.5, ''),
+                ('failure', 'theid', '', None, None, 'Invalid.'),
+            ],
+            transform=lambda event: (
+                event.kind, event.provider, event.uid, event.ip,
+                event.latency, event.detail,
+            ),
+        )
+
+    def test_jsonlines_sink(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'audit.jsonl')
+
+        sink = JSONLinesSink(path)
+        sink.write(self.events)
+        sink.write(self.events[:1])
+
+        with open(path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(
+            [line['kind'] for line in lines], ['login', 'failure', 'login'])
+        self.assertEqual(lines[0]['uid'], 'alice')
+
+
+@override_settings(ALLAUTH_CAS_AUDIT_SINKS=[{
+    'BACKEND': 'tests.test_audit.MemorySink',
+}], ALLAUTH_CAS_AUDIT_FLUSH_INTERVAL=60)
+class AuditFlowsTests(CASTestCase):
+
+    def setUp(self):
+        shutdown_audit_log()
+
+    def get_events(self):
+        audit_log = get_audit_log()
+        audit_log.flush()
+        return [
+            event for batch in audit_log.sinks[0].batches for event in batch
+        ]
+
+    def test_login(self):
+        self.client_cas_login(self.client, username='alice')
+
+        events = self.get_events()
+
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0].kind, AuditEvent.LOGIN)
+        self.assertEqual(events[0].provider, 'theid')
+        self.assertEqual(events[0].uid, 'alice')
+        self.assertEqual(events[0].ip, '127.0.0.1')
+        self.assertIsNotNone(events[0].latency)
+
+    def test_failure(self):
+        self.client.get('/accounts/theid/login/')
+        self.patch_cas_response(valid_ticket=None)
+        self.client.get('/accounts/theid/login/callback/', {'ticket': '0'})
+
+        events = self.get_events()
+
+        self.assertEqual(
+            [(e.kind, e.detail) for e in events],
+            [(AuditEvent.FAILURE, "CAS server doesn't validate the ticket.")],
+        )
+
+    def test_logout(self):
+        self.client_cas_login(self.client, username='alice')
+        self.client.post('/accounts/logout/')
+
+        events = self.get_events()
+
+        self.assertEqual(
+            [(e.kind, e.uid) for e in events],
+            [(AuditEvent.LOGIN, 'alice'), (AuditEvent.LOGOUT, 'alice')],
+        )
+
+    @override_settings(ALLAUTH_CAS_AUDIT_SINKS=[])
+    def test_disabled(self):
+        self.client_cas_login(self.client)
+        self.assertIsNone(get_audit_log())
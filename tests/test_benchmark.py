@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from six import StringIO
+
+import os
+from collections import Counter
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from allauth_cas.benchmark import Benchmark, BenchmarkResult
+from allauth_cas.http import clear_http_sessions
+from allauth_cas.test.server import CASStandInServer
+
+from .example.views import callback
+
+
+@override_settings(ALLAUTH_CAS_HTTP_POOLING=True)
+class BenchmarkTests(TestCase):
+
+    def setUp(self):
+        clear_http_sessions()
+        self.addCleanup(clear_http_sessions)
+        self.server = CASStandInServer().start()
+        self.addCleanup(self.server.stop)
+
+    def get_ticket(self, service):
+        return self.server.issue_ticket()
+
+    def test_get_client(self):
+        """
+        The client is built as in the callback view.
+        """
+        benchmark = Benchmark(callback, self.get_ticket, url=self.server.url)
+
+        client = benchmark.get_client()
+
+        self.assertEqual(client.server_url, self.server.url)
+        self.assertEqual(client.service_url,
+                         'http://testserver/accounts/theid/login/callback/')
+
+    def test_get_client_host(self):
+        """
+        The host given to the benchmark is not checked against ALLOWED_HOSTS.
+        """
+        benchmark = Benchmark(callback, self.get_ticket, url=self.server.url,
+                              host='app.example.org')
+
+        client = benchmark.get_client()
+
+        self.assertEqual(
+            client.service_url,
+            'http://app.example.org/accounts/theid/login/callback/')
+
+    def test_run(self):
+        benchmark = Benchmark(
+            callback, self.get_ticket, url=self.server.url,
+            rounds=10, concurrency=2,
+        )
+
+        result = benchmark.run()
+
+        self.assertEqual(result.failed, 0)
+        self.assertEqual(result.rounds, 10)
+        self.assertEqual(len(result.latencies['validate']), 10)
+        self.assertEqual(result.requests, 10)
+        self.assertTrue(1 <= result.connections <= 10)
+        self.assertEqual(self.server.requests, 10)
+
+    def test_run_errors(self):
+        benchmark = Benchmark(
+            callback, lambda service: 'ST-invalid', url=self.server.url,
+            rounds=3, concurrency=2,
+        )
+
+        result = benchmark.run()
+
+        self.assertEqual(result.errors, Counter({
+            "ValueError: The ticket was not validated.": 3,
+        }))
+
+    def test_result_str(self):
+        result = BenchmarkResult()
+        result.rounds, result.duration = 4, 2
+        result.requests, result.connections = 4, 1
+        for latency in (0.01, 0.02, 0.03, 0.04):
+            result.add_latency('validate', latency)
+        result.add_error("IOError: down")
+
+        self.assertEqual(str(result), "\n".join([
+            "4 rounds in 2.00 s (2.0 rounds/s), 1 errors",
+            "validate: p50 30.0 ms, p95 40.0 ms, p99 40.0 ms, max 40.0 ms",
+            "HTTP: 4 requests, 1 connections opened (75% reused)",
+            "Error: 1 x IOError: down",
+        ]))
+
+
+@override_settings(ALLAUTH_CAS_HTTP_POOLING=True)
+class BenchmarkCommandTests(TestCase):
+
+    def setUp(self):
+        clear_http_sessions()
+        self.addCleanup(clear_http_sessions)
+
+    def test_standin(self):
+        out = StringIO()
+
+        call_command('cas_benchmark', 'theid', standin=True, rounds=5,
+                     stdout=out)
+
+        self.assertIn("5 rounds in ", out.getvalue())
+        self.assertIn("HTTP: 5 requests, ", out.getvalue())
+        self.assertIn("Done: 5 rounds.", out.getvalue())
+
+    @patch.dict(os.environ, {'CAS_BENCHMARK_PASSWORD': 'password'})
+    def test_failure(self):
+        """
+        Tickets are requested through the REST protocol, from an unreachable
+        server.
+        """
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, "2 of 2 rounds failed."):
+            call_command('cas_benchmark', 'theid', rounds=2,
+                         url='http://127.0.0.1:1/', username='user',
+                         stdout=out)
+        self.assertIn("Error: 2 x ConnectionError: ", out.getvalue())
+
+    def test_no_ticket_source(self):
+        with self.assertRaisesMessage(
+                CommandError, "Use --standin, or give a --username."):
+            call_command('cas_benchmark', 'theid', stdout=StringIO())
+
+    def test_unknown_provider(self):
+        with self.assertRaisesMessage(
+                CommandError, "Unknown CAS provider 'unknown'."):
+            call_command('cas_benchmark', 'unknown', stdout=StringIO())
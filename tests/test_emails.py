@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from allauth.account.models import EmailAddress
+
+from allauth_cas.emails import get_taken_emails
+from allauth_cas.test.testcases import CASTestCase
+
+from .example.provider import ExampleCASProvider
+
+User = get_user_model()
+
+EMAIL_ATTRIBUTES = [
+    {'attribute': 'mail', 'verified': True, 'primary': True},
+    'mailAlternateAddress',
+]
+
+
+class GetTakenEmailsTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user('bob', '', 'bob')
+        EmailAddress.objects.create(user=user, email='Bob@Mail.net')
+        EmailAddress.objects.create(user=user, email='bob.alias@mail.net')
+
+    def test_taken(self):
+        with self.assertNumQueries(1) as queries:
+            taken = get_taken_emails(
+                ['bob@mail.net', ' BOB.alias@mail.net', 'alice@mail.net'])
+
+        self.assertEqual(taken, {'bob@mail.net', 'bob.alias@mail.net'})
+        self.assertNotIn('LOWER(', queries.captured_queries[0]['sql'])
+
+    def test_empty(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(get_taken_emails([]), set())
+
+
+@override_settings(SOCIALACCOUNT_PROVIDERS={
+    'theid': {'EMAIL_ATTRIBUTES': EMAIL_ATTRIBUTES},
+})
+class ExtractEmailAddressesTests(TestCase):
+
+    def setUp(self):
+        self.provider = ExampleCASProvider(None)
+
+    def test_extract(self):
+        addresses = self.provider.extract_email_addresses(('alice', {
+            'mail': ' Alice@Mail.net',
+            'mailAlternateAddress': ['alias@mail.net', 'alice@mail.net'],
+        }))
+
+        self.assertEqual(
+            [(a.email, a.verified, a.primary) for a in addresses],
+            [
+                ('alice@mail.net', True, True),
+                ('alias@mail.net', False, False),
+            ],
+        )
+
+    def test_extract_missing_attributes(self):
+        self.assertEqual(
+            self.provider.extract_email_addresses(('alice', {})), [])
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS={})
+    def test_extract_default(self):
+        addresses = self.provider.extract_email_addresses(
+            ('alice', {'mail': 'alice@mail.net'}))
+        self.assertEqual(addresses, [])
+
+
+@override_settings(SOCIALACCOUNT_PROVIDERS={
+    'theid': {'EMAIL_ATTRIBUTES': EMAIL_ATTRIBUTES},
+})
+class SyncEmailAddressesTests(CASTestCase):
+
+    def setUp(self):
+        self.provider = ExampleCASProvider(None)
+        self.user = User.objects.create_user(
+            'alice', 'old@mail.net', 'alice')
+        EmailAddress.objects.create(
+            user=self.user, email='old@mail.net', primary=True)
+        EmailAddress.objects.create(user=self.user, email='alias@mail.net')
+
+    def get_addresses(self):
+        return set(
+            EmailAddress.objects.filter(user=self.user)
+            .values_list('email', 'verified', 'primary')
+        )
+
+    def sync(self, **attributes):
+        self.provider.sync_email_addresses(self.user, ('alice', attributes))
+
+    def test_sync(self):
+        self.sync(mail='alice@mail.net', mailAlternateAddress='alias@mail.net')
+
+        self.assertEqual(self.get_addresses(), {
+            ('alice@mail.net', True, True),
+            ('alias@mail.net', False, False),
+            ('old@mail.net', False, False),
+        })
+        self.assertEqual(
+            User.objects.get(pk=self.user.pk).email, 'alice@mail.net')
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS={
+        'theid': {
+            'EMAIL_ATTRIBUTES': EMAIL_ATTRIBUTES,
+            'EMAIL_SYNC_DELETE': True,
+        },
+    })
+    def test_sync_delete(self):
+        self.sync(mail='alice@mail.net')
+        self.assertEqual(self.get_addresses(), {
+            ('alice@mail.net', True, True),
+        })
+
+    def test_sync_verify_existing(self):
+        self.sync(mail='old@mail.net')
+        self.assertIn(('old@mail.net', True, True), self.get_addresses())
+
+    def test_sync_unchanged(self):
+        self.sync(mail='old@mail.net', mailAlternateAddress='alias@mail.net')
+
+        with self.assertNumQueries(1):
+            self.sync(
+                mail='old@mail.net', mailAlternateAddress='alias@mail.net')
+
+    def test_sync_taken_by_other_user(self):
+        other = User.objects.create_user('bob', '', 'bob')
+        EmailAddress.objects.create(user=other, email='bob@mail.net')
+
+        self.sync(mail='bob@mail.net')
+
+        self.assertFalse(EmailAddress.objects.filter(
+            user=self.user, email='bob@mail.net').exists())
+        self.assertIn(('old@mail.net', False, True), self.get_addresses())
+
+    def test_sync_taken_by_other_user_case(self):
+        """
+        Existing addresses of other users may not be normalized.
+        """
+        other = User.objects.create_user('bob', '', 'bob')
+        EmailAddress.objects.create(user=other, email='Bob@Mail.net')
+
+        self.sync(mail='bob@mail.net')
+
+        self.assertFalse(EmailAddress.objects.filter(
+            user=self.user, email__iexact='bob@mail.net').exists())
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS={})
+    def test_sync_disabled(self):
+        with self.assertNumQueries(0):
+            self.sync(mail='alice@mail.net')
+
+    def test_callback(self):
+        self.client_cas_login(self.client, username='bob', attributes={
+            'mail': 'bob@mail.net',
+            'mailAlternateAddress': ['bob.alias@mail.net'],
+        })
+
+        user = User.objects.get(username='bob')
+        self.assertEqual(user.email, 'bob@mail.net')
+        self.assertEqual(
+            set(
+                EmailAddress.objects.filter(user=user)
+                .values_list('email', 'verified', 'primary')
+            ),
+            {
+                ('bob@mail.net', True, True),
+                ('bob.alias@mail.net', False, False),
+            },
+        )
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from six import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from allauth.socialaccount.models import SocialAccount
+
+from allauth_cas.extra_data import (
+    compact_extra_data, compress_value, decode_extra_data,
+)
+from allauth_cas.provisioning import bulk_provision
+
+from .example.provider import ExampleCASProvider
+
+GROUPS = ['cn=group{},ou=groups,dc=example,dc=org'.format(i)
+          for i in range(100)]
+
+
+class CompactExtraDataTests(TestCase):
+
+    def setUp(self):
+        self.extra_data = {
+            'uid': 'alice',
+            'name': 'Alice',
+            'memberOf': GROUPS,
+            'secret': 'value',
+        }
+
+    def test_default(self):
+        self.assertEqual(
+            compact_extra_data(self.extra_data), self.extra_data)
+
+    def test_whitelist(self):
+        self.assertEqual(
+            compact_extra_data(self.extra_data, whitelist=['name']),
+            {'uid': 'alice', 'name': 'Alice'},
+        )
+
+    def test_blacklist(self):
+        self.assertNotIn(
+            'secret',
+            compact_extra_data(self.extra_data, blacklist=['secret']),
+        )
+
+    def test_compress(self):
+        compacted = compact_extra_data(
+            self.extra_data, compress_threshold=100)
+
+        self.assertEqual(compacted['memberOf'], compress_value(GROUPS))
+        self.assertEqual(compacted['name'], 'Alice')
+        self.assertEqual(decode_extra_data(compacted), self.extra_data)
+
+    @patch('allauth_cas.extra_data.logger')
+    def test_max_size(self, logger):
+        compacted = compact_extra_data(self.extra_data, max_size=100)
+
+        self.assertNotIn('memberOf', compacted)
+        self.assertTrue(logger.warning.called)
+        self.assertEqual(compacted['secret'], 'value')
+
+    def test_max_size_once_compressed(self):
+        compacted = compact_extra_data(
+            self.extra_data, compress_threshold=100, max_size=1000)
+        self.assertIn('memberOf', compacted)
+
+
+class CASProviderExtraDataTests(TestCase):
+
+    def setUp(self):
+        self.provider = ExampleCASProvider(None)
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS={
+        'theid': {
+            'EXTRA_DATA_BLACKLIST': ['secret'],
+            'EXTRA_DATA_COMPRESS_THRESHOLD': 100,
+        },
+    })
+    def test_extract_extra_data(self):
+        response = 'alice', {'memberOf': GROUPS, 'secret': 'value'}
+
+        extra_data = self.provider.extract_extra_data(response)
+        account = SocialAccount(extra_data=extra_data)
+
+        self.assertEqual(extra_data['memberOf'], compress_value(GROUPS))
+        self.assertEqual(self.provider.get_extra_data(account), {
+            'uid': 'alice',
+            'memberOf': GROUPS,
+        })
+
+    def test_compact_command(self):
+        list(bulk_provision(self.provider, [
+            ('alice', {'memberOf': GROUPS, 'secret': 'value'}),
+            ('bob', {'name': 'Bob'}),
+        ]))
+
+        with self.settings(SOCIALACCOUNT_PROVIDERS={
+            'theid': {
+                'EXTRA_DATA_BLACKLIST': ['secret'],
+                'EXTRA_DATA_COMPRESS_THRESHOLD': 100,
+            },
+        }):
+            out = StringIO()
+            call_command('cas_compact_extra_data', 'theid', stdout=out)
+
+        self.assertIn("Done: 2 checked, 1 updated.", out.getvalue())
+        alice = SocialAccount.objects.get(uid='alice')
+        self.assertEqual(alice.extra_data, {
+            'uid': 'alice',
+            'memberOf': compress_value(GROUPS),
+        })
+        self.assertEqual(
+            SocialAccount.objects.get(uid='bob').extra_data,
+            {'uid': 'bob', 'name': 'Bob'},
+        )
+
+        # Compacting twice is a no-op.
+        with self.settings(SOCIALACCOUNT_PROVIDERS={
+            'theid': {
+                'EXTRA_DATA_BLACKLIST': ['secret'],
+                'EXTRA_DATA_COMPRESS_THRESHOLD': 100,
+            },
+        }):
+            out = StringIO()
+            call_command('cas_compact_extra_data', 'theid', stdout=out)
+        self.assertIn("Done: 2 checked, 0 updated.", out.getvalue())
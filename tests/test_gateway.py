@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, TestCase, modify_settings, override_settings,
+)
+
+from allauth_cas.middleware import CASGatewayMiddleware, get_gateway_cache_key
+from allauth_cas.test.testcases import CASViewTestCase
+
+User = get_user_model()
+
+MIDDLEWARE_SETTING = (
+    'MIDDLEWARE' if django.VERSION >= (1, 10) else 'MIDDLEWARE_CLASSES')
+
+
+class GatewayViewsTests(CASViewTestCase):
+
+    def setUp(self):
+        super(GatewayViewsTests, self).setUp()
+        self.addCleanup(cache.clear)
+
+    def test_login(self):
+        """
+        A gateway login asks the CAS server not to prompt the user, and
+        remembers that it has been tried.
+        """
+        r = self.client.get('/accounts/theid/login/', {
+            'action': 'gateway', 'next': '/path/',
+        })
+
+        expected = (
+            'https://server.cas/login?service=http%3A%2F%2Ftestserver%2F'
+            'accounts%2Ftheid%2Flogin%2Fcallback%2F%3Fnext%3D%252Fpath%252F'
+            '%26gateway%3D1&gateway=true'
+        )
+        self.assertRedirects(r, expected, fetch_redirect_response=False)
+        self.assertIn('allauth_cas_gateway', r.cookies)
+        self.assertEqual(r.cookies['allauth_cas_gateway']['max-age'], 300)
+
+    @override_settings(ALLAUTH_CAS_GATEWAY_NEGATIVE_TTL=60)
+    def test_login_ttl(self):
+        r = self.client.get('/accounts/theid/login/', {'action': 'gateway'})
+        self.assertEqual(r.cookies['allauth_cas_gateway']['max-age'], 60)
+
+    def test_login_not_gateway(self):
+        r = self.client.get('/accounts/theid/login/')
+        self.assertNotIn('gateway', r['Location'])
+        self.assertNotIn('allauth_cas_gateway', r.cookies)
+
+    def test_callback_sso(self):
+        """
+        The user is logged in if they have an SSO session.
+        """
+        self.client.get('/accounts/theid/login/', {'action': 'gateway'})
+        self.patch_cas_response(valid_ticket='123456')
+
+        r = self.client.get('/accounts/theid/login/callback/', {
+            'ticket': '123456', 'next': '/path/', 'gateway': '1',
+        })
+
+        self.assertLoginSuccess(r, redirect_to='/path/')
+
+    def test_callback_no_sso(self):
+        """
+        Without SSO session, the user comes back to the requested page, as an
+        anonymous user.
+        """
+        self.client.get('/accounts/theid/login/', {'action': 'gateway'})
+
+        r = self.client.get('/accounts/theid/login/callback/', {
+            'next': '/path/', 'gateway': '1',
+        })
+
+        self.assertRedirects(r, '/path/', fetch_redirect_response=False)
+        self.assertIn('allauth_cas_gateway', r.cookies)
+        self.assertNotIn('socialaccount_state', self.client.session)
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_callback_no_sso_default_redirect(self):
+        r = self.client.get('/accounts/theid/login/callback/', {
+            'gateway': '1',
+        })
+        self.assertRedirects(r, '/', fetch_redirect_response=False)
+
+    def test_callback_cookie_kept(self):
+        """
+        The cache is not used for clients which keep cookies.
+        """
+        self.client.get('/accounts/theid/login/', {'action': 'gateway'})
+        r = self.client.get('/accounts/theid/login/callback/', {
+            'gateway': '1',
+        })
+        self.assertIsNone(cache.get(get_gateway_cache_key(r.wsgi_request)))
+
+    def test_callback_cookie_lost(self):
+        """
+        A client coming back without the cookie set by the login view is
+        remembered in the cache.
+        """
+        self.client.get('/accounts/theid/login/', {'action': 'gateway'})
+        self.client.cookies.clear()
+        r = self.client.get('/accounts/theid/login/callback/', {
+            'gateway': '1',
+        })
+        self.assertTrue(cache.get(get_gateway_cache_key(r.wsgi_request)))
+
+    @override_settings(ALLAUTH_CAS_GATEWAY_PROVIDER='theid')
+    @modify_settings(**{MIDDLEWARE_SETTING: {
+        'append': 'allauth_cas.middleware.CASGatewayMiddleware',
+    }})
+    def test_cookieless_client(self):
+        """
+        A client which doesn't keep cookies is not redirected endlessly to
+        the CAS server.
+        """
+        r = self.client.get('/path/')
+        self.assertEqual(r.status_code, 302)
+        r = self.client.get(r['Location'])
+        self.client.cookies.clear()
+        # The CAS server has no SSO session.
+        r = self.client.get('/accounts/theid/login/callback/', {
+            'next': '/path/', 'gateway': '1',
+        })
+        self.assertRedirects(r, '/path/', fetch_redirect_response=False)
+        self.client.cookies.clear()
+
+        r = self.client.get('/path/')
+        self.assertNotEqual(r.status_code, 302)
+
+    def test_callback_no_ticket_not_gateway(self):
+        """
+        A missing ticket is still a failure out of a gateway login.
+        """
+        self.client.get('/accounts/theid/login/')
+        r = self.client.get('/accounts/theid/login/callback/')
+        self.assertLoginFailure(r)
+
+    @override_settings(ALLAUTH_CAS_GATEWAY_PROVIDER='theid')
+    @modify_settings(**{MIDDLEWARE_SETTING: {
+        'append': 'allauth_cas.middleware.CASGatewayMiddleware',
+    }})
+    def test_logout(self):
+        """
+        A user logging out of the site only is not logged in again by the
+        next request.
+        """
+        self.client_cas_login(self.client)
+
+        r = self.client.post('/accounts/logout/')
+
+        self.assertIn('allauth_cas_gateway', r.cookies)
+        r = self.client.get('/path/')
+        self.assertNotIn('_auth_user_id', self.client.session)
+        self.assertNotEqual(r.status_code, 302)
+
+
+@override_settings(ALLAUTH_CAS_GATEWAY_PROVIDER='theid')
+class CASGatewayMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.addCleanup(cache.clear)
+
+    def get_middleware(self):
+        return CASGatewayMiddleware(lambda request: HttpResponse())
+
+    def process(self, path='/path/', method='get', user=None, cookies=None,
+                **kwargs):
+        request = getattr(self.factory, method)(path, **kwargs)
+        request.user = user or AnonymousUser()
+        request.COOKIES.update(cookies or {})
+        return self.get_middleware().process_request(request)
+
+    def test_redirect(self):
+        r = self.process('/path/?a=b')
+        self.assertEqual(
+            r['Location'],
+            '/accounts/theid/login/?action=gateway&next=%2Fpath%2F%3Fa%3Db',
+        )
+
+    def test_head(self):
+        self.assertIsNotNone(self.process(method='head'))
+
+    def test_post(self):
+        self.assertIsNone(self.process(method='post'))
+
+    def test_ajax(self):
+        self.assertIsNone(
+            self.process(HTTP_X_REQUESTED_WITH='XMLHttpRequest'))
+
+    def test_authenticated(self):
+        user = User(username='user')
+        self.assertIsNone(self.process(user=user))
+
+    def test_negative_cookie(self):
+        self.assertIsNone(self.process(cookies={'allauth_cas_gateway': '1'}))
+
+    def test_negative_cache(self):
+        request = self.factory.get('/path/', HTTP_USER_AGENT='bot')
+        cache.set(get_gateway_cache_key(request), True)
+        self.assertIsNone(self.process(HTTP_USER_AGENT='bot'))
+        self.assertIsNotNone(self.process(HTTP_USER_AGENT='browser'))
+        self.assertIsNotNone(self.process(
+            HTTP_USER_AGENT='bot', REMOTE_ADDR='10.0.0.1'))
+
+    def test_provider_paths(self):
+        for path in ['/accounts/theid/login/',
+                     '/accounts/theid/login/callback/',
+                     '/accounts/theid/logout/']:
+            self.assertIsNone(self.process(path), path)
+
+    def test_provider_paths_cached(self):
+        middleware = self.get_middleware()
+        request = self.factory.get('/path/')
+        request.user = AnonymousUser()
+
+        with patch('allauth_cas.middleware.reverse') as reverse:
+            reverse.return_value = '/accounts/theid/login/'
+            middleware.should_try(request)
+            middleware.should_try(request)
+
+        self.assertEqual(reverse.call_count, 3)
+
+    def test_logout_cookie(self):
+        request = self.factory.get('/path/')
+        response = self.get_middleware().process_response(
+            request, HttpResponse())
+        self.assertNotIn('allauth_cas_gateway', response.cookies)
+
+        request.cas_gateway_logout = True
+        response = self.get_middleware().process_response(
+            request, HttpResponse())
+        self.assertIn('allauth_cas_gateway', response.cookies)
+
+    @override_settings(ALLAUTH_CAS_GATEWAY_PATHS=[r'^/private/'])
+    def test_paths(self):
+        self.assertIsNone(self.process('/path/'))
+        self.assertIsNotNone(self.process('/private/page/'))
+
+    @override_settings(ALLAUTH_CAS_GATEWAY_EXEMPT_PATHS=[r'^/static/'])
+    def test_exempt_paths(self):
+        self.assertIsNone(self.process('/static/style.css'))
+        self.assertIsNotNone(self.process('/path/'))
+
+    @override_settings(ALLAUTH_CAS_GATEWAY_PROVIDER=None)
+    def test_provider_required(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.get_middleware()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+
+from allauth_cas.groups import GroupMapping, clear_group_pks, get_group_pks
+from allauth_cas.test.testcases import CASTestCase
+
+from .example.provider import ExampleCASProvider
+
+User = get_user_model()
+
+GROUP_MAPPING = [
+    {
+        'attribute': 'memberOf',
+        'match': r'^cn=staff,',
+        'group': 'Staff',
+    },
+    {
+        'attribute': 'memberOf',
+        'match': r'^cn=(?P<name>\w+),ou=projects,',
+        'group': r'project-\g<name>',
+    },
+]
+
+
+class GroupMappingTests(TestCase):
+
+    def setUp(self):
+        self.mapping = GroupMapping(GROUP_MAPPING)
+
+    def test_get_groups(self):
+        groups = self.mapping.get_groups({'memberOf': [
+            'cn=staff,ou=groups',
+            'cn=alpha,ou=projects,dc=org',
+            'cn=other,ou=groups',
+        ]})
+        self.assertEqual(groups, {'Staff', 'project-alpha'})
+
+    def test_get_groups_single_value(self):
+        groups = self.mapping.get_groups({'memberOf': 'cn=staff,ou=groups'})
+        self.assertEqual(groups, {'Staff'})
+
+    def test_get_groups_missing_attribute(self):
+        self.assertEqual(self.mapping.get_groups({}), set())
+
+    def test_is_managed(self):
+        self.assertTrue(self.mapping.is_managed('Staff'))
+        self.assertTrue(self.mapping.is_managed('project-beta'))
+        self.assertFalse(self.mapping.is_managed('Admins'))
+        self.assertFalse(self.mapping.is_managed('project-'))
+
+    def test_invalid_rule(self):
+        self.assertRaises(
+            ImproperlyConfigured,
+            GroupMapping, [{'attribute': 'memberOf', 'match': '('}],
+        )
+
+
+@override_settings(SOCIALACCOUNT_PROVIDERS={
+    'theid': {'GROUP_MAPPING': GROUP_MAPPING},
+})
+class SyncGroupsTests(CASTestCase):
+
+    def setUp(self):
+        clear_group_pks()
+        self.provider = ExampleCASProvider(None)
+        self.user = User.objects.create_user('alice', '', 'alice')
+
+    def get_groups(self):
+        return set(self.user.groups.values_list('name', flat=True))
+
+    def test_sync_groups(self):
+        admins = Group.objects.create(name='Admins')
+        self.user.groups.add(
+            admins, Group.objects.create(name='project-old'))
+
+        self.provider.sync_groups(self.user, ('alice', {'memberOf': [
+            'cn=staff,ou=groups', 'cn=new,ou=projects,',
+        ]}))
+
+        self.assertEqual(
+            self.get_groups(), {'Admins', 'Staff', 'project-new'})
+
+    def test_sync_groups_unchanged(self):
+        data = ('alice', {'memberOf': ['cn=staff,ou=groups']})
+        self.provider.sync_groups(self.user, data)
+
+        # Group lookup is cached, memberships are read and left untouched.
+        with self.assertNumQueries(1):
+            self.provider.sync_groups(self.user, data)
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS={
+        'theid': {'GROUP_MAPPING': GROUP_MAPPING, 'GROUP_CREATE': False},
+    })
+    def test_sync_groups_no_create(self):
+        self.provider.sync_groups(
+            self.user, ('alice', {'memberOf': ['cn=staff,ou=groups']}))
+
+        self.assertFalse(Group.objects.exists())
+        self.assertEqual(self.get_groups(), set())
+
+    def test_group_cache_cleared(self):
+        group = Group.objects.create(name='Staff')
+        self.assertEqual(get_group_pks(['Staff']), {'Staff': group.pk})
+        group.delete()
+        self.assertEqual(get_group_pks(['Staff'], create=False), {})
+
+    def test_stale_group_pk(self):
+        """
+        A group deleted and recreated by another process, whose pk is cached,
+        is looked up again.
+        """
+        data = ('alice', {'memberOf': ['cn=staff,ou=groups']})
+        get_group_pks(['Staff'])
+        with patch('allauth_cas.signals.clear_group_pks'):
+            Group.objects.filter(name='Staff').delete()
+            # May reuse the pk of the deleted group.
+            Group.objects.create(name='Other')
+            group = Group.objects.create(name='Staff')
+
+        self.provider.sync_groups(self.user, data)
+
+        self.assertEqual(list(self.user.groups.all()), [group])
+        self.assertEqual(get_group_pks(['Staff']), {'Staff': group.pk})
+
+    def test_callback(self):
+        self.client_cas_login(
+            self.client, username='bob',
+            attributes={'memberOf': 'cn=staff,ou=groups'},
+        )
+
+        user = User.objects.get(username='bob')
+        self.assertEqual(
+            set(user.groups.values_list('name', flat=True)), {'Staff'})
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from allauth_cas.locks import CacheLock
+
+
+class CacheLockTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_acquire_release(self):
+        lock = CacheLock('lock')
+        other = CacheLock('lock')
+
+        self.assertTrue(lock.acquire())
+        self.assertFalse(other.acquire())
+
+        lock.release()
+        self.assertTrue(other.acquire())
+
+    def test_release_not_owned(self):
+        lock = CacheLock('lock')
+        other = CacheLock('lock')
+        lock.acquire()
+
+        other.release()
+
+        self.assertFalse(other.acquire())
+
+    def test_acquire_wait(self):
+        lock = CacheLock('lock')
+        other = CacheLock('lock')
+        lock.acquire()
+
+        threading.Timer(0.1, lock.release).start()
+
+        start = time.time()
+        self.assertTrue(other.acquire(wait=5))
+        self.assertLess(time.time() - start, 5)
+
+    def test_acquire_wait_timeout(self):
+        CacheLock('lock').acquire()
+        self.assertFalse(CacheLock('lock').acquire(wait=0.1))
+
+    def test_expires(self):
+        CacheLock('lock', timeout=1).acquire()
+        time.sleep(1.1)
+        self.assertTrue(CacheLock('lock').acquire())
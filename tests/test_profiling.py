@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+from six import StringIO
+
+import cProfile
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from allauth_cas.profiling import ProfileStore, profile_request
+from allauth_cas.test.testcases import CASTestCase
+
+
+def work():
+    return sum(range(1000))
+
+
+class ProfilingTestMixin(object):
+
+    def setUp(self):
+        super(ProfilingTestMixin, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.store = ProfileStore(self.tmpdir, max_files=3)
+
+
+class ProfileStoreTests(ProfilingTestMixin, TestCase):
+
+    def save(self, view_name='theid.CASCallbackView', seq=0):
+        profiler = cProfile.Profile()
+        profiler.runcall(work)
+        return self.store.save(view_name, profiler, 0.1, seq=seq)
+
+    def test_save(self):
+        path = self.save()
+
+        self.assertTrue(os.path.isfile(path))
+        self.assertEqual(self.store.get_views(), ['theid.CASCallbackView'])
+        self.assertEqual(
+            self.store.get_profiles('theid.CASCallbackView'), [path])
+
+    def test_rotate(self):
+        paths = [self.save(seq=seq) for seq in range(5)]
+
+        self.assertEqual(
+            set(self.store.get_profiles('theid.CASCallbackView')),
+            set(paths[2:]),
+        )
+
+    def test_get_stats(self):
+        self.save(seq=1)
+        self.save(seq=2)
+
+        stats = self.store.get_stats('theid.CASCallbackView')
+
+        self.assertTrue(any(
+            func[2] == 'work' and stat[0] == 2
+            for func, stat in stats.stats.items()
+        ))
+
+    def test_get_stats_unknown_view(self):
+        self.assertIsNone(self.store.get_stats('theid.CASLoginView'))
+
+
+class ProfileRequestTests(ProfilingTestMixin, TestCase):
+
+    def test_disabled(self):
+        self.assertEqual(profile_request('view', work), work())
+        self.assertEqual(self.store.get_views(), [])
+
+    def test_sample_rate(self):
+        with self.settings(ALLAUTH_CAS_PROFILING_DIR=self.tmpdir,
+                           ALLAUTH_CAS_PROFILING_SAMPLE_RATE=2):
+            for _ in range(4):
+                self.assertEqual(profile_request('view', work), work())
+
+        self.assertEqual(len(self.store.get_profiles('view')), 2)
+
+    def test_latency_threshold(self):
+        with self.settings(ALLAUTH_CAS_PROFILING_DIR=self.tmpdir,
+                           ALLAUTH_CAS_PROFILING_SAMPLE_RATE=1,
+                           ALLAUTH_CAS_PROFILING_LATENCY_THRESHOLD=60):
+            profile_request('view', work)
+
+        self.assertEqual(self.store.get_profiles('view'), [])
+
+    def test_exception(self):
+        with self.settings(ALLAUTH_CAS_PROFILING_DIR=self.tmpdir,
+                           ALLAUTH_CAS_PROFILING_SAMPLE_RATE=1):
+            self.assertRaises(ZeroDivisionError, profile_request,
+                              'view', lambda: 1 / 0)
+
+        self.assertEqual(len(self.store.get_profiles('view')), 1)
+
+
+class ProfilingViewsTests(ProfilingTestMixin, CASTestCase):
+
+    def test_callback(self):
+        with self.settings(ALLAUTH_CAS_PROFILING_DIR=self.tmpdir,
+                           ALLAUTH_CAS_PROFILING_SAMPLE_RATE=1):
+            self.client_cas_login(self.client, username='alice')
+
+        self.assertEqual(
+            self.store.get_views(),
+            ['theid.CASCallbackView', 'theid.CASLoginView'],
+        )
+
+    def test_summary_command(self):
+        with self.settings(ALLAUTH_CAS_PROFILING_DIR=self.tmpdir,
+                           ALLAUTH_CAS_PROFILING_SAMPLE_RATE=1):
+            self.client_cas_login(self.client, username='alice')
+
+            out = StringIO()
+            call_command(
+                'cas_profile_summary', 'theid.CASCallbackView',
+                limit=5, stdout=out,
+            )
+
+        self.assertIn("theid.CASCallbackView: 1 profiles", out.getvalue())
+        self.assertIn("dispatch", out.getvalue())
+        self.assertNotIn("CASLoginView", out.getvalue())
+
+    @override_settings(ALLAUTH_CAS_PROFILING_DIR=None)
+    def test_summary_command_disabled(self):
+        self.assertRaises(
+            CommandError, call_command, 'cas_profile_summary')
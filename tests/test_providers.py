@@ -1,4 +1,9 @@
 # -*- coding: utf-8 -*-
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
 from six.moves.urllib.parse import urlencode
 
 from django.contrib import messages
@@ -6,10 +11,14 @@ from django.contrib.messages.api import get_messages
 from django.contrib.messages.middleware import MessageMiddleware
 from django.contrib.messages.storage.base import Message
 from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
 from django.test import RequestFactory, TestCase, override_settings
+from django.utils.safestring import SafeText
 
 from allauth.socialaccount.providers import registry
 
+from allauth_cas.exceptions import CASAuthParamsError
 from allauth_cas.views import AuthAction
 
 from .example.provider import ExampleCASProvider
@@ -111,6 +120,80 @@ class CASProviderTests(TestCase):
             'next': 'two=whoam%C3%AF&qu%C3%A9ry=string',
         })
 
+    def _get_auth_params(self, query):
+        request = RequestFactory().get('/test/', {'auth_params': query})
+        return self.provider.get_auth_params(
+            request, AuthAction.AUTHENTICATE)
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS={
+        'theid': {
+            'AUTH_PARAMS': {'key': 'value'},
+            'AUTH_PARAMS_ALLOWED': ['lang', 'key'],
+        },
+    })
+    def test_get_auth_params_allowed(self):
+        self.assertDictEqual(self._get_auth_params('lang=fr&key=other'), {
+            'key': 'other',
+            'lang': 'fr',
+        })
+        with self.assertRaisesMessage(
+                CASAuthParamsError, "auth_params not allowed: a, b."):
+            self._get_auth_params('lang=fr&b=1&a=2')
+
+    def test_get_auth_params_reserved(self):
+        """
+        Dynamic auth_params can't override the parameters of the CAS
+        protocol, even without an allowlist.
+        """
+        for key in ('service', 'ticket', 'renew', 'gateway'):
+            with self.assertRaisesMessage(
+                    CASAuthParamsError,
+                    "auth_params not allowed: {}.".format(key)):
+                self._get_auth_params('{}=1'.format(key))
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS={
+        'theid': {'AUTH_PARAMS_ALLOWED': ['lang', 'renew']},
+    })
+    def test_get_auth_params_reserved_allowed(self):
+        with self.assertRaisesMessage(
+                CASAuthParamsError, "auth_params not allowed: renew."):
+            self._get_auth_params('lang=fr&renew=true')
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS={
+        'theid': {'AUTH_PARAMS_MAX_LENGTH': 10},
+    })
+    def test_get_auth_params_max_length(self):
+        self.assertDictEqual(self._get_auth_params('lang=fr'), {'lang': 'fr'})
+        with self.assertRaisesMessage(
+                CASAuthParamsError,
+                "auth_params of 11 characters, over the limit of 10."):
+            self._get_auth_params('lang=fr&a=1')
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS={
+        'theid': {'AUTH_PARAMS': {'key': 'value'}},
+    })
+    def test_get_auth_params_cached(self):
+        self._get_auth_params('lang=fr')
+        with patch('allauth_cas.providers.parse_qsl') as parse_qsl:
+            auth_params = self._get_auth_params('lang=fr')
+        self.assertFalse(parse_qsl.called)
+        self.assertDictEqual(auth_params, {'key': 'value', 'lang': 'fr'})
+
+        # A copy is returned.
+        auth_params['gateway'] = 'true'
+        self.assertDictEqual(self._get_auth_params('lang=fr'),
+                             {'key': 'value', 'lang': 'fr'})
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS={
+        'theid': {'AUTH_PARAMS_CACHE_SIZE': 0},
+    })
+    def test_get_auth_params_no_cache(self):
+        self._get_auth_params('lang=fr')
+        with patch('allauth_cas.providers.parse_qsl',
+                   return_value=[('lang', 'fr')]) as parse_qsl:
+            self._get_auth_params('lang=fr')
+        self.assertTrue(parse_qsl.called)
+
     def test_add_message_suggest_caslogout(self):
         expected_msg_base_str = (
             "To logout of The Provider, please close your browser, or visit "
@@ -140,6 +223,86 @@ class CASProviderTests(TestCase):
         )
         self.assertIn(expected_msg2, get_messages(req2))
 
+    def test_render_message_suggest_caslogout_cached(self):
+        first = self.provider.render_message_suggest_caslogout(
+            self.request, '/next/')
+
+        with patch.object(self.provider, 'get_logout_url') as get_url:
+            second = self.provider.render_message_suggest_caslogout(
+                self._get_request(), '/next/')
+            self.assertFalse(get_url.called)
+            self.provider.render_message_suggest_caslogout(
+                self.request, '/other/')
+            self.assertTrue(get_url.called)
+
+        self.assertIs(first, second)
+        self.assertIsInstance(first, SafeText)
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS={
+        'theid': {'MESSAGE_SUGGEST_CASLOGOUT_CACHE_SIZE': 0},
+    })
+    def test_render_message_suggest_caslogout_not_cached(self):
+        self.provider.render_message_suggest_caslogout(self.request, '/next/')
+        with patch.object(self.provider, 'get_logout_url') as get_url:
+            self.provider.render_message_suggest_caslogout(
+                self.request, '/next/')
+        self.assertTrue(get_url.called)
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS={
+        'theid': {'MESSAGE_SUGGEST_CASLOGOUT_DEFER': True},
+    })
+    def test_add_message_suggest_caslogout_deferred(self):
+        render = patch.object(
+            self.provider, 'render_message_suggest_caslogout',
+            wraps=self.provider.render_message_suggest_caslogout,
+        )
+
+        with render as m:
+            self.provider.add_message_suggest_caslogout(
+                self.request, next_page='/next/')
+            self.assertFalse(m.called)
+
+            message = str(list(get_messages(self.request))[0])
+            self.assertTrue(m.called)
+
+        self.assertIn("/accounts/theid/logout/?next=%2Fnext%2F", message)
+
+    @override_settings(
+        SOCIALACCOUNT_PROVIDERS={
+            'theid': {'MESSAGE_SUGGEST_CASLOGOUT_DEFER': True},
+        },
+        MESSAGE_STORAGE='django.contrib.messages.storage.cookie.'
+                        'CookieStorage',
+    )
+    def test_add_message_suggest_caslogout_deferred_stored(self):
+        request = self._get_request()
+        self.provider.add_message_suggest_caslogout(
+            request, next_page='/next/')
+        response = HttpResponse()
+        MessageMiddleware().process_response(request, response)
+
+        # The message is rendered when stored, and stays safe.
+        request = RequestFactory().get('/')
+        request.COOKIES = dict(
+            (key, morsel.value) for key, morsel in response.cookies.items())
+        MessageMiddleware().process_request(request)
+        message = list(get_messages(request))[0]
+        self.assertIsInstance(message.message, SafeText)
+        self.assertIn('<a href=', message.message)
+
+    @override_settings(
+        SOCIALACCOUNT_PROVIDERS={
+            'theid': {'MESSAGE_SUGGEST_CASLOGOUT_DEFER': True},
+        },
+        MESSAGE_LEVEL=messages.WARNING,
+    )
+    def test_add_message_suggest_caslogout_deferred_filtered(self):
+        with patch.object(
+                self.provider, 'render_message_suggest_caslogout') as m:
+            self.provider.add_message_suggest_caslogout(self.request)
+            list(get_messages(self.request))
+        self.assertFalse(m.called)
+
     def test_message_suggest_caslogout_on_logout(self):
         self.assertFalse(
             self.provider.message_suggest_caslogout_on_logout(self.request))
@@ -168,6 +331,21 @@ class CASProviderTests(TestCase):
         uid = self.provider.extract_uid(response)
         self.assertEqual('useRName', uid)
 
+    @override_settings(SOCIALACCOUNT_PROVIDERS={
+        'theid': {'UID_NORMALIZATION': ['strip', 'lower']},
+    })
+    def test_extract_uid_normalized(self):
+        response = ' useRName\n', {}
+        uid = self.provider.extract_uid(response)
+        self.assertEqual('username', uid)
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS={
+        'theid': {'UID_NORMALIZATION': ['unknown']},
+    })
+    def test_normalize_uid_unknown_step(self):
+        self.assertRaises(
+            ImproperlyConfigured, self.provider.normalize_uid, 'useRName')
+
     def test_extract_common_fields(self):
         response = 'useRName', {}
         common_fields = self.provider.extract_common_fields(response)
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+from six import StringIO
+
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from allauth.account.models import EmailAddress
+from allauth.socialaccount.models import SocialAccount
+
+from allauth_cas.provisioning import (
+    SortedUids, bulk_deprovision, bulk_normalize_uids, bulk_provision,
+    check_sorted_uids,
+)
+
+from .example.provider import ExampleCASProvider
+
+User = get_user_model()
+
+
+class BulkProvisionTests(TestCase):
+
+    def setUp(self):
+        self.provider = ExampleCASProvider(None)
+
+    def provision(self, rows, batch_size=2):
+        return list(bulk_provision(self.provider, rows, batch_size))[-1]
+
+    def test_provision(self):
+        result = self.provision([
+            ('alice', {'email': 'alice@mail.net', 'first_name': 'Alice'}),
+            ('bob', {}),
+            ('carol', {'username': 'caro'}),
+        ])
+
+        self.assertEqual(str(result), "3 processed, 3 created, 0 skipped")
+
+        account = SocialAccount.objects.get(provider='theid', uid='alice')
+        self.assertEqual(account.user.username, 'alice')
+        self.assertEqual(account.user.first_name, 'Alice')
+        self.assertEqual(account.extra_data, {
+            'email': 'alice@mail.net', 'first_name': 'Alice', 'uid': 'alice',
+        })
+        self.assertTrue(EmailAddress.objects.filter(
+            user=account.user, email='alice@mail.net', primary=True,
+        ).exists())
+
+        account = SocialAccount.objects.get(provider='theid', uid='carol')
+        self.assertEqual(account.user.username, 'caro')
+
+    def test_idempotent(self):
+        rows = [('alice', {}), ('bob', {}), ('alice', {})]
+
+        self.provision(rows)
+        result = self.provision(rows)
+
+        self.assertEqual(result.created, 0)
+        self.assertEqual(result.skipped, 3)
+        self.assertEqual(User.objects.count(), 2)
+
+    def test_username_taken(self):
+        User.objects.create_user('alice', '', 'alice')
+
+        self.provision([('alice', {})])
+
+        account = SocialAccount.objects.get(provider='theid', uid='alice')
+        self.assertNotEqual(account.user.username, 'alice')
+
+    def test_username_taken_in_chunk(self):
+        """
+        Users whose username is taken may be given the same new username,
+        as populate_username only checks the database.
+        """
+        User.objects.create_user('alice', '', 'alice')
+        User.objects.create_user('bob', '', 'bob')
+
+        result = self.provision([('alice', {}), ('bob', {})])
+
+        self.assertEqual(result.created, 2)
+        usernames = set(
+            SocialAccount.objects.filter(provider='theid')
+            .values_list('user__username', flat=True))
+        self.assertEqual(len(usernames), 2)
+        self.assertFalse(usernames & {'alice', 'bob'})
+
+    def test_email_taken(self):
+        user = User.objects.create_user('other', '', 'other')
+        EmailAddress.objects.create(user=user, email='alice@mail.net')
+
+        self.provision([('alice', {'email': 'alice@mail.net'})])
+
+        self.assertEqual(
+            EmailAddress.objects.filter(email='alice@mail.net').count(), 1)
+
+    def test_email_taken_case(self):
+        """
+        Existing addresses of other users may not be normalized.
+        """
+        user = User.objects.create_user('other', '', 'other')
+        EmailAddress.objects.create(user=user, email='Alice@Mail.net')
+
+        self.provision([('alice', {'email': 'alice@mail.net'})])
+
+        self.assertEqual(EmailAddress.objects.filter(
+            email__iexact='alice@mail.net').count(), 1)
+
+    def test_constant_queries_per_chunk(self):
+        rows = [('user{}'.format(i), {}) for i in range(10)]
+        with self.assertNumQueries(7):
+            self.provision(rows, batch_size=10)
+
+
+class BulkDeprovisionTests(TestCase):
+
+    def setUp(self):
+        self.provider = ExampleCASProvider(None)
+        rows = [('user{}'.format(i), {}) for i in range(5)]
+        list(bulk_provision(self.provider, rows))
+
+    def deprovision(self, uids, **kwargs):
+        kwargs.setdefault('batch_size', 2)
+        return list(bulk_deprovision(self.provider, uids, **kwargs))
+
+    def test_deprovision(self):
+        runs = self.deprovision(['user0', 'user2', 'user4', 'unknown'])
+
+        result = runs[-1][0]
+        self.assertEqual(
+            str(result), "5 checked, 2 missing upstream, 2 deactivated")
+        self.assertEqual(
+            sum((missing for _, missing in runs), []), ['user1', 'user3'])
+        self.assertQuerysetEqual(
+            User.objects.filter(is_active=False).order_by('username'),
+            ['user1', 'user3'], transform=lambda user: user.username,
+        )
+
+    def test_dry_run(self):
+        runs = self.deprovision(['user0'], dry_run=True)
+
+        self.assertEqual(runs[-1][0].missing, 4)
+        self.assertEqual(runs[-1][0].deactivated, 0)
+        self.assertFalse(User.objects.filter(is_active=False).exists())
+
+    def test_already_inactive(self):
+        User.objects.filter(username='user1').update(is_active=False)
+        runs = self.deprovision(['user0'])
+        self.assertEqual(runs[-1][0].deactivated, 3)
+
+    def test_empty_uids(self):
+        self.assertRaises(ValueError, self.deprovision, [])
+        self.assertRaises(ValueError, self.deprovision, [], presorted=True)
+
+    def test_presorted(self):
+        """
+        A sorted uids list is merged with the accounts, read in the order of
+        their uid.
+        """
+        uids = iter(['unknown0', 'user0', 'user2', 'user2', 'user4'])
+        runs = self.deprovision(uids, presorted=True)
+
+        self.assertEqual(
+            str(runs[-1][0]), "5 checked, 2 missing upstream, 2 deactivated")
+        self.assertEqual(
+            sum((missing for _, missing in runs), []), ['user1', 'user3'])
+        self.assertEqual(len(runs), 3)
+
+    def test_presorted_unsorted(self):
+        """
+        The rest of the list is checked before the last chunk deactivates
+        users.
+        """
+        with self.assertRaisesMessage(
+                ValueError, "The uids list is not sorted: 'user0' comes "
+                            "after 'user2'."):
+            self.deprovision(['user2', 'user0'], presorted=True,
+                             batch_size=10)
+        self.assertFalse(User.objects.filter(is_active=False).exists())
+
+    def test_check_sorted_uids(self):
+        check_sorted_uids(self.provider, ['a', 'b', 'b'])
+        with self.assertRaises(ValueError):
+            check_sorted_uids(self.provider, ['b', 'a'])
+
+    def test_presorted_accounts_order(self):
+        """
+        Fails if the database sorts the uids in another order.
+        """
+        upstream = SortedUids(['a', 'b'])
+        self.assertIn('b', upstream)
+        with self.assertRaisesMessage(
+                ValueError, "The social accounts are not read in the order"):
+            'a' in upstream
+
+
+@override_settings(SOCIALACCOUNT_PROVIDERS={
+    'theid': {'UID_NORMALIZATION': ['strip', 'lower']},
+})
+class BulkNormalizeUidsTests(TestCase):
+
+    def setUp(self):
+        self.provider = ExampleCASProvider(None)
+        with self.settings(SOCIALACCOUNT_PROVIDERS={}):
+            list(bulk_provision(self.provider, [
+                ('Alice', {}), (' bob', {}), ('carol', {}),
+                ('Dave', {}), ('dave', {}),
+            ]))
+
+    def normalize(self, **kwargs):
+        kwargs.setdefault('batch_size', 2)
+        return list(bulk_normalize_uids(self.provider, **kwargs))
+
+    def get_uids(self):
+        return sorted(
+            SocialAccount.objects.values_list('uid', flat=True))
+
+    def test_normalize(self):
+        runs = self.normalize()
+
+        self.assertEqual(
+            str(runs[-1][0]), "5 checked, 2 updated, 1 conflicts")
+        self.assertEqual(
+            sum((conflicts for _, conflicts in runs), []),
+            [('Dave', 'dave')],
+        )
+        self.assertEqual(
+            self.get_uids(), ['Dave', 'alice', 'bob', 'carol', 'dave'])
+
+    def test_dry_run(self):
+        runs = self.normalize(dry_run=True)
+
+        self.assertEqual(runs[-1][0].updated, 2)
+        self.assertEqual(
+            self.get_uids(), [' bob', 'Alice', 'Dave', 'carol', 'dave'])
+
+    def test_lookup_after_normalization(self):
+        self.normalize()
+        account = SocialAccount.objects.get(provider='theid', uid='alice')
+
+        login = self.provider.sociallogin_from_response(
+            None, ('  ALICE', {}))
+        login.lookup()
+
+        self.assertEqual(login.account, account)
+
+
+class ProvisioningCommandsTests(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_csv(self):
+        path = self.write(
+            'export.csv',
+            'uid,first_name,memberOf\n'
+            'alice,Alice,staff|admin\n'
+            'bob,,\n',
+        )
+
+        out = StringIO()
+        call_command(
+            'cas_provision', 'theid', path, separator='|', stdout=out)
+
+        self.assertIn("Done: 2 processed, 2 created, 0 skipped.",
+                      out.getvalue())
+        account = SocialAccount.objects.get(provider='theid', uid='alice')
+        self.assertEqual(account.extra_data['memberOf'], ['staff', 'admin'])
+        self.assertTrue(
+            SocialAccount.objects.filter(provider='theid', uid='bob').exists())
+
+    def test_jsonl(self):
+        path = self.write('export.jsonl', '\n'.join([
+            json.dumps({'uid': 'alice', 'attributes': {'name': 'Alice'}}),
+            json.dumps({'uid': 'bob'}),
+        ]))
+
+        call_command('cas_provision', 'theid', path, stdout=StringIO())
+
+        self.assertEqual(
+            SocialAccount.objects.filter(provider='theid').count(), 2)
+
+    def test_deprovision(self):
+        list(bulk_provision(ExampleCASProvider(None), [
+            ('alice', {}), ('bob', {}),
+        ]))
+        path = self.write('uids.txt', 'alice\n\n')
+
+        out = StringIO()
+        call_command(
+            'cas_deprovision', 'theid', path, verbosity=2, stdout=out)
+
+        self.assertIn("Missing upstream: bob", out.getvalue())
+        self.assertIn(
+            "Done: 2 checked, 1 missing upstream, 1 deactivated.",
+            out.getvalue(),
+        )
+        self.assertFalse(User.objects.get(username='bob').is_active)
+
+    def test_deprovision_sorted(self):
+        list(bulk_provision(ExampleCASProvider(None), [
+            ('alice', {}), ('bob', {}), ('carol', {}),
+        ]))
+        path = self.write('uids.txt', 'alice\ncarol\n')
+
+        out = StringIO()
+        call_command('cas_deprovision', 'theid', path, presorted=True,
+                     stdout=out)
+
+        self.assertIn(
+            "Done: 3 checked, 1 missing upstream, 1 deactivated.",
+            out.getvalue(),
+        )
+
+        User.objects.update(is_active=True)
+        path = self.write('unsorted.txt', 'carol\nalice\n')
+        with self.assertRaisesMessage(
+                CommandError, "The uids list is not sorted"):
+            call_command('cas_deprovision', 'theid', path, presorted=True,
+                         stdout=StringIO())
+        self.assertFalse(User.objects.filter(is_active=False).exists())
+
+        with self.assertRaisesMessage(CommandError, "--sorted requires"):
+            call_command('cas_deprovision', 'theid', '-', presorted=True,
+                         stdout=StringIO())
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS={
+        'theid': {'UID_NORMALIZATION': ['lower']},
+    })
+    def test_normalize_uids(self):
+        with self.settings(SOCIALACCOUNT_PROVIDERS={}):
+            list(bulk_provision(ExampleCASProvider(None), [
+                ('Alice', {}), ('alice', {}), ('Bob', {}),
+            ]))
+
+        out, err = StringIO(), StringIO()
+        call_command('cas_normalize_uids', 'theid', stdout=out, stderr=err)
+
+        self.assertIn(
+            "Conflict: 'Alice' can't be renamed to 'alice', already used.",
+            err.getvalue(),
+        )
+        self.assertIn(
+            "Done: 3 checked, 1 updated, 1 conflicts.", out.getvalue())
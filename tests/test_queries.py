@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+
+from allauth_cas.exceptions import QueryBudgetExceeded
+from allauth_cas.queries import (
+    QueryBreakdown, QueryCapture, normalize_sql, query_budget,
+)
+from allauth_cas.test.testcases import CASViewTestCase
+
+User = get_user_model()
+
+
+def providers_settings(**budgets):
+    return {'theid': {'QUERY_BUDGETS': budgets}}
+
+
+class NormalizeSQLTests(TestCase):
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql(
+                "SELECT * FROM t WHERE a = 'it''s' AND b = 12 AND "
+                "c IN (1, 2, 3) AND t2.x = 1.5"
+            ),
+            "SELECT * FROM t WHERE a = ? AND b = ? AND c IN (...) AND "
+            "t2.x = ?",
+        )
+
+    def test_savepoint(self):
+        self.assertEqual(normalize_sql('SAVEPOINT "s1402_x3"'),
+                         'SAVEPOINT ?')
+        self.assertEqual(normalize_sql('RELEASE SAVEPOINT "s1402_x4"'),
+                         'RELEASE SAVEPOINT ?')
+
+
+class QueryBreakdownTests(TestCase):
+
+    def test_str(self):
+        breakdown = QueryBreakdown([
+            {'sql': "SELECT * FROM t WHERE id = 1"},
+            {'sql': "UPDATE t SET a = 'b'"},
+            {'sql': "SELECT * FROM t WHERE id = 2"},
+        ])
+
+        self.assertEqual(len(breakdown), 3)
+        self.assertEqual(str(breakdown), "\n".join([
+            "   2 x SELECT * FROM t WHERE id = ?",
+            "   1 x UPDATE t SET a = ?",
+        ]))
+
+
+class QueryBudgetTests(TestCase):
+
+    def test_capture(self):
+        with QueryCapture() as capture:
+            User.objects.count()
+            User.objects.exists()
+        self.assertEqual(len(capture), 2)
+
+    @patch('allauth_cas.queries.logger')
+    def test_within_budget(self, logger):
+        with query_budget(1, 'block'):
+            User.objects.count()
+        self.assertFalse(logger.warning.called)
+
+    @patch('allauth_cas.queries.logger')
+    def test_exceeded(self, logger):
+        with query_budget(1, 'block'):
+            User.objects.count()
+            User.objects.count()
+
+        message = logger.warning.call_args[0][0]
+        self.assertTrue(message.startswith(
+            "block executed 2 queries, over its budget of 1:\n"))
+        self.assertIn('   2 x SELECT COUNT(*)', message)
+
+    @override_settings(ALLAUTH_CAS_QUERY_BUDGET_RAISE=True)
+    def test_exceeded_raise(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(0, 'block'):
+                User.objects.count()
+
+    def test_no_budget(self):
+        with query_budget(None, 'block') as capture:
+            User.objects.count()
+        self.assertIsNone(capture)
+
+
+@override_settings(ALLAUTH_CAS_QUERY_BUDGET_RAISE=True)
+class ViewsQueryBudgetTests(CASViewTestCase):
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS=providers_settings(
+        callback=1))
+    def test_callback_exceeded(self):
+        with self.assertRaisesMessage(
+                QueryBudgetExceeded, "theid.CASCallbackView executed "):
+            self.client_cas_login(self.client, username='user')
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS=providers_settings(
+        login=0, callback=100))
+    def test_within_budgets(self):
+        r = self.client_cas_login(self.client, username='user')
+        self.assertLoginSuccess(r)
+
+
+class AssertCASLoginQueriesTests(CASViewTestCase):
+
+    def count_login_queries(self, username):
+        client = Client()
+        client.get('/accounts/theid/login/')
+        self.patch_cas_response(valid_ticket='__all__', username=username)
+        try:
+            with QueryCapture() as capture:
+                client.get('/accounts/theid/login/callback/', {
+                    'ticket': 'fake-ticket',
+                })
+        finally:
+            self.patch_cas_response_stop()
+        return len(capture)
+
+    def test_pass(self):
+        num = self.count_login_queries('first')
+
+        r = self.assertCASLoginQueries(num, username='second')
+
+        self.assertLoginSuccess(r)
+
+    def test_fail(self):
+        with self.assertRaises(AssertionError) as cm:
+            self.assertCASLoginQueries(1000, username='user')
+
+        message = str(cm.exception)
+        self.assertIn("queries executed by the CAS login, 1000 expected:\n",
+                      message)
+        self.assertIn('INSERT INTO "socialaccount_socialaccount"', message)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from six import StringIO
+
+from datetime import timedelta
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import override_settings
+from django.utils import timezone
+
+from allauth.socialaccount.models import SocialAccount
+
+from allauth_cas.refresh import get_active_uids, refresh_attributes
+from allauth_cas.registry import get_provider
+from allauth_cas.test.testcases import CASTestCase
+
+UPSTREAM = {}
+
+
+def fetch_attributes(provider, uids):
+    if 'broken' in uids:
+        raise IOError("Attribute service unavailable.")
+    return dict((uid, UPSTREAM[uid]) for uid in uids if uid in UPSTREAM)
+
+
+@override_settings(SOCIALACCOUNT_PROVIDERS={
+    'theid': {'ATTRIBUTES_FETCHER': 'tests.test_refresh.fetch_attributes'},
+})
+class RefreshAttributesTests(CASTestCase):
+
+    def setUp(self):
+        self.provider = get_provider('theid')
+        self.client_cas_login(
+            self.client, username='alice', attributes={'name': 'Alice'})
+        self.client_cas_login(
+            self.client, username='bob', attributes={'name': 'Bob'})
+        UPSTREAM.clear()
+        UPSTREAM.update({
+            'alice': {'name': 'Alicia'},
+            'bob': {'name': 'Bob'},
+        })
+        self.addCleanup(UPSTREAM.clear)
+
+    def refresh(self, uids, **kwargs):
+        result = None
+        for result in refresh_attributes(self.provider, uids, **kwargs):
+            pass
+        return result
+
+    def get_extra_data(self, uid):
+        return SocialAccount.objects.get(provider='theid', uid=uid).extra_data
+
+    def test_refresh(self):
+        self.assertEqual(self.provider.get_attributes('alice'),
+                         {'uid': 'alice', 'name': 'Alice'})
+
+        result = self.refresh(['alice', 'bob', 'carol'])
+
+        self.assertEqual(
+            str(result), "3 checked, 1 updated, 0 missing upstream, 0 failed")
+        self.assertEqual(self.get_extra_data('alice'),
+                         {'uid': 'alice', 'name': 'Alicia'})
+        self.assertEqual(self.provider.get_attributes('alice'),
+                         {'uid': 'alice', 'name': 'Alicia'})
+
+    def test_refresh_unchanged_not_saved(self):
+        with patch.object(SocialAccount, 'save') as save:
+            self.refresh(['bob'])
+        self.assertFalse(save.called)
+
+    def test_refresh_missing(self):
+        del UPSTREAM['alice']
+        result = self.refresh(['alice'])
+        self.assertEqual(result.missing, 1)
+        self.assertEqual(self.get_extra_data('alice'),
+                         {'uid': 'alice', 'name': 'Alice'})
+
+    @patch('allauth_cas.refresh.logger')
+    def test_refresh_failed_batch(self, logger):
+        result = self.refresh(['broken', 'bob', 'alice'], batch_size=2)
+        self.assertEqual(
+            str(result), "3 checked, 1 updated, 0 missing upstream, 2 failed")
+        self.assertEqual(logger.exception.call_count, 1)
+
+    def test_dry_run(self):
+        result = self.refresh(['alice'], dry_run=True)
+        self.assertEqual(result.updated, 1)
+        self.assertEqual(self.get_extra_data('alice'),
+                         {'uid': 'alice', 'name': 'Alice'})
+
+    @patch('allauth_cas.refresh.time.sleep')
+    def test_rate(self, sleep):
+        self.refresh(['alice', 'bob'], batch_size=1, rate=0.5)
+        self.assertEqual(sleep.call_count, 2)
+        self.assertGreater(sleep.call_args[0][0], 1.5)
+
+    def test_get_active_uids(self):
+        SocialAccount.objects.filter(uid='bob').update(
+            last_login=timezone.now() - timedelta(days=30))
+        self.assertEqual(list(get_active_uids(self.provider, since=3600)),
+                         ['alice'])
+
+    def test_get_active_uids_chunks(self):
+        """
+        Uids are read by chunks, as they are consumed.
+        """
+        uids = get_active_uids(self.provider, batch_size=1)
+        with self.assertNumQueries(1):
+            self.assertEqual(next(uids), 'alice')
+        with self.assertNumQueries(2):
+            self.assertEqual(list(uids), ['bob'])
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS={})
+    def test_no_fetcher(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.refresh(['alice'])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('cas_refresh_attributes', 'theid', stdout=out)
+        self.assertIn(
+            "Done: 2 checked, 1 updated, 0 missing upstream, 0 failed.",
+            out.getvalue())
+
+    def test_command_unknown_provider(self):
+        with self.assertRaisesMessage(
+                CommandError, "Unknown provider 'unknown'."):
+            call_command('cas_refresh_attributes', 'unknown')
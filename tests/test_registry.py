@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+import threading
+import time
+
+from django.contrib.sites.models import Site
+from django.test import RequestFactory, TestCase, override_settings
+
+from allauth.socialaccount import providers
+from allauth.socialaccount.models import SocialApp
+
+from allauth_cas.registry import (
+    clear_provider_cache, get_generation, get_provider,
+)
+
+from .example.provider import ExampleCASProvider
+
+
+class GetProviderTests(TestCase):
+
+    def setUp(self):
+        clear_provider_cache()
+        self.factory = RequestFactory()
+
+    def test_get_provider(self):
+        request = self.factory.get('/')
+
+        provider = get_provider('theid', request)
+
+        self.assertIsInstance(provider, ExampleCASProvider)
+        self.assertIs(provider.request, request)
+
+    def test_cached(self):
+        with patch.object(
+                providers.registry, 'by_id',
+                wraps=providers.registry.by_id) as by_id:
+            first = get_provider('theid', self.factory.get('/first'))
+            second = get_provider('theid', self.factory.get('/second'))
+
+        self.assertEqual(by_id.call_count, 1)
+        self.assertIsNot(first, second)
+        self.assertEqual(first.request.path, '/first')
+        self.assertEqual(second.request.path, '/second')
+
+    def test_unknown(self):
+        self.assertRaises(KeyError, get_provider, 'unknown')
+
+    def test_threads(self):
+        results = {}
+
+        def run(i):
+            request = self.factory.get('/{}'.format(i))
+            results[i] = get_provider('theid', request).request.path
+
+        threads = [
+            threading.Thread(target=run, args=(i,)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(
+            results, dict((i, '/{}'.format(i)) for i in range(10)))
+
+    def test_settings_shared(self):
+        with override_settings(SOCIALACCOUNT_PROVIDERS={
+                'theid': {'GROUP_CREATE': False}}):
+            get_provider('theid').get_settings()
+            with patch('allauth_cas.providers.Provider.get_settings') as m:
+                settings = get_provider('theid').get_settings()
+
+        self.assertFalse(m.called)
+        self.assertEqual(settings, {'GROUP_CREATE': False})
+
+    def test_settings_changed(self):
+        provider = get_provider('theid')
+        self.assertEqual(provider.get_settings(), {})
+
+        with override_settings(SOCIALACCOUNT_PROVIDERS={
+                'theid': {'GROUP_CREATE': False}}):
+            self.assertEqual(
+                get_provider('theid').get_settings(),
+                {'GROUP_CREATE': False},
+            )
+            # Also for existing instances.
+            self.assertEqual(
+                provider.get_settings(), {'GROUP_CREATE': False})
+
+    def test_app(self):
+        request = self.factory.get('/')
+        site = Site.objects.create(domain='testserver', name='testserver')
+        app = SocialApp.objects.create(
+            provider='theid', name='The Provider', client_id='theid')
+        app.sites.add(site)
+
+        self.assertEqual(get_provider('theid').get_app(request), app)
+        with self.assertNumQueries(0):
+            get_provider('theid').get_app(request)
+
+        app.name = 'Renamed'
+        app.save()
+
+        # allauth also caches the app on the request.
+        request = self.factory.get('/')
+        self.assertEqual(
+            get_provider('theid').get_app(request).name, 'Renamed')
+
+    @override_settings(ALLAUTH_CAS_SOCIAL_APP_CACHE_TIMEOUT=60)
+    def test_app_timeout(self):
+        """
+        Changes made by other processes, which are not signaled, are picked
+        up once the app has expired.
+        """
+        request = self.factory.get('/')
+        site = Site.objects.create(domain='testserver', name='testserver')
+        app = SocialApp.objects.create(
+            provider='theid', name='The Provider', client_id='theid')
+        app.sites.add(site)
+        get_provider('theid').get_app(request)
+
+        SocialApp.objects.filter(pk=app.pk).update(name='Renamed')
+
+        # allauth also caches the app on the request.
+        request = self.factory.get('/')
+        self.assertEqual(
+            get_provider('theid').get_app(request).name, 'The Provider')
+        request = self.factory.get('/')
+        with patch('allauth_cas.providers.time.time',
+                   return_value=time.time() + 61):
+            self.assertEqual(
+                get_provider('theid').get_app(request).name, 'Renamed')
+
+    def test_stale_generations_dropped(self):
+        provider = get_provider('theid')
+        provider.get_settings()
+        clear_provider_cache()
+
+        provider.get_settings()
+
+        self.assertEqual(
+            [key[1] for key in provider._shared], [get_generation()])
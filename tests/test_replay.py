@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from six import StringIO
+
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from allauth.socialaccount.models import SocialAccount
+
+import cas
+import requests
+
+from allauth_cas.recording import (
+    anonymize_response, load_recordings, pseudonymize,
+)
+from allauth_cas.replay import ReplayRunner, load_baseline
+from allauth_cas.test.server import CASStandInServer, build_success_response
+
+from .example.views import ExampleCASAdapter
+
+User = get_user_model()
+
+ATTRIBUTES = {
+    'mail': 'alice@mail.net',
+    'memberOf': ['cn=staff,ou=groups', 'cn=admin,ou=groups'],
+}
+
+
+class AnonymizeTests(TestCase):
+
+    def test_anonymize_response(self):
+        content = build_success_response('alice', ATTRIBUTES)
+
+        anonymized = anonymize_response(content)
+
+        self.assertEqual(len(anonymized), len(content))
+        self.assertNotIn('alice', anonymized)
+        uid, attributes, _ = cas.CASClientV3.verify_response(anonymized)
+        self.assertEqual(uid, pseudonymize('alice'))
+        self.assertEqual(len(attributes['memberOf']), 2)
+
+    def test_pseudonymize(self):
+        self.assertEqual(pseudonymize('alice'), pseudonymize('alice'))
+        self.assertNotEqual(pseudonymize('alice'), pseudonymize('alicf'))
+        self.assertEqual(len(pseudonymize('a' * 100)), 100)
+
+
+class StandInServerTestMixin(object):
+
+    def setUp(self):
+        super(StandInServerTestMixin, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.server = CASStandInServer(attributes=ATTRIBUTES).start()
+        self.addCleanup(self.server.stop)
+
+
+class CASStandInServerTests(StandInServerTestMixin, TestCase):
+
+    def test_login(self):
+        r = requests.get(
+            self.server.url + 'login',
+            params={'service': 'http://testserver/callback/?next=/'},
+            allow_redirects=False,
+        )
+
+        self.assertEqual(r.status_code, 302)
+        self.assertTrue(r.headers['Location'].startswith(
+            'http://testserver/callback/?next=/&ticket=ST-'))
+
+    def test_validate(self):
+        client = cas.CASClient(
+            version=3, server_url=self.server.url,
+            service_url='http://testserver/')
+        ticket = self.server.issue_ticket('bob')
+
+        uid, attributes, _ = client.verify_ticket(ticket)
+        self.assertEqual(uid, 'bob')
+        self.assertEqual(attributes, ATTRIBUTES)
+
+        # Tickets are valid once.
+        self.assertEqual(client.verify_ticket(ticket), (None, {}, None))
+
+
+class RecordingTests(StandInServerTestMixin, TestCase):
+
+    def test_record_callback(self):
+        path = os.path.join(self.tmpdir, 'responses.jsonl')
+
+        with patch.object(ExampleCASAdapter, 'url', self.server.url), \
+                self.settings(ALLAUTH_CAS_RECORDING_PATH=path,
+                              ALLAUTH_CAS_RECORDING_SAMPLE_RATE=1):
+            self.client.get('/accounts/theid/login/')
+            self.client.get('/accounts/theid/login/callback/', {
+                'ticket': self.server.issue_ticket('alice'),
+            })
+
+        recordings = load_recordings(path)
+        self.assertEqual(len(recordings), 1)
+        self.assertEqual(recordings[0]['provider'], 'theid')
+        self.assertEqual(recordings[0]['version'], '2')
+        self.assertIn(pseudonymize('alice'), recordings[0]['content'])
+        self.assertNotIn('alice', recordings[0]['content'])
+        # The login itself is not affected.
+        self.assertTrue(SocialAccount.objects.filter(
+            provider='theid', uid='alice').exists())
+
+    def test_disabled(self):
+        with patch.object(ExampleCASAdapter, 'url', self.server.url):
+            self.client.get('/accounts/theid/login/')
+            self.client.get('/accounts/theid/login/callback/', {
+                'ticket': self.server.issue_ticket('alice'),
+            })
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+
+class ReplayTests(StandInServerTestMixin, TestCase):
+
+    def setUp(self):
+        super(ReplayTests, self).setUp()
+        self.recordings = [
+            {
+                'id': 'small',
+                'provider': 'theid',
+                'version': '3',
+                'content': anonymize_response(
+                    build_success_response('alice')),
+            },
+            {
+                'id': 'large',
+                'provider': 'theid',
+                'version': '2',
+                'content': anonymize_response(
+                    build_success_response('bob', ATTRIBUTES)),
+            },
+            {
+                'id': 'other',
+                'provider': 'other',
+                'version': '2',
+                'content': build_success_response('carol'),
+            },
+        ]
+
+    def write_recordings(self):
+        path = os.path.join(self.tmpdir, 'responses.jsonl')
+        with open(path, 'w') as f:
+            for recording in self.recordings:
+                f.write(json.dumps(recording) + '\n')
+        return path
+
+    def test_run(self):
+        results = ReplayRunner(ExampleCASAdapter, repeat=2).run(
+            self.recordings)
+
+        self.assertEqual([r.id for r in results], ['small', 'large'])
+        for result in results:
+            self.assertEqual(result.status_code, 302)
+            self.assertTrue(result.passed)
+        # Changes are rolled back.
+        self.assertFalse(User.objects.exists())
+        self.assertEqual(ExampleCASAdapter.url, 'https://server.cas')
+        self.assertEqual(ExampleCASAdapter.version, 2)
+
+    def test_budgets(self):
+        baseline = {
+            'small': {'latency': 60, 'allocations': 10 ** 9},
+            'large': {'latency': 1e-9, 'allocations': 1},
+        }
+        small, large = ReplayRunner(ExampleCASAdapter, repeat=1).run(
+            self.recordings, baseline=baseline)
+
+        self.assertTrue(small.passed)
+        self.assertFalse(large.passed)
+        self.assertIn("latency exceeds 1.5 x baseline", large.failures)
+
+    def test_max_latency(self):
+        results = ReplayRunner(
+            ExampleCASAdapter, repeat=1, max_latency=0).run(self.recordings)
+        self.assertFalse(any(result.passed for result in results))
+
+    @override_settings(DEBUG=False)
+    def test_command(self):
+        path = self.write_recordings()
+        baseline = os.path.join(self.tmpdir, 'baseline.json')
+        adapter = 'tests.example.views.ExampleCASAdapter'
+
+        out = StringIO()
+        call_command(
+            'cas_replay', adapter, path, baseline=baseline,
+            update_baseline=True, repeat=1, stdout=out,
+        )
+        self.assertIn("Done: 2 responses replayed.", out.getvalue())
+        self.assertEqual(
+            sorted(load_baseline(baseline)), ['large', 'small'])
+
+        with self.assertRaises(CommandError) as cm:
+            call_command(
+                'cas_replay', adapter, path, baseline=baseline, repeat=1,
+                max_latency=0, stdout=StringIO(),
+            )
+        self.assertEqual(
+            str(cm.exception), "2 of 2 responses exceeded their budgets.")
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+try:
+    from unittest.mock import Mock, patch
+except ImportError:
+    from mock import Mock, patch
+
+import threading
+import time
+
+from django.test import TestCase
+
+from allauth_cas.exceptions import CASRESTError
+from allauth_cas.rest import CASRESTClient
+
+from .example.views import ExampleCASAdapter
+
+
+class FakeCASRESTSession(object):
+    """
+    Plays the REST protocol of a CAS server.
+    """
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.tgt_requests = 0
+        self.expired = set()
+        self.lock = threading.Lock()
+
+    def post(self, url, data):
+        time.sleep(self.delay)
+        if url == 'https://server.cas/v1/tickets':
+            if data['password'] != 'secret':
+                return Mock(status_code=401)
+            with self.lock:
+                self.tgt_requests += 1
+                tgt = url + '/TGT-{}'.format(self.tgt_requests)
+            return Mock(status_code=201, headers={'Location': tgt})
+        if url in self.expired:
+            return Mock(status_code=404)
+        return Mock(status_code=200, text='ST-1\n')
+
+    def delete(self, url):
+        self.expired.add(url)
+
+
+class CASRESTClientTests(TestCase):
+
+    def setUp(self):
+        self.session = FakeCASRESTSession()
+        patcher = patch(
+            'allauth_cas.rest.get_http_session',
+            return_value=self.session,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.client = CASRESTClient(ExampleCASAdapter)
+
+    def test_get_service_ticket(self):
+        st = self.client.get_service_ticket('alice', 'secret', 'http://srv/')
+        self.assertEqual(st, 'ST-1')
+
+    def test_tgt_cached(self):
+        for _ in range(3):
+            self.client.get_service_ticket('alice', 'secret', 'http://srv/')
+        self.assertEqual(self.session.tgt_requests, 1)
+
+    def test_tgt_cache_expires(self):
+        self.client.tgt_timeout = 0
+        self.client.get_ticket_granting_ticket('alice', 'secret')
+        self.client.get_ticket_granting_ticket('alice', 'secret')
+        self.assertEqual(self.session.tgt_requests, 2)
+
+    def test_tgt_expired_on_server(self):
+        tgt = self.client.get_ticket_granting_ticket('alice', 'secret')
+        self.session.expired.add(tgt)
+
+        st = self.client.get_service_ticket('alice', 'secret', 'http://srv/')
+
+        self.assertEqual(st, 'ST-1')
+        self.assertEqual(self.session.tgt_requests, 2)
+
+    def test_invalid_credentials(self):
+        self.assertRaises(
+            CASRESTError,
+            self.client.get_service_ticket, 'alice', 'wrong', 'http://srv/',
+        )
+
+    def test_logout(self):
+        tgt = self.client.get_ticket_granting_ticket('alice', 'secret')
+        self.client.logout('alice', 'secret')
+        self.assertIn(tgt, self.session.expired)
+        self.client.get_ticket_granting_ticket('alice', 'secret')
+        self.assertEqual(self.session.tgt_requests, 2)
+
+    def test_concurrent_tgt_requests_coalesced(self):
+        self.session.delay = 0.05
+
+        threads = [
+            threading.Thread(
+                target=self.client.get_ticket_granting_ticket,
+                args=('alice', 'secret'),
+            )
+            for _ in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.session.tgt_requests, 1)
+        self.assertEqual(self.client._locks, {})
+
+    def test_tgt_cache_size(self):
+        client = CASRESTClient(ExampleCASAdapter, max_tgts=2)
+        for username in ('alice', 'bob', 'carol'):
+            client.get_ticket_granting_ticket(username, 'secret')
+
+        self.assertEqual(len(client._tgts), 2)
+        self.assertEqual(client._locks, {})
+        client.get_ticket_granting_ticket('alice', 'secret')
+        self.assertEqual(self.session.tgt_requests, 4)
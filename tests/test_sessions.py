@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from six import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase, override_settings
+
+from allauth.socialaccount import providers
+from allauth.socialaccount.models import SocialAccount
+
+from allauth_cas import CAS_PROVIDER_SESSION_KEY, CAS_SESSION_KEY
+from allauth_cas.locks import CacheLock
+from allauth_cas.provisioning import bulk_deprovision
+from allauth_cas.sessions import (
+    SessionIndex, delete_sessions, get_cas_login, get_session_model,
+    invalidate_user_sessions, set_cas_login,
+)
+from allauth_cas.test.testcases import CASTestCase, SessionSaveCounter
+
+User = get_user_model()
+
+
+class SessionIndexTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.index = SessionIndex()
+
+    def test_add_remove(self):
+        self.index.add(1, 'a')
+        self.index.add(1, 'b')
+        self.index.add(1, 'a')
+        self.index.add(2, 'c')
+
+        self.assertEqual(
+            self.index.get_session_keys([1, 2, 3]),
+            {1: ['b', 'a'], 2: ['c']},
+        )
+
+        self.index.remove(1, 'a')
+        self.index.remove(2, 'c')
+        self.assertEqual(self.index.get_session_keys([1, 2]), {1: ['b']})
+        self.assertIsNone(cache.get(self.index.get_key(2)))
+
+    @patch('allauth_cas.sessions.logger')
+    def test_update_locked(self, logger):
+        """
+        The index is left unchanged if its lock can't be acquired.
+        """
+        self.index.add(1, 'a')
+        CacheLock(self.index.get_key(1) + ':lock').acquire()
+
+        with patch.object(SessionIndex, 'lock_wait', 0):
+            self.assertFalse(self.index.add(1, 'b'))
+
+        self.assertEqual(self.index.get_session_keys([1]), {1: ['a']})
+        self.assertTrue(logger.warning.called)
+
+    def test_get_session_model(self):
+        class OldStore(object):
+            """A database store of Django 1.8."""
+
+        self.assertIs(get_session_model(OldStore), Session)
+        self.assertIs(get_session_model(DBStore), Session)
+
+    def test_timeout(self):
+        with override_settings(SESSION_COOKIE_AGE=60):
+            self.assertEqual(SessionIndex().timeout, 60)
+        self.assertEqual(SessionIndex(timeout=10).timeout, 10)
+
+    def test_invalidate(self):
+        sessions = [self.create_session() for _ in range(3)]
+        self.index.add(1, sessions[0])
+        self.index.add(1, sessions[1])
+        self.index.add(2, sessions[2])
+
+        with self.assertNumQueries(1):
+            result = self.index.invalidate([1, 3])
+
+        self.assertEqual(str(result), "1 users, 2 sessions invalidated")
+        self.assertQuerysetEqual(
+            Session.objects.all(), [sessions[2]],
+            transform=lambda s: s.session_key,
+        )
+        self.assertEqual(self.index.get_session_keys([1, 2]), {
+            2: [sessions[2]],
+        })
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.cache')
+    def test_delete_sessions_cache_engine(self):
+        from django.contrib.sessions.backends.cache import SessionStore
+
+        store = SessionStore()
+        store['a'] = 1
+        store.create()
+
+        delete_sessions([store.session_key])
+
+        self.assertFalse(SessionStore().exists(store.session_key))
+
+    def create_session(self):
+        from django.contrib.sessions.backends.db import SessionStore
+
+        store = SessionStore()
+        store.create()
+        return store.session_key
+
+
+@override_settings(ALLAUTH_CAS_SESSION_INDEX_CACHE='default')
+class SessionIndexFlowTests(CASTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.index = SessionIndex()
+
+    def login(self, client=None):
+        client = client or Client()
+        self.client_cas_login(client, username='user')
+        return client
+
+    def get_user(self):
+        return SocialAccount.objects.get(provider='theid', uid='user').user
+
+    def test_login(self):
+        first = self.login()
+        second = self.login()
+
+        self.assertEqual(
+            self.index.get_session_keys([self.get_user().pk]),
+            {self.get_user().pk: [
+                first.session.session_key, second.session.session_key,
+            ]},
+        )
+
+    @override_settings(ALLAUTH_CAS_SESSION_INDEX_CACHE=None)
+    def test_disabled(self):
+        self.login()
+        self.assertEqual(self.index.get_session_keys([self.get_user().pk]), {})
+
+    def test_logout(self):
+        client = self.login()
+        session_key = client.session.session_key
+
+        client.post('/accounts/logout/')
+
+        user = self.get_user()
+        self.assertNotIn(
+            session_key,
+            self.index.get_session_keys([user.pk]).get(user.pk, []),
+        )
+
+    def test_invalidate_user_sessions(self):
+        clients = [self.login(), self.login()]
+
+        result = invalidate_user_sessions([self.get_user()])
+
+        self.assertEqual(str(result), "1 users, 2 sessions invalidated")
+        for client in clients:
+            self.assertNotIn('_auth_user_id', client.session)
+
+    @override_settings(ALLAUTH_CAS_SESSION_INDEX_CACHE=None)
+    def test_invalidate_user_sessions_disabled(self):
+        with self.assertRaises(ImproperlyConfigured):
+            invalidate_user_sessions([1])
+
+    def test_deprovision(self):
+        client = self.login()
+        provider = providers.registry.by_id('theid')
+
+        list(bulk_deprovision(provider, ['other']))
+
+        self.assertNotIn('_auth_user_id', client.session)
+
+    def test_command_usernames(self):
+        client = self.login()
+        out = StringIO()
+
+        call_command('cas_invalidate_sessions', 'user', stdout=out)
+
+        self.assertIn("Done: 1 users, 1 sessions invalidated.", out.getvalue())
+        self.assertNotIn('_auth_user_id', client.session)
+
+    def test_command_uids(self):
+        client = self.login()
+        User.objects.filter(username='user').update(username='renamed')
+
+        call_command(
+            'cas_invalidate_sessions', 'user', provider='theid',
+            stdout=StringIO(),
+        )
+
+        self.assertNotIn('_auth_user_id', client.session)
+
+    def test_command_no_users(self):
+        with self.assertRaises(CommandError):
+            call_command('cas_invalidate_sessions', stdout=StringIO())
+
+    @override_settings(ALLAUTH_CAS_SESSION_INDEX_CACHE=None)
+    def test_command_disabled(self):
+        with self.assertRaises(CommandError):
+            call_command('cas_invalidate_sessions', 'user', stdout=StringIO())
+
+
+class CASLoginSessionTests(TestCase):
+
+    def test_set_get(self):
+        session = {CAS_PROVIDER_SESSION_KEY: 'theid'}
+
+        set_cas_login(session, 'theid', 'user')
+
+        self.assertEqual(session, {CAS_SESSION_KEY: ['theid', 'user']})
+        self.assertEqual(get_cas_login(session), ('theid', 'user'))
+
+    def test_legacy(self):
+        """
+        Sessions opened by older versions only hold the provider id.
+        """
+        session = {CAS_PROVIDER_SESSION_KEY: 'theid'}
+        self.assertEqual(get_cas_login(session), ('theid', None))
+
+    def test_none(self):
+        self.assertEqual(get_cas_login({}), (None, None))
+
+
+class SessionSavesTests(CASTestCase):
+
+    def test_counter(self):
+        from django.contrib.sessions.backends.db import SessionStore
+
+        with SessionSaveCounter() as counter:
+            store = SessionStore()
+            store['a'] = 1
+            store.save()  # Creates the session.
+            store.save()
+        self.assertEqual(counter.count, 2)
+
+    def test_login_flow(self):
+        """
+        A CAS login saves the session once on the login view, and twice on
+        the callback view: when Django rotates the session key on login, then
+        when the session middleware saves the authenticated session.
+        """
+        with self.assertNumSessionSaves(1):
+            self.client.get('/accounts/theid/login/')
+
+        self.patch_cas_response(valid_ticket='__all__', username='user')
+        with self.assertNumSessionSaves(2):
+            self.client.get('/accounts/theid/login/callback/', {
+                'ticket': 'ticket',
+            })
+
+        self.assertEqual(self.client.session[CAS_SESSION_KEY],
+                         ['theid', 'user'])
+
+        with self.assertNumSessionSaves(0):
+            self.client.post('/accounts/logout/')
+
+    def test_login_view_same_state(self):
+        """
+        The login view doesn't save the session again for the same state.
+        """
+        self.client.get('/accounts/theid/login/', {'next': '/path/'})
+        with self.assertNumSessionSaves(0):
+            self.client.get('/accounts/theid/login/', {'next': '/path/'})
+        with self.assertNumSessionSaves(1):
+            self.client.get('/accounts/theid/login/', {'next': '/other/'})
+
+        self.patch_cas_response(valid_ticket='__all__', username='user')
+        r = self.client.get('/accounts/theid/login/callback/', {
+            'ticket': 'ticket',
+        })
+        self.assertRedirects(r, '/other/', fetch_redirect_response=False)
+
+    def test_assert_fails(self):
+        with self.assertRaises(AssertionError):
+            with self.assertNumSessionSaves(0):
+                self.client.get('/accounts/theid/login/')
+
+    def test_legacy_session_logout(self):
+        """
+        Sessions opened by older versions are still handled on logout.
+        """
+        self.client_cas_login(self.client, username='user')
+        session = self.client.session
+        del session[CAS_SESSION_KEY]
+        session[CAS_PROVIDER_SESSION_KEY] = 'theid'
+        session.save()
+
+        with patch('allauth_cas.signals.get_audit_log'), \
+                patch('allauth_cas.signals.audit') as audit:
+            self.client.post('/accounts/logout/')
+
+        self.assertEqual(audit.call_args[1]['uid'], 'user')
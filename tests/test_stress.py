@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from allauth.socialaccount.models import SocialAccount
+
+from allauth_cas.stats import percentile
+from allauth_cas.test.stress import StressResult
+from allauth_cas.test.testcases import CASStressTestCase
+
+from .example.views import ExampleCASAdapter
+
+User = get_user_model()
+
+
+class PercentileTests(TestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 51)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertIsNone(percentile([], 50))
+
+
+class StressResultTests(TestCase):
+
+    def test_str(self):
+        result = StressResult()
+        result.flows = 10
+        result.duration = 2
+        result.add_latency('callback', 0.010)
+        result.add_error("Flow 3: boom")
+
+        self.assertFalse(result.passed)
+        self.assertEqual(str(result), "\n".join([
+            "10 flows in 2.00 s (5.0 flows/s), 1 errors, 0 violations",
+            "callback: p50 10.0 ms, p95 10.0 ms, p99 10.0 ms, max 10.0 ms",
+            "Error: Flow 3: boom",
+        ]))
+
+
+class StressRunnerTests(CASStressTestCase):
+
+    def test_concurrent_flows(self):
+        result = self.run_cas_stress(
+            ExampleCASAdapter, flows=20, concurrency=4, users=3)
+
+        self.assertStressPassed(result)
+        self.assertEqual(result.flows, 20)
+        self.assertEqual(len(result.latencies['callback']), 20)
+        self.assertGreater(result.throughput, 0)
+        self.assertEqual(
+            SocialAccount.objects.filter(provider='theid').count(), 3)
+        self.assertEqual(User.objects.count(), 3)
+
+    def test_adapter_restored(self):
+        self.run_cas_stress(ExampleCASAdapter, flows=1, concurrency=1)
+        self.assertEqual(ExampleCASAdapter.url, 'https://server.cas')
+
+    def test_flow_errors(self):
+        with patch('allauth_cas.test.stress.StressRunner.run_flow',
+                   side_effect=ValueError('boom')):
+            result = self.run_cas_stress(
+                ExampleCASAdapter, flows=3, concurrency=2)
+
+        self.assertEqual(len(result.errors), 3)
+        self.assertIn("ValueError('boom'", result.errors[0])
+        with self.assertRaises(AssertionError):
+            self.assertStressPassed(result)
+
+    def test_invariants(self):
+        """
+        A second account for a uid breaks the invariants.
+        """
+        user = User.objects.create(username='other')
+        with patch('allauth_cas.test.stress.StressRunner.run_flow'):
+            result = self.run_cas_stress(
+                ExampleCASAdapter, flows=1, concurrency=1, users=1)
+        self.assertEqual(
+            result.violations, ["stress-user-0 has 0 social accounts"])
+
+        SocialAccount.objects.create(
+            user=user, provider='theid', uid='stress-user-0')
+        with patch('allauth_cas.test.stress.StressRunner.run_flow',
+                   side_effect=lambda *args: User.objects.create(
+                       username='dup')):
+            result = self.run_cas_stress(
+                ExampleCASAdapter, flows=1, concurrency=1, users=1)
+        self.assertEqual(len(result.violations), 1)
+        self.assertIn("has 0 social accounts", result.violations[0])
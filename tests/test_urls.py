@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+import json
+import os
+import subprocess
+import sys
+
+from django.test import TestCase
+
+from allauth_cas.checks import check_provider_views
+from allauth_cas.urls import ProviderURLconf, import_views
+
+from .example import views
+from .example.provider import ExampleCASProvider
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loads the URLconf in a fresh interpreter, then lists the imported modules.
+LOAD_URLCONF = """
+import json, os, sys
+os.environ['DJANGO_SETTINGS_MODULE'] = 'tests.settings'
+import django
+django.setup()
+try:
+    from django.urls import get_resolver
+except ImportError:
+    from django.core.urlresolvers import get_resolver
+
+get_resolver().url_patterns
+
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+class ProviderURLconfTests(TestCase):
+
+    def get_names(self):
+        urlconf = ProviderURLconf(ExampleCASProvider)
+        return [pattern.name for pattern in urlconf.urlpatterns]
+
+    def test_urlpatterns(self):
+        self.assertEqual(self.get_names(),
+                         ['theid_login', 'theid_callback', 'theid_logout'])
+
+    def test_no_logout(self):
+        """
+        Without logout view, the logout url is not registered.
+        """
+        with patch.dict(views.__dict__):
+            del views.__dict__['logout']
+            self.assertEqual(self.get_names(),
+                             ['theid_login', 'theid_callback'])
+
+    def test_missing_required(self):
+        with patch.dict(views.__dict__):
+            del views.__dict__['callback']
+            with self.assertRaisesMessage(
+                    ImportError,
+                    "The callback view for the 'theid' provider is lacking"):
+                import_views(ExampleCASProvider)
+
+    def test_check(self):
+        self.assertEqual(check_provider_views(None), [])
+
+        with patch.dict(views.__dict__):
+            del views.__dict__['login']
+            errors = check_provider_views(None)
+
+        self.assertEqual([error.id for error in errors], ['allauth_cas.E001'])
+        self.assertIn("The login view for the 'theid' provider",
+                      errors[0].msg)
+
+    def test_urlconf_is_lazy(self):
+        """
+        Loading the URLconf doesn't import the views of the providers, nor
+        the CAS client stack.
+        """
+        output = subprocess.check_output(
+            [sys.executable, '-c', LOAD_URLCONF], cwd=ROOT)
+        modules = json.loads(output.decode('utf-8'))
+
+        for module in ('cas', 'requests', 'allauth_cas.views',
+                       'tests.example.views'):
+            self.assertNotIn(module, modules)
@@ -4,19 +4,30 @@ try:
 except ImportError:
     from mock import patch
 
+import hashlib
+import threading
+
 import django
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.http import HttpResponse
 from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from allauth.socialaccount.models import SocialAccount
 
 from allauth_cas.exceptions import CASAuthenticationError
+from allauth_cas.locks import CacheLock
 from allauth_cas.test.testcases import CASTestCase, CASViewTestCase
 from allauth_cas.views import CASView
 
 from .example.views import ExampleCASAdapter
 
 if django.VERSION >= (1, 10):
-    from django.urls import reverse
+    from django.urls import reverse, set_script_prefix
 else:
-    from django.core.urlresolvers import reverse
+    from django.core.urlresolvers import reverse, set_script_prefix
 
 
 class CASAdapterTests(CASTestCase):
@@ -48,6 +59,64 @@ class CASAdapterTests(CASTestCase):
         service_url = adapter.get_service_url(request)
         self.assertEqual(expected, service_url)
 
+    @override_settings(SOCIALACCOUNT_PROVIDERS={
+        'theid': {'SERVICE_BASE_URL': 'https://app.example.com/'},
+    })
+    def test_get_service_url_base_url(self):
+        """
+        With a canonical base url, the service url doesn't depend on the host
+        of the request.
+        """
+        expected = (
+            'https://app.example.com/accounts/theid/login/callback/'
+            '?next=%2Fnext%2F'
+        )
+        factory = RequestFactory()
+        service_urls = set()
+        for host in ('testserver', 'node1.internal', 'node2.internal:8000'):
+            request = factory.get(
+                '/path/', {'next': '/next/'}, HTTP_HOST=host)
+            adapter = ExampleCASAdapter(request)
+            service_urls.add(adapter.get_service_url(request))
+        self.assertEqual(service_urls, {expected})
+
+    def test_get_service_url_callback_path_reversed_once(self):
+        self.adapter.get_service_url(self.request)
+        with patch('allauth_cas.providers.reverse') as reverse:
+            service_url = self.adapter.get_service_url(self.request)
+        self.assertFalse(reverse.called)
+        self.assertEqual(
+            service_url, 'http://testserver/accounts/theid/login/callback/')
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS={
+        'theid': {'SERVICE_BASE_URL': 'app.example.com'},
+    })
+    def test_get_service_url_base_url_not_absolute(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.adapter.get_service_url(self.request)
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS={
+        'theid': {'SERVICE_BASE_URL': 'https://app.example.com/app/'},
+    })
+    def test_get_service_url_base_url_path(self):
+        """
+        A path in the base url would be doubled with the script prefix.
+        """
+        with self.assertRaisesMessage(
+                ImproperlyConfigured, "must only hold a scheme and a host"):
+            self.adapter.get_service_url(self.request)
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS={
+        'theid': {'SERVICE_BASE_URL': 'https://app.example.com'},
+    })
+    def test_get_service_url_base_url_script_prefix(self):
+        set_script_prefix('/app/')
+        self.addCleanup(set_script_prefix, '/')
+        self.assertEqual(
+            self.adapter.get_service_url(self.request),
+            'https://app.example.com/app/accounts/theid/login/callback/',
+        )
+
     def test_renew(self):
         """
         From an anonymous request, renew is False to let using the single
@@ -170,6 +239,19 @@ class CASLoginViewTests(CASViewTestCase):
 
         self.assertRedirects(r, expected, fetch_redirect_response=False)
 
+    @override_settings(SOCIALACCOUNT_PROVIDERS={
+        'theid': {'AUTH_PARAMS_ALLOWED': ['lang']},
+    })
+    def test_execute_auth_params_rejected(self):
+        """
+        Dynamic auth_params with a key not allowed render the login failure
+        page.
+        """
+        r = self.client.get('/accounts/theid/login/', {
+            'auth_params': 'lang=fr&other=1',
+        })
+        self.assertLoginFailure(r)
+
 
 class CASCallbackViewTests(CASViewTestCase):
 
@@ -224,6 +306,116 @@ class CASCallbackViewTests(CASViewTestCase):
         self.assertLoginSuccess(r)
 
 
+class CASCallbackViewProvisioningLockTests(CASViewTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client.get('/accounts/theid/login/')
+        self.patch_cas_response(username='alice', valid_ticket='__all__')
+        self.lock = CacheLock(
+            'allauth_cas:provisioning:theid:{}'.format(
+                hashlib.sha1(b'alice').hexdigest()),
+        )
+
+    def callback(self):
+        return self.client.get('/accounts/theid/login/callback/', {
+            'ticket': '123456',
+        })
+
+    def test_lock_released(self):
+        r = self.callback()
+        self.assertLoginSuccess(r)
+        self.assertTrue(self.lock.acquire())
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS={
+        'theid': {'PROVISIONING_LOCK_WAIT': 0.1},
+    })
+    def test_lock_busy(self):
+        """
+        Login fails if another request creates the account for too long.
+        """
+        self.lock.acquire()
+        r = self.callback()
+        self.assertLoginFailure(r)
+        self.assertFalse(SocialAccount.objects.exists())
+
+    def test_lock_wait(self):
+        """
+        Requests wait for the account creation by another request.
+        """
+        self.lock.acquire()
+        threading.Timer(0.1, self.lock.release).start()
+        r = self.callback()
+        self.assertLoginSuccess(r)
+
+    def test_existing_account_single_lookup(self):
+        """
+        The account of an existing user is looked up once, under the lock.
+        """
+        self.assertLoginSuccess(self.callback())
+        self.client.logout()
+        self.client.get('/accounts/theid/login/')
+
+        with patch('allauth_cas.views.CacheLock.acquire',
+                   return_value=True) as acquire, \
+                CaptureQueriesContext(connection) as queries, \
+                patch('allauth_cas.views.complete_social_login') as complete:
+            complete.return_value = HttpResponse()
+            self.callback()
+
+        self.assertTrue(acquire.called)
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if 'socialaccount_socialaccount' in query['sql']
+        ])
+
+    def test_lock_released_on_commit(self):
+        """
+        With ATOMIC_REQUESTS, the lock is held until the transaction of the
+        request commits.
+        """
+        settings_dict = connection.settings_dict
+        with patch.dict(settings_dict, {'ATOMIC_REQUESTS': True}), \
+                patch('allauth_cas.views.transaction.on_commit') as commit, \
+                patch('allauth_cas.views.release_at_request_end') as at_end:
+            self.assertLoginSuccess(self.callback())
+
+        self.assertFalse(self.lock.acquire())
+        release = commit.call_args[0][0]
+        self.assertIs(at_end.call_args[0][0], release.__self__)
+        release()
+        self.assertTrue(self.lock.acquire())
+
+    def test_lock_released_on_rollback(self):
+        """
+        With ATOMIC_REQUESTS, the lock is released at the end of the request
+        if its transaction is rolled back by a later error.
+        """
+        settings_dict = connection.settings_dict
+        with patch.dict(settings_dict, {'ATOMIC_REQUESTS': True}), \
+                patch('allauth_cas.views.transaction.on_commit'), \
+                patch('tests.example.provider.ExampleCASProvider.sync_groups',
+                      side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                self.callback()
+
+        self.assertTrue(self.lock.acquire())
+
+    def test_lock_released_on_error(self):
+        with patch('allauth_cas.views.complete_social_login',
+                   side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                self.callback()
+        self.assertTrue(self.lock.acquire())
+
+    @override_settings(SOCIALACCOUNT_PROVIDERS={
+        'theid': {'PROVISIONING_LOCK': False},
+    })
+    def test_lock_disabled(self):
+        self.lock.acquire()
+        self.assertLoginSuccess(self.callback())
+
+
 class CASLogoutViewTests(CASViewTestCase):
 
     def test_reverse(self):
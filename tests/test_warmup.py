@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+try:
+    from unittest.mock import Mock, patch
+except ImportError:
+    from mock import Mock, patch
+
+from six import StringIO
+
+from django.apps import apps
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import Client, TestCase, override_settings
+
+import cas
+import requests
+
+from allauth_cas.http import (
+    clear_http_sessions, get_http_session, use_http_session,
+)
+from allauth_cas.test.server import CASStandInServer
+from allauth_cas.warmup import get_cas_adapters, warm_up, warm_up_adapter
+
+from .example.views import ExampleCASAdapter
+
+UNREACHABLE_URL = 'http://127.0.0.1:1/'
+
+
+class UseHTTPSessionTests(TestCase):
+
+    def setUp(self):
+        self.session = Mock()
+        self.session.get.return_value.content = b'<response/>'
+
+    def test_v2(self):
+        client = cas.CASClientV3(
+            service_url='http://testserver/callback/',
+            server_url='https://server.cas/',
+            proxy_callback='https://testserver/pgt/',
+        )
+        use_http_session(client, self.session)
+
+        self.assertEqual(client.get_verification_response('ST-1'),
+                         b'<response/>')
+        self.session.get.assert_called_once_with(
+            'https://server.cas/p3/serviceValidate',
+            params={
+                'ticket': 'ST-1',
+                'service': 'http://testserver/callback/',
+                'pgtUrl': 'https://testserver/pgt/',
+            },
+            verify=True,
+        )
+        self.session.get.return_value.close.assert_called_once_with()
+
+    def test_saml(self):
+        client = cas.CASClientWithSAMLV1(
+            service_url='http://testserver/callback/',
+            server_url='https://server.cas/',
+        )
+        use_http_session(client, self.session)
+
+        client.fetch_saml_validation('ST-1')
+
+        args, kwargs = self.session.post.call_args
+        self.assertEqual(args[0], 'https://server.cas/samlValidate')
+        self.assertIn(b'ST-1', args[1])
+        self.assertEqual(kwargs['params'],
+                         {'TARGET': 'http://testserver/callback/'})
+
+    def test_v1_unchanged(self):
+        client = cas.CASClientV1(server_url='https://server.cas/')
+        use_http_session(client, self.session)
+        self.assertNotIn('verify_ticket', vars(client))
+
+
+class CookieCASStandInServer(CASStandInServer):
+
+    def respond(self, start_response, *args, **kwargs):
+        def start_response_with_cookie(status, headers):
+            return start_response(
+                status, headers + [('Set-Cookie', 'TGC=secret; Path=/')])
+        return super(CookieCASStandInServer, self).respond(
+            start_response_with_cookie, *args, **kwargs)
+
+
+class GetHTTPSessionTests(TestCase):
+
+    def setUp(self):
+        clear_http_sessions()
+        self.addCleanup(clear_http_sessions)
+
+    def test_shared(self):
+        session = get_http_session('https://server.cas/cas/')
+        self.assertIs(get_http_session('https://server.cas/other/'), session)
+        self.assertIsNot(get_http_session('http://server.cas/'), session)
+
+    def test_cookies_rejected(self):
+        """
+        Cookies of the CAS server are not kept, as the session is shared by
+        all users.
+        """
+        with CookieCASStandInServer() as server:
+            session = get_http_session(server.url)
+            r = session.get(server.url + 'logout')
+
+        self.assertIn('TGC', r.headers['Set-Cookie'])
+        self.assertEqual(len(session.cookies), 0)
+
+
+class WarmupTests(TestCase):
+
+    def setUp(self):
+        clear_http_sessions()
+        self.addCleanup(clear_http_sessions)
+        self.server = CASStandInServer().start()
+        self.addCleanup(self.server.stop)
+
+    def patch_adapter_url(self, url):
+        patcher = patch.object(ExampleCASAdapter, 'url', url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get_cas_adapters(self):
+        self.assertEqual(get_cas_adapters(), {'theid': ExampleCASAdapter})
+        self.assertEqual(get_cas_adapters(['theid']),
+                         {'theid': ExampleCASAdapter})
+        with self.assertRaises(KeyError):
+            get_cas_adapters(['unknown'])
+
+    def test_warm_up_adapter(self):
+        self.patch_adapter_url(self.server.url)
+
+        result = warm_up_adapter(ExampleCASAdapter, connections=3)
+
+        self.assertTrue(result.ok)
+        self.assertEqual(self.server.requests, 3)
+        self.assertTrue(str(result).startswith(
+            'theid ({}): '.format(self.server.url)))
+
+    def test_warm_up_adapter_unreachable(self):
+        self.patch_adapter_url(UNREACHABLE_URL)
+
+        result = warm_up_adapter(ExampleCASAdapter, timeout=1)
+
+        self.assertFalse(result.ok)
+        self.assertIn(': failed, ', str(result))
+
+    def test_warm_up(self):
+        self.patch_adapter_url(self.server.url)
+
+        import_time, results = warm_up()
+
+        self.assertGreaterEqual(import_time, 0)
+        self.assertEqual([r.provider_id for r in results], ['theid'])
+
+    def validate(self):
+        """Logs in through the stand-in server, and returns the number of
+        validation requests sent through the shared session."""
+        self.patch_adapter_url(self.server.url)
+        session = get_http_session(self.server.url)
+        client = Client()
+
+        r = client.get('/accounts/theid/login/')
+        r = requests.get(r['Location'], allow_redirects=False)
+        with patch.object(session, 'get', wraps=session.get) as get:
+            r = client.get(r.headers['Location'])
+
+        self.assertRedirects(
+            r, '/accounts/profile/', fetch_redirect_response=False)
+        return get.call_count
+
+    @override_settings(ALLAUTH_CAS_HTTP_POOLING=True)
+    def test_validation_uses_shared_session(self):
+        """
+        Tickets are validated through the shared session warmed up.
+        """
+        self.assertEqual(self.validate(), 1)
+
+    @override_settings(ALLAUTH_CAS_WARMUP_ON_READY=True)
+    def test_validation_pooling_with_warmup(self):
+        """
+        The warm-up at startup enables the shared session by default.
+        """
+        self.assertEqual(self.validate(), 1)
+
+    def test_validation_without_pooling(self):
+        """
+        By default, python-cas validates tickets with its own requests.
+        """
+        self.assertEqual(self.validate(), 0)
+
+    def test_command(self):
+        self.patch_adapter_url(self.server.url)
+        out = StringIO()
+
+        call_command('cas_warmup', stdout=out)
+
+        self.assertIn("Validation stack imported in ", out.getvalue())
+        self.assertIn("Done: 1 providers warmed up.", out.getvalue())
+
+    def test_command_failure(self):
+        self.patch_adapter_url(UNREACHABLE_URL)
+        with self.assertRaisesMessage(
+                CommandError, "1 of 1 providers failed to warm up."):
+            call_command('cas_warmup', 'theid', timeout=1, stdout=StringIO())
+
+    def test_command_unknown_provider(self):
+        with self.assertRaisesMessage(
+                CommandError, "Unknown CAS provider 'unknown'."):
+            call_command('cas_warmup', 'unknown', stdout=StringIO())
+
+    def test_ready(self):
+        config = apps.get_app_config('allauth_cas')
+        with patch('allauth_cas.warmup.warm_up_on_ready') as warm_up_on_ready:
+            config.ready()
+            self.assertFalse(warm_up_on_ready.called)
+            with override_settings(ALLAUTH_CAS_WARMUP_ON_READY=True):
+                config.ready()
+            warm_up_on_ready.assert_called_once_with()